@@ -1,9 +1,11 @@
 import { NextRequest, NextResponse } from 'next/server';
 import { MongoClient, ObjectId } from 'mongodb';
 import jwt from 'jsonwebtoken';
+import { unlink } from 'fs/promises';
 
 const MONGODB_URI = process.env.MONGODB_URI || 'mongodb://localhost:27017/pdf-analysis';
 const JWT_SECRET = process.env.JWT_SECRET || 'your-secret-key';
+const serviceName = process.env.SERVICE_NAME || '127.0.0.1';
 
 async function getUserFromToken(request: NextRequest) {
   const token = request.cookies.get('token')?.value;
@@ -39,3 +41,39 @@ export async function GET(request: NextRequest, { params }: { params: { id: stri
     return NextResponse.json({ error: 'Failed to get folder' }, { status: 500 });
   }
 }
+
+export async function DELETE(request: NextRequest, { params }: { params: { id: string } }) {
+  try {
+    const userId = await getUserFromToken(request);
+    const folderId = params.id;
+
+    const client = new MongoClient(MONGODB_URI);
+    await client.connect();
+    const db = client.db();
+
+    const folder = await db.collection('folders').findOneAndDelete({
+      _id: new ObjectId(folderId),
+      userId: new ObjectId(userId)
+    });
+
+    if (!folder) {
+      await client.close();
+      return NextResponse.json({ error: 'Folder not found' }, { status: 404 });
+    }
+
+    const query = { folderId: new ObjectId(folderId), userId: new ObjectId(userId) };
+    const pdfs = await db.collection('pdfs').find(query).toArray();
+    await db.collection('pdfs').deleteMany(query);
+    await client.close();
+
+    await Promise.all(pdfs.map((pdf) => unlink(pdf.filepath).catch(() => {})));
+    // Remove its chunks from the search index; the service's reconciler catches up if this fails
+    await fetch(`http://${serviceName}:8000/index/${userId}/${folderId}`, { method: 'DELETE' })
+      .catch((error) => console.error('Index delete error:', error));
+
+    return NextResponse.json({ deleted: folderId, pdfs: pdfs.length });
+  } catch (error) {
+    console.error('Delete folder error:', error);
+    return NextResponse.json({ error: 'Failed to delete folder' }, { status: 500 });
+  }
+}
@@ -1,9 +1,11 @@
 import { NextRequest, NextResponse } from 'next/server';
 import { MongoClient, ObjectId } from 'mongodb';
 import jwt from 'jsonwebtoken';
+import { unlink } from 'fs/promises';
 
 const MONGODB_URI = process.env.MONGODB_URI || 'mongodb://localhost:27017/pdf-analysis';
 const JWT_SECRET = process.env.JWT_SECRET || 'your-secret-key';
+const serviceName = process.env.SERVICE_NAME || '127.0.0.1';
 
 async function getUserFromToken(request: NextRequest) {
   const token = request.cookies.get('token')?.value;
@@ -40,3 +42,37 @@ export async function GET(request: NextRequest, { params }: { params: { id: stri
     return NextResponse.json({ error: 'Failed to get PDF' }, { status: 500 });
   }
 }
+
+export async function DELETE(request: NextRequest, { params }: { params: { id: string } }) {
+  try {
+    const userId = await getUserFromToken(request);
+    const pdfId = params.id;
+
+    const client = new MongoClient(MONGODB_URI);
+    await client.connect();
+    const db = client.db();
+
+    const pdf = await db.collection('pdfs').findOneAndDelete({
+      _id: new ObjectId(pdfId),
+      userId: new ObjectId(userId),
+    });
+
+    await client.close();
+
+    if (!pdf) {
+      return NextResponse.json({ error: 'PDF not found' }, { status: 404 });
+    }
+
+    await unlink(pdf.filepath).catch(() => {});
+    // Remove its chunks from the search index; the service's reconciler catches up if this fails
+    await fetch(
+      `http://${serviceName}:8000/index/${userId}/${pdf.folderId}/${encodeURIComponent(pdf.filename)}`,
+      { method: 'DELETE' }
+    ).catch((error) => console.error('Index delete error:', error));
+
+    return NextResponse.json({ deleted: pdfId });
+  } catch (error) {
+    console.error('Delete PDF error:', error);
+    return NextResponse.json({ error: 'Failed to delete PDF' }, { status: 500 });
+  }
+}
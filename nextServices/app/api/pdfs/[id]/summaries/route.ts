@@ -37,10 +37,11 @@ export async function GET(request: NextRequest, { params }: { params: { id: stri
             const pdfs = database.collection('pdfs');
             const allSummaries=await pdfs.find(
   { folderId: new ObjectId(folderId), userId: new ObjectId(userId) },
-  { projection: { summary: 1 } }
+  { projection: { summary: 1, filename: 1, originalName: 1 } }
 ).toArray();
     const stringSummaries = allSummaries.map(pdf => `${pdf.filename}: ${pdf.summary}`).join('\n');
-            return NextResponse.json({ success: true, summary: stringSummaries, currPDFName: pdf.originalName });
+    const documents = allSummaries.map(pdf => ({ name: pdf.originalName || pdf.filename, summary: pdf.summary || '' }));
+            return NextResponse.json({ success: true, summary: stringSummaries, documents, currPDFName: pdf.originalName });
         }
         return NextResponse.json({ success: true, summary: pdf.summary });
     } catch (error) {
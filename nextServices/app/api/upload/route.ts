@@ -77,10 +77,8 @@ export async function POST(request: NextRequest) {
       insertedIds.push(result.insertedId.toString());
     }
 
-    // Process headings one by one 🔄
-    for (const pdfId of insertedIds) {
-      await processHeadings(pdfId);
-    }
+    // Process headings for the whole upload in one ingestion request 🔄
+    await processHeadings(insertedIds);
 
     return NextResponse.json({ ids: insertedIds });
 
@@ -94,42 +92,66 @@ export async function POST(request: NextRequest) {
   }
 }
 
-// Simulate heading detection for one PDF
-async function processHeadings(pdfId: string) {
+// Heading detection, indexing and summaries for a batch of PDFs.
+// The service streams one JSON line per document as it finishes.
+async function processHeadings(pdfIds: string[]) {
   const client = new MongoClient(MONGODB_URI);
   try {
     await client.connect();
     const db = client.db();
-    const pdfDoc = await db.collection('pdfs').findOne({ _id: new ObjectId(pdfId) });
+    const pdfDocs = await db.collection('pdfs')
+      .find({ _id: { $in: pdfIds.map((id) => new ObjectId(id)) } })
+      .toArray();
 
-    if (!pdfDoc) {
-      console.error(`PDF ${pdfId} not found for heading processing`);
+    if (pdfDocs.length === 0) {
+      console.error(`PDFs ${pdfIds.join(', ')} not found for heading processing`);
       return;
     }
 
-    const response = await fetch(`http://${serviceName}:8000/predict`, {
+    const idByPath = new Map(pdfDocs.map((doc) => [doc.filepath as string, doc._id]));
+    const response = await fetch(`http://${serviceName}:8000/ingest`, {
       method: 'POST',
       headers: { 'Content-Type': 'application/json' },
       body: JSON.stringify({
-        file_path: pdfDoc.filepath,
-        folder_id: pdfDoc.folderId,
-        user_id: pdfDoc.userId,
+        file_paths: pdfDocs.map((doc) => doc.filepath),
+        folder_id: pdfDocs[0].folderId,
+        user_id: pdfDocs[0].userId,
       }),
     });
 
-    if (response.ok) {
-      const json = await response.json();
-      const headings = json.result;
-      const summary = json.summary;
-      const faq = json.faq;
+    if (!response.ok || !response.body) {
+      console.error(`Ingestion failed with status ${response.status}`);
+      return;
+    }
 
-      await db.collection('pdfs').updateOne(
-        { _id: new ObjectId(pdfId) },
-        { $set: { headingsProcessed: true, headings, summary, faq } }
-      );
+    const reader = response.body.getReader();
+    const decoder = new TextDecoder();
+    let buffered = '';
+    for (;;) {
+      const { done, value } = await reader.read();
+      buffered += decoder.decode(value, { stream: !done });
+      const lines = buffered.split('\n');
+      buffered = done ? '' : lines.pop() ?? '';
+
+      for (const line of lines) {
+        if (!line.trim()) continue;
+        const json = JSON.parse(line);
+        const pdfId = idByPath.get(json.file_path);
+        if (!pdfId) continue;
+        if (json.status !== 'ok') {
+          console.error(`Error processing headings for PDF ${pdfId}:`, json.error);
+          continue;
+        }
+
+        await db.collection('pdfs').updateOne(
+          { _id: pdfId },
+          { $set: { headingsProcessed: true, headings: json.result, summary: json.summary, faq: json.faq } }
+        );
+      }
+      if (done) break;
     }
   } catch (err) {
-    console.error(`Error processing headings for PDF ${pdfId}:`, err);
+    console.error(`Error processing headings for PDFs ${pdfIds.join(', ')}:`, err);
   } finally {
     await client.close();
   }
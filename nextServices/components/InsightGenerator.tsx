@@ -35,12 +35,14 @@ export default function InsightGenerator({
     setInsight("");
 
     let summaries = "";
+    let documents: { name: string; summary: string }[] | undefined;
     let currPDFName = "";
     try {
       const res = await fetch(`/api/pdfs/${currPDFId}/summaries?get_all=true`);
       const data = await res.json();
       if (data.success) {
         summaries = data.summary;
+        documents = data.documents;
         currPDFName = data.currPDFName;
       } else {
         summaries = "⚠️ Failed to fetch summaries.";
@@ -57,7 +59,7 @@ export default function InsightGenerator({
       const res = await fetch(`http://${serviceName}:8000/insights`, {
         method: "POST",
         headers: { "Content-Type": "application/json" },
-        body: JSON.stringify({ selected_text, currPDFName, summaries }),
+        body: JSON.stringify({ selected_text, currPDFName, summaries, documents }),
          cache: "no-store",
       });
 
@@ -0,0 +1,161 @@
+"""
+Micro-benchmark of the block-level feature code in final_nltk.
+
+Collects every text block of a synthetic corpus once, then times the layout and
+text-statistics features of each block two ways:
+  - baseline: the previous per-block code (average font size and table regions
+    recomputed for every block, three generator passes over the text)
+  - current:  StyleContext + classify_chars, with table regions once per page
+
+NLTK tagging is left out of both paths; it is identical and would drown the
+difference. Both paths must produce the same values, which is checked first.
+
+    python benchmarks/bench_block_features.py --corpus /tmp/corpus --repeat 5
+"""
+import argparse
+import os
+import re
+import string
+import sys
+import tempfile
+import time
+import zlib
+
+import numpy as np
+
+from common import save_results, use_service_dir
+from synthetic_corpus import generate_corpus, load_corpus
+
+
+def collect_blocks(corpus):
+    """[(page, page_num, style, [(txt, spans, bbox)])] for every page of the corpus."""
+    import fitz
+    from final_nltk import StyleContext, build_style_profile
+
+    pages = []
+    for pdf_path, _ in corpus:
+        doc = fitz.open(pdf_path)
+        style = StyleContext(build_style_profile(doc))
+        for pnum, page in enumerate(doc, start=1):
+            blocks = []
+            for b in page.get_text("dict", sort=True)["blocks"]:
+                if b.get("type") != 0:
+                    continue
+                for ln in b["lines"]:
+                    spans = ln["spans"]
+                    txt = " ".join(s["text"] for s in spans).strip()
+                    if spans and txt:
+                        blocks.append((txt, spans, fitz.Rect(ln["bbox"])))
+            pages.append((page, pnum, style, blocks))
+    return pages
+
+
+def baseline_features(page, pnum, style, blocks):
+    font_size_map = style.font_size_map
+    out = []
+    for txt, spans, bbox in blocks:
+        avg_font_size = np.mean(list(font_size_map.keys())) if font_size_map else 1
+        words = txt.split()
+        num_words = len(words)
+        total_digits = sum(c.isdigit() for c in txt)
+        punctuation_count = sum(1 for c in txt if c in string.punctuation)
+        out.append((
+            round(spans[0]["size"]),
+            len(txt.split()),
+            len([c for c in txt if c.isalpha()]),
+            font_size_map.get(round(spans[0]["size"]), -1),
+            any(bbox.intersects(r) for r in [d['rect'] for d in page.get_drawings() if d.get('rect')]),
+            round(bbox.y0 / page.rect.height, 2),
+            abs(((page.rect.width - bbox.width) / 2) - bbox.x0) < 10,
+            bool(re.match(r'^\s*(\d+(\.\d+)*\.?|[A-Za-z]\.|[•-])', txt)),
+            round(spans[0]['size'] / avg_font_size, 2),
+            round(punctuation_count / max(1, num_words), 2),
+            all(w.istitle() for w in words if len(w) > 1),
+            round(total_digits / max(1, len(txt)), 2),
+            zlib.crc32(spans[0]["font"].split(',')[0].encode("utf-8")) % 256,
+            round(sum(len(w) for w in words) / max(1, num_words), 2),
+        ))
+    return out
+
+
+def current_features(page, pnum, style, blocks):
+    from final_nltk import classify_chars, detect_table_regions
+
+    table_regions = detect_table_regions(page)
+    page_width, page_height = page.rect.width, page.rect.height
+    out = []
+    for txt, spans, bbox in blocks:
+        words = txt.split()
+        num_words = len(words)
+        letters, digits, punct = classify_chars(txt)
+        font_size = round(spans[0]["size"])
+        out.append((
+            font_size,
+            num_words,
+            letters,
+            style.font_size_rank(font_size),
+            any(bbox.intersects(r) for r in table_regions),
+            round(bbox.y0 / page_height, 2),
+            abs(((page_width - bbox.width) / 2) - bbox.x0) < 10,
+            bool(re.match(r'^\s*(\d+(\.\d+)*\.?|[A-Za-z]\.|[•-])', txt)),
+            round(spans[0]['size'] / style.avg_font_size, 2),
+            round(punct / max(1, num_words), 2),
+            all(w.istitle() for w in words if len(w) > 1),
+            round(digits / max(1, len(txt)), 2),
+            style.font_family_hash(spans[0]["font"]),
+            round(sum(len(w) for w in words) / max(1, num_words), 2),
+        ))
+    return out
+
+
+def time_path(fn, pages, repeat):
+    best = None
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        for page in pages:
+            fn(*page)
+        elapsed = time.perf_counter() - t0
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--corpus", help="Existing corpus directory (generated if missing)")
+    parser.add_argument("--pages", type=int, nargs="+", default=[10, 40])
+    parser.add_argument("--docs-per-size", type=int, default=1)
+    parser.add_argument("--seed", type=int, default=1234)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    corpus_dir = os.path.abspath(args.corpus) if args.corpus else os.path.join(tempfile.mkdtemp(prefix="pdf-bench-"), "corpus")
+    use_service_dir()
+    corpus = load_corpus(corpus_dir) if os.path.isdir(corpus_dir) else []
+    if not corpus:
+        corpus = generate_corpus(corpus_dir, args.pages, args.docs_per_size, args.seed)
+
+    pages = collect_blocks(corpus)
+    n_blocks = sum(len(p[3]) for p in pages)
+    print(f"✓ {len(pages)} pages, {n_blocks} blocks from {len(corpus)} PDFs")
+
+    for page in pages:
+        if baseline_features(*page) != current_features(*page):
+            print(f"❌ Feature mismatch on page {page[1]}")
+            return 1
+
+    baseline = time_path(baseline_features, pages, args.repeat)
+    current = time_path(current_features, pages, args.repeat)
+    results = {
+        "pages": len(pages),
+        "blocks": n_blocks,
+        "baseline_blocks_per_s": round(n_blocks / baseline, 1),
+        "current_blocks_per_s": round(n_blocks / current, 1),
+        "speedup": round(baseline / current, 2),
+    }
+    print(f"  baseline: {results['baseline_blocks_per_s']} blocks/s")
+    print(f"  current:  {results['current_blocks_per_s']} blocks/s ({results['speedup']}x)")
+    save_results("block-features", {"params": {"repeat": args.repeat}, "results": results})
+
+
+if __name__ == "__main__":
+    sys.exit(main())
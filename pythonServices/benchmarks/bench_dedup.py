@@ -0,0 +1,123 @@
+"""
+Chunks embedded, index size, ingest time and top-k quality with and without
+near-duplicate elimination (dedup.py).
+
+Indexes a corpus into a throw-away vector store twice, DEDUP=0 and DEDUP=1, with
+the ground-truth outlines as headers. --revisions adds, per PDF, a copy with a
+different file name, as when a revised version of a document is uploaded into
+the same folder. Then --queries chunk-text windows are searched (flat search).
+
+  embedded      chunk texts sent to the embedding model
+  stored        chunk rows in the vector store
+  hit_at_k      share of queries whose source text is among the top_k results
+  distinct_at_k mean number of distinct texts (normalized like dedup.py) in the top_k;
+                repeated boilerplate and copies lower it
+
+    python benchmarks/bench_dedup.py --corpus /tmp/corpus --revisions 1
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+
+from common import percentile, save_results, use_service_dir
+from synthetic_corpus import generate_corpus, load_corpus
+
+BENCH_FOLDER = "bench-dedup"
+BENCH_USER = "bench-user"
+
+
+def build_index(corpus, revisions):
+    from chunking_3 import build_chunks_with_sections, store_documents
+
+    indexed = []
+    stored = 0
+    for pdf_path, labels in corpus:
+        headers = [{"text": h["text"], "level": h["level"], "page": h["page"]} for h in labels["outline"]]
+        chunks, sections = build_chunks_with_sections(pdf_path, headers, BENCH_FOLDER, BENCH_USER)
+        for revision in range(1 + revisions):
+            filename = os.path.basename(pdf_path) if revision == 0 else f"rev{revision}-{os.path.basename(pdf_path)}"
+            renamed = {s["id"]: s["id"].replace(os.path.basename(pdf_path), filename) for s in sections}
+            doc_sections = [{**s, "id": renamed[s["id"]]} for s in sections]
+            doc_chunks = [{**c, "section_id": renamed[c["section_id"]]} for c in chunks]
+            stored += store_documents([(doc_chunks, doc_sections, BENCH_FOLDER, BENCH_USER, filename)])
+            indexed.extend(doc_chunks)
+    return indexed, stored
+
+
+def run_mode(enabled, corpus, args, work_dir):
+    import dedup
+    import metrics
+    import semantic_search_3
+    import vector_store
+
+    dedup.DEDUP = enabled
+    dedup.DEDUP_INDEX_PATH = os.path.join(work_dir, f"dedup-{int(enabled)}")
+    vector_store.VECTOR_STORE_PATH = os.path.join(work_dir, f"vectors-{int(enabled)}")
+    vector_store._state.update(pid=None, stores={})
+    semantic_search_3.SECTION_SEARCH = False
+
+    t0 = time.perf_counter()
+    with metrics.collect() as trace:
+        indexed, stored = build_index(corpus, args.revisions)
+    ingest_s = time.perf_counter() - t0
+    embedded = sum(rec["items"].get("chunks", 0) for rec in trace if rec["stage"] == "embedding")
+
+    samples = random.Random(args.seed).sample(indexed, min(args.queries, len(indexed)))
+    hits, distinct, latencies = 0, [], []
+    for chunk in samples:
+        words = chunk["text"].split()
+        start = max(0, (len(words) - args.query_words) // 2)
+        query = " ".join(words[start:start + args.query_words])
+        t0 = time.perf_counter()
+        results = semantic_search_3.perform_semantic_search(query, args.top_k, BENCH_FOLDER, BENCH_USER)
+        latencies.append(time.perf_counter() - t0)
+        hits += any(r["text"] == chunk["text"] for r in results)
+        distinct.append(len({dedup.normalize(r["text"]) for r in results}))
+
+    return {
+        "chunks": len(indexed),
+        "embedded": embedded,
+        "stored": stored,
+        "ingest_s": round(ingest_s, 2),
+        "hit_at_k": round(hits / max(1, len(samples)), 3),
+        "distinct_at_k": round(sum(distinct) / max(1, len(distinct)), 2),
+        "query_p50_ms": round(percentile(latencies, 50) * 1000, 2),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--corpus", help="Labeled corpus directory (synthetic corpus generated if missing)")
+    parser.add_argument("--revisions", type=int, default=1, help="Renamed copies of each PDF in the folder")
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--query-words", type=int, default=12)
+    parser.add_argument("--top-k", type=int, default=10)
+    parser.add_argument("--seed", type=int, default=1234)
+    args = parser.parse_args()
+
+    work_dir = tempfile.mkdtemp(prefix="dedup-bench-")
+    corpus_dir = os.path.abspath(args.corpus) if args.corpus else os.path.join(work_dir, "corpus")
+    # Chroma keeps one collection per process, so the numpy backend is used to compare the two runs
+    os.environ["VECTOR_BACKEND"] = "numpy"
+    os.environ["EXTRACTION_CACHE"] = "0"
+    use_service_dir()
+
+    corpus = load_corpus(corpus_dir) if os.path.isdir(corpus_dir) else []
+    if not corpus:
+        corpus = generate_corpus(corpus_dir, [10, 40], 2, args.seed)
+
+    results = {}
+    for name, enabled in (("off", False), ("on", True)):
+        results[name] = r = run_mode(enabled, corpus, args, work_dir)
+        print(f"  dedup {name:<3} chunks {r['chunks']}  embedded {r['embedded']}  stored {r['stored']}  "
+              f"ingest {r['ingest_s']}s  hit@{args.top_k} {r['hit_at_k']}  distinct@{args.top_k} {r['distinct_at_k']}  "
+              f"p50 {r['query_p50_ms']} ms")
+
+    save_results("dedup", {"params": vars(args), "results": results})
+
+
+if __name__ == "__main__":
+    sys.exit(main())
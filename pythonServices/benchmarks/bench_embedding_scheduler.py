@@ -0,0 +1,133 @@
+"""
+Embedding throughput and query latency with and without the embedding scheduler.
+
+Bulk threads embed chunk-sized texts (lines of a synthetic corpus merged in
+groups of five, like the chunker) while search threads embed one short query
+at a time. Two modes:
+  - direct:    every caller runs model.encode itself (the previous behaviour)
+  - scheduler: every caller goes through embedding_scheduler (length buckets,
+               batching window, search before bulk)
+
+Reports bulk texts/s and query latency percentiles for each mode.
+
+    python benchmarks/bench_embedding_scheduler.py --corpus /tmp/corpus --seconds 20
+"""
+import argparse
+import os
+import sys
+import tempfile
+import threading
+import time
+
+from common import percentile, save_results, use_service_dir
+from synthetic_corpus import generate_corpus, load_corpus
+
+QUERIES = [
+    "budget approval process",
+    "what are the safety requirements",
+    "summary of results",
+    "timeline for the second phase of the project",
+    "who is responsible for maintenance",
+    "appendix references",
+]
+
+
+def chunk_texts(corpus, lines_per_chunk=5):
+    import fitz
+
+    texts = []
+    for pdf_path, _ in corpus:
+        with fitz.open(pdf_path) as doc:
+            for page in doc:
+                lines = [ln for ln in page.get_text().splitlines() if ln.strip()]
+                for i in range(0, len(lines), lines_per_chunk):
+                    texts.append(" ".join(lines[i:i + lines_per_chunk]))
+    return texts
+
+
+def run_mode(mode, texts, args):
+    import embedding_scheduler
+    from model_registry import get_embedding_model
+
+    model = get_embedding_model()
+    scheduler = embedding_scheduler.EmbeddingScheduler() if mode == "scheduler" else None
+
+    def embed(batch, priority):
+        if scheduler is None:
+            return model.encode(batch, show_progress_bar=False, convert_to_numpy=True)
+        return scheduler.embed(batch, priority)
+
+    stop = threading.Event()
+    bulk_texts = [0] * args.bulk_threads
+    latencies = []
+
+    def bulk(n):
+        i = n * args.bulk_batch
+        while not stop.is_set():
+            batch = [texts[(i + k) % len(texts)] for k in range(args.bulk_batch)]
+            embed(batch, embedding_scheduler.BULK)
+            bulk_texts[n] += len(batch)
+            i += args.bulk_batch * args.bulk_threads
+
+    def search(n):
+        i = n
+        while not stop.is_set():
+            t0 = time.perf_counter()
+            embed([QUERIES[i % len(QUERIES)]], embedding_scheduler.SEARCH)
+            latencies.append(time.perf_counter() - t0)
+            i += 1
+            time.sleep(args.think_ms / 1000)
+
+    threads = [threading.Thread(target=bulk, args=(n,)) for n in range(args.bulk_threads)]
+    threads += [threading.Thread(target=search, args=(n,)) for n in range(args.search_threads)]
+    t0 = time.perf_counter()
+    for t in threads:
+        t.start()
+    time.sleep(args.seconds)
+    stop.set()
+    for t in threads:
+        t.join()
+    elapsed = time.perf_counter() - t0
+    if scheduler is not None:
+        scheduler.shutdown()
+
+    return {
+        "bulk_texts_per_s": round(sum(bulk_texts) / elapsed, 1),
+        "queries": len(latencies),
+        "query_p50_ms": round(percentile(latencies, 50) * 1000, 1) if latencies else None,
+        "query_p95_ms": round(percentile(latencies, 95) * 1000, 1) if latencies else None,
+        "query_p99_ms": round(percentile(latencies, 99) * 1000, 1) if latencies else None,
+        **({"scheduler": scheduler.stats()} if scheduler is not None else {}),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--corpus", help="Corpus directory (synthetic corpus generated if missing)")
+    parser.add_argument("--seconds", type=float, default=20)
+    parser.add_argument("--bulk-threads", type=int, default=2)
+    parser.add_argument("--bulk-batch", type=int, default=512, help="Texts per bulk call (one document's chunks)")
+    parser.add_argument("--search-threads", type=int, default=4)
+    parser.add_argument("--think-ms", type=float, default=50, help="Pause between queries of one search thread")
+    parser.add_argument("--modes", nargs="+", default=["direct", "scheduler"])
+    args = parser.parse_args()
+
+    corpus_dir = os.path.abspath(args.corpus) if args.corpus else os.path.join(tempfile.mkdtemp(prefix="pdf-bench-"), "corpus")
+    use_service_dir()
+    corpus = load_corpus(corpus_dir) if os.path.isdir(corpus_dir) else []
+    if not corpus:
+        corpus = generate_corpus(corpus_dir, [10, 40], 2, 1234)
+    texts = chunk_texts(corpus)
+    print(f"✓ {len(texts)} chunk texts from {len(corpus)} PDFs")
+
+    results = {}
+    for mode in args.modes:
+        results[mode] = r = run_mode(mode, texts, args)
+        print(f"  {mode:<9} bulk {r['bulk_texts_per_s']} texts/s  queries {r['queries']}  "
+              f"p50 {r['query_p50_ms']} ms  p95 {r['query_p95_ms']} ms  p99 {r['query_p99_ms']} ms")
+
+    save_results("embedding-scheduler", {"params": vars(args), "texts": len(texts), "results": results})
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,135 @@
+"""
+Header bbox resolution and section boundaries with the per-page span index
+(span_index.py) against the previous span scan.
+
+For every outline entry of a labeled corpus, resolves the header on its page:
+
+  scan      the previous find_header_bbox_precise: every span of the page per
+            header, merging all spans that contain or are contained in the header
+  index     PageSpanIndex built once per page, contiguous matching span run
+
+and reports resolution time (text extraction included), headers not found, and the mean height and page
+area share of the bboxes (smaller is tighter). Then builds the chunks of the
+corpus with chunking_3 and reports sections, chunks, and chunks whose text and
+bbox also appear in another section (spans counted in more than one section).
+
+    python benchmarks/bench_header_bbox.py --corpus /tmp/corpus
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+from common import save_results, use_service_dir
+from synthetic_corpus import generate_corpus, load_corpus
+
+
+def scan_header_bbox(page, header_text):
+    """The previous find_header_bbox_precise, kept for comparison."""
+    header_lower = header_text.lower().strip()
+    spans = []
+    for block in page.get_text("dict")["blocks"]:
+        if "lines" in block:
+            for line in block["lines"]:
+                for span in line["spans"]:
+                    span_text = span["text"].lower().strip()
+                    if span_text and (header_lower in span_text or span_text in header_lower):
+                        spans.append(span["bbox"])
+    if not spans:
+        return None
+    return (min(b[0] for b in spans), min(b[1] for b in spans),
+            max(b[2] for b in spans), max(b[3] for b in spans))
+
+
+def resolve(corpus, mode):
+    import fitz
+    from span_index import PageSpanIndex
+
+    seconds, found, missing, heights, areas = 0.0, 0, 0, [], []
+    for pdf_path, labels in corpus:
+        doc = fitz.open(pdf_path)
+        by_page = {}
+        for h in labels["outline"]:
+            by_page.setdefault(h["page"], []).append(h["text"])
+        for page_num, texts in sorted(by_page.items()):
+            page = doc[page_num]
+            t0 = time.perf_counter()
+            if mode == "scan":
+                boxes = [scan_header_bbox(page, text) for text in texts]
+            else:
+                index, after, boxes = PageSpanIndex(page), 0, []
+                for text in texts:
+                    run = index.find(text, after=after)
+                    boxes.append(index.bbox(*run) if run else None)
+                    after = run[1] + 1 if run else after
+            seconds += time.perf_counter() - t0
+            page_area = page.rect.width * page.rect.height
+            for box in boxes:
+                if box is None:
+                    missing += 1
+                    continue
+                found += 1
+                heights.append(box[3] - box[1])
+                areas.append((box[2] - box[0]) * (box[3] - box[1]) / page_area)
+        doc.close()
+    return {
+        "headers": found + missing,
+        "missing": missing,
+        "ms_per_header": round(seconds * 1000 / max(1, found + missing), 3),
+        "mean_height_pt": round(sum(heights) / max(1, len(heights)), 1),
+        "mean_area_share": round(sum(areas) / max(1, len(areas)), 4),
+    }
+
+
+def chunk_corpus(corpus):
+    from chunking_3 import build_chunks_with_sections
+
+    chunks = duplicated = sections = 0
+    t0 = time.perf_counter()
+    for pdf_path, labels in corpus:
+        headers = [{"text": h["text"], "level": h["level"], "page": h["page"]} for h in labels["outline"]]
+        doc_chunks, doc_sections = build_chunks_with_sections(pdf_path, headers, "bench-bbox", "bench-user")
+        seen = {}
+        for c in doc_chunks:
+            seen.setdefault((c["page"], tuple(c["bbox"]), c["text"]), set()).add(c["section_id"])
+        chunks += len(doc_chunks)
+        sections += len(doc_sections)
+        duplicated += sum(1 for c in doc_chunks if len(seen[(c["page"], tuple(c["bbox"]), c["text"])]) > 1)
+    return {
+        "sections": sections,
+        "chunks": chunks,
+        "duplicated_chunks": duplicated,
+        "seconds": round(time.perf_counter() - t0, 2),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--corpus", help="Labeled corpus directory (synthetic corpus generated if missing)")
+    parser.add_argument("--seed", type=int, default=1234)
+    args = parser.parse_args()
+
+    work_dir = tempfile.mkdtemp(prefix="header-bbox-bench-")
+    corpus_dir = os.path.abspath(args.corpus) if args.corpus else os.path.join(work_dir, "corpus")
+    os.environ["EXTRACTION_CACHE"] = "0"
+    use_service_dir()
+
+    corpus = load_corpus(corpus_dir) if os.path.isdir(corpus_dir) else []
+    if not corpus:
+        corpus = generate_corpus(corpus_dir, [10, 40], 2, args.seed)
+
+    results = {}
+    for mode in ("scan", "index"):
+        results[mode] = r = resolve(corpus, mode)
+        print(f"  {mode:<5} headers {r['headers']}  missing {r['missing']}  {r['ms_per_header']} ms/header  "
+              f"height {r['mean_height_pt']} pt  area {r['mean_area_share'] * 100:.2f}% of page")
+    results["chunking"] = r = chunk_corpus(corpus)
+    print(f"  chunking sections {r['sections']}  chunks {r['chunks']}  "
+          f"in several sections {r['duplicated_chunks']}  {r['seconds']}s")
+
+    save_results("header-bbox", {"params": vars(args), "results": results})
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,142 @@
+"""
+Index size and query latency before and after garbage collection (index_gc.py).
+
+Indexes a corpus into --folders folders of a throw-away store, then "deletes"
+--deleted-share of the PDFs and --deleted-folders whole folders from the live
+set, as if they were removed in the app without telling the service. Searches
+the remaining PDFs of one live folder at three points:
+
+  before        deleted PDFs still indexed
+  reconciled    index_gc.reconcile() against the live set (entries deleted)
+  compacted     index_gc.compact() (storage rewritten without deleted entries)
+
+and reports index entries, bytes on disk and vector store query latency
+(section and chunk query of an embedded search) at each.
+
+    python benchmarks/bench_index_gc.py --corpus /tmp/corpus --folders 8
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+
+from common import percentile, save_results, use_service_dir
+from synthetic_corpus import generate_corpus, load_corpus
+
+BENCH_USER = "bench-user"
+
+
+def build_index(corpus, folders):
+    from chunking_3 import build_chunks_with_sections, store_documents
+
+    live = set()
+    texts = {}
+    for f in range(folders):
+        folder_id = f"bench-gc-{f}"
+        for pdf_path, labels in corpus:
+            headers = [{"text": h["text"], "level": h["level"], "page": h["page"]} for h in labels["outline"]]
+            chunks, sections = build_chunks_with_sections(pdf_path, headers, folder_id, BENCH_USER)
+            # A different file name per folder, like the app's timestamped uploads
+            filename = f"{f}-{os.path.basename(pdf_path)}"
+            renamed = {s["id"]: s["id"].replace(os.path.basename(pdf_path), filename) for s in sections}
+            doc_sections = [{**s, "id": renamed[s["id"]]} for s in sections]
+            doc_chunks = [{**c, "section_id": renamed[c["section_id"]]} for c in chunks]
+            store_documents([(doc_chunks, doc_sections, folder_id, BENCH_USER, filename)])
+            live.add((folder_id, BENCH_USER, filename))
+            texts[(folder_id, filename)] = [c["text"] for c in chunks]
+    return live, texts
+
+
+def measure(query_vectors, folder_id, top_k):
+    import index_gc
+    import vector_store
+
+    chunk_store = vector_store.get_store(vector_store.CHUNKS)
+    section_store = vector_store.get_store(vector_store.SECTIONS)
+    latencies = []
+    for q in query_vectors:
+        # The vector store part of a search: sections, then chunks
+        t0 = time.perf_counter()
+        section_store.query(q, 8, folder_id=folder_id, user_id=BENCH_USER)
+        chunk_store.query(q, top_k, folder_id=folder_id, user_id=BENCH_USER)
+        latencies.append(time.perf_counter() - t0)
+    stats = index_gc.stats()
+    return {
+        "entries": {name: s["entries"] for name, s in stats.items()},
+        "rows": {name: s.get("rows") for name, s in stats.items()},
+        "bytes": sum(s.get("bytes", 0) for s in stats.values()),
+        "query_p50_ms": round(percentile(latencies, 50) * 1000, 2),
+        "query_p95_ms": round(percentile(latencies, 95) * 1000, 2),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--corpus", help="Labeled corpus directory (synthetic corpus generated if missing)")
+    parser.add_argument("--folders", type=int, default=8)
+    parser.add_argument("--deleted-share", type=float, default=0.5, help="Share of the PDFs of each live folder deleted")
+    parser.add_argument("--deleted-folders", type=int, default=4)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--query-words", type=int, default=12)
+    parser.add_argument("--top-k", type=int, default=10)
+    parser.add_argument("--seed", type=int, default=1234)
+    args = parser.parse_args()
+
+    work_dir = tempfile.mkdtemp(prefix="index-gc-bench-")
+    corpus_dir = os.path.abspath(args.corpus) if args.corpus else os.path.join(work_dir, "corpus")
+    # Must be set before chroma_store, vector_store, dedup and extraction_cache are imported
+    os.environ["CHROMA_PATH"] = os.path.join(work_dir, "chroma")
+    os.environ["VECTOR_STORE_PATH"] = os.path.join(work_dir, "vectors")
+    os.environ["DEDUP_INDEX_PATH"] = os.path.join(work_dir, "dedup_index")
+    os.environ["EXTRACTION_CACHE_DIR"] = os.path.join(work_dir, "extraction_cache")
+    os.environ.pop("CHROMA_HOST", None)
+    use_service_dir()
+    import index_gc
+
+    corpus = load_corpus(corpus_dir) if os.path.isdir(corpus_dir) else []
+    if not corpus:
+        corpus = generate_corpus(corpus_dir, [10, 40], 2, args.seed)
+    t0 = time.perf_counter()
+    live, texts = build_index(corpus, args.folders)
+    print(f"✓ Indexed {len(live)} PDFs in {args.folders} folders in {time.perf_counter() - t0:.1f}s")
+
+    rng = random.Random(args.seed)
+    folders = sorted({f for f, _, _ in live})
+    deleted_folders = set(rng.sample(folders, min(args.deleted_folders, len(folders) - 1)))
+    kept = {entry for entry in live if entry[0] not in deleted_folders}
+    for folder_id in sorted({f for f, _, _ in kept}):
+        files = sorted(entry for entry in kept if entry[0] == folder_id)
+        kept -= set(rng.sample(files, int(len(files) * args.deleted_share)))
+
+    # Queries on the PDFs that stay in one live folder
+    folder_id, _, _ = min(kept)
+    pool = [t for (f, filename), ts in texts.items() if f == folder_id and (f, BENCH_USER, filename) in kept for t in ts]
+    queries = []
+    for text in rng.sample(pool, min(args.queries, len(pool))):
+        words = text.split()
+        start = max(0, (len(words) - args.query_words) // 2)
+        queries.append(" ".join(words[start:start + args.query_words]))
+    from chunking_3 import embed_texts
+    queries = embed_texts(queries)
+
+    results = {"before": measure(queries, folder_id, args.top_k)}
+    t0 = time.perf_counter()
+    report = index_gc.reconcile(live=kept)
+    seconds = round(time.perf_counter() - t0, 2)
+    results["reconciled"] = {**measure(queries, folder_id, args.top_k), "seconds": seconds, "deleted": report["deleted"]}
+    t0 = time.perf_counter()
+    index_gc.compact()
+    seconds = round(time.perf_counter() - t0, 2)
+    results["compacted"] = {**measure(queries, folder_id, args.top_k), "seconds": seconds}
+
+    for name, r in results.items():
+        print(f"  {name:<10} entries {r['entries']}  rows {r['rows']}  {r['bytes'] / 1e6:.1f} MB  "
+              f"p50 {r['query_p50_ms']} ms  p95 {r['query_p95_ms']} ms")
+
+    save_results("index-gc", {"params": vars(args), "live_pdfs": len(kept), "indexed_pdfs": len(live), "results": results})
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,98 @@
+"""
+Size of the /insights prompt context and the time to assemble it as folders grow
+(context_assembly.py).
+
+Builds folders of --folder-sizes synthetic document summaries, each about one
+theme (a few topic and vocabulary words of synthetic_corpus), and selections of
+--selection-words words of a random document's theme. For every folder size:
+
+  full_tokens       estimated tokens of all summaries (what the prompt held before)
+  context_tokens    estimated tokens of the assembled context
+  source_kept       share of selections whose own document is in the context
+  cold_ms / warm_ms assembly time with new summaries / with summary vectors cached
+  cached_ms         the same selection again (selection cache)
+
+    python benchmarks/bench_insight_context.py --folder-sizes 5 20 80 320
+"""
+import argparse
+import random
+import sys
+import time
+
+from common import percentile, save_results, use_service_dir
+from synthetic_corpus import TOPICS, VOCAB, sentence
+
+
+def theme(rng):
+    return rng.sample(TOPICS, 3) + rng.sample(VOCAB[:40], 4)
+
+
+def themed_text(rng, words, n):
+    """n words, half from the theme, half ordinary sentences."""
+    out = []
+    while len(out) < n:
+        out.extend(rng.choice(words).lower() for _ in range(6))
+        out.extend(sentence(rng, 6, 6).rstrip(".").lower().split())
+    return " ".join(out[:n]).capitalize() + "."
+
+
+def make_folder(rng, size, summary_words):
+    themes = [theme(rng) for _ in range(size)]
+    documents = []
+    for i, words in enumerate(themes):
+        paragraphs = [themed_text(rng, words, summary_words // 3) for _ in range(3)]
+        documents.append((f"doc-{i}.pdf", "## Summary\n" + "\n\n".join(paragraphs)))
+    return themes, documents
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--folder-sizes", type=int, nargs="+", default=[5, 20, 80, 320])
+    parser.add_argument("--summary-words", type=int, default=240)
+    parser.add_argument("--selections", type=int, default=50)
+    parser.add_argument("--selection-words", type=int, default=40)
+    parser.add_argument("--budget", type=int, default=None, help="Context tokens (default INSIGHT_CONTEXT_TOKENS)")
+    parser.add_argument("--seed", type=int, default=1234)
+    args = parser.parse_args()
+    use_service_dir()
+
+    import context_assembly
+    import embedding_scheduler
+
+    rng = random.Random(args.seed)
+    results = {}
+    for size in args.folder_sizes:
+        themes, documents = make_folder(rng, size, args.summary_words)
+        summaries = "\n".join(f"{name}: {summary}" for name, summary in documents)
+        picks = [rng.randrange(size) for _ in range(args.selections)]
+        selections = [themed_text(rng, themes[i], args.selection_words) for i in picks]
+
+        timings = {"cold": [], "warm": [], "cached": []}
+        kept = tokens = 0
+        for n, (i, text) in enumerate(zip(picks, selections)):
+            phase = "cold" if n == 0 else "warm"
+            t0 = time.perf_counter()
+            context = context_assembly.assemble(summaries, text, budget=args.budget)
+            timings[phase].append(time.perf_counter() - t0)
+            t0 = time.perf_counter()
+            context_assembly.assemble(summaries, text, budget=args.budget)
+            timings["cached"].append(time.perf_counter() - t0)
+            kept += f"{documents[i][0]}: " in context
+            tokens += embedding_scheduler.estimate_tokens(context)
+
+        results[size] = r = {
+            "full_tokens": embedding_scheduler.estimate_tokens(summaries),
+            "context_tokens": round(tokens / len(selections)),
+            "source_kept": round(kept / len(selections), 3),
+            "cold_ms": round(timings["cold"][0] * 1000, 1),
+            "warm_ms": round(percentile(timings["warm"], 50) * 1000, 2),
+            "cached_ms": round(percentile(timings["cached"], 50) * 1000, 3),
+        }
+        print(f"  {size:>4} summaries  full {r['full_tokens']} tokens  context {r['context_tokens']}  "
+              f"source kept {r['source_kept']}  cold {r['cold_ms']} ms  warm {r['warm_ms']} ms  cached {r['cached_ms']} ms")
+
+    save_results("insight-context", {"params": vars(args), "results": results})
+
+
+if __name__ == "__main__":
+    sys.exit(main())
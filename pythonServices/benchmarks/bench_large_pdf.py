@@ -0,0 +1,112 @@
+"""
+Peak memory of feature extraction and candidate generation as documents grow,
+with the large-document mode off and on.
+
+Builds PDFs of each requested page count by repeating the pages of one corpus
+document, then runs generate_feature_table and the span-style markdown pass
+on each in a fresh process and reports its peak RSS. "normal" opens files
+normally; "large" forces large-document mode (LARGE_PDF_THRESHOLD_MB=0).
+
+First checks that the windowed pymupdf4llm conversion of large-document mode
+gives the source document the same markdown, heading levels included, as one
+call over all its pages, and exits with status 1 if any page differs.
+
+    python benchmarks/bench_large_pdf.py --source /tmp/corpus/synthetic-0040p-0.pdf --pages 100 400 1600
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+
+from common import SERVICE_DIR, save_results
+
+CHILD = r"""
+import json, resource, sys, time
+from final_nltk import generate_feature_table
+from pdf_title_outline_extractor import PDFTitleOutlineExtractor
+path = sys.argv[1]
+t0 = time.perf_counter()
+rows = len(generate_feature_table(path, workers=0))
+pages = len(PDFTitleOutlineExtractor().extract_markdown_from_pdf(path))
+print(json.dumps({
+    "rows": rows,
+    "pages": pages,
+    "seconds": round(time.perf_counter() - t0, 2),
+    "peak_rss_mb": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+}))
+"""
+
+CHECK = r"""
+import json, sys
+import pymupdf4llm
+import doc_pool
+from pdf_title_outline_extractor import PDFTitleOutlineExtractor
+path = sys.argv[1]
+with doc_pool.document(path, reuse=False) as doc:
+    single = [chunk["text"] for chunk in pymupdf4llm.to_markdown(doc, page_chunks=True)]
+windowed = [page["text"] for page in PDFTitleOutlineExtractor._windowed_markdown(path)]
+print(json.dumps({
+    "pages": len(single),
+    "differing_pages": [i + 1 for i, (a, b) in enumerate(zip(single, windowed)) if a != b]
+                       + list(range(min(len(single), len(windowed)) + 1, max(len(single), len(windowed)) + 1)),
+}))
+"""
+
+
+def check_windowed_markdown(pdf_path):
+    """Pages whose windowed markdown differs from a single pymupdf4llm call."""
+    out = subprocess.run([sys.executable, "-c", CHECK, pdf_path], cwd=SERVICE_DIR, env=dict(os.environ),
+                         capture_output=True, text=True, check=True)
+    return json.loads(out.stdout.strip().splitlines()[-1])
+
+
+def build_pdf(source, pages, out_path):
+    import fitz
+
+    src = fitz.open(source)
+    out = fitz.open()
+    while out.page_count < pages:
+        out.insert_pdf(src, to_page=min(src.page_count, pages - out.page_count) - 1)
+    out.save(out_path, garbage=3, deflate=True)
+    out.close()
+    src.close()
+
+
+def run_child(pdf_path, large):
+    env = dict(os.environ, LARGE_PDF_THRESHOLD_MB="0" if large else "1000000")
+    out = subprocess.run([sys.executable, "-c", CHILD, pdf_path], cwd=SERVICE_DIR, env=env,
+                         capture_output=True, text=True, check=True)
+    return json.loads(out.stdout.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--source", required=True, help="PDF whose pages are repeated")
+    parser.add_argument("--pages", type=int, nargs="+", default=[100, 400, 1600])
+    args = parser.parse_args()
+
+    check = check_windowed_markdown(os.path.abspath(args.source))
+    if check["differing_pages"]:
+        print(f"❌ Windowed markdown differs from a single call on pages {check['differing_pages']}")
+        return 1
+    print(f"✓ Windowed markdown matches a single call on all {check['pages']} pages")
+
+    work_dir = tempfile.mkdtemp(prefix="pdf-large-")
+    runs = []
+    for pages in args.pages:
+        pdf_path = os.path.join(work_dir, f"large-{pages}p.pdf")
+        build_pdf(os.path.abspath(args.source), pages, pdf_path)
+        size_mb = round(os.path.getsize(pdf_path) / 1024 / 1024, 1)
+        for mode, large in (("normal", False), ("large", True)):
+            result = {"pages": pages, "file_mb": size_mb, "mode": mode, **run_child(pdf_path, large)}
+            print(f"  {pages:>5} pages [{mode:<6}] peak RSS {result['peak_rss_mb']} MB in {result['seconds']}s")
+            runs.append(result)
+
+    save_results("large-pdf", {"params": {"source": args.source, "pages": args.pages},
+                               "windowed_markdown": check, "runs": runs})
+
+
+if __name__ == "__main__":
+    sys.exit(main())
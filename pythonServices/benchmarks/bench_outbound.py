@@ -0,0 +1,174 @@
+"""
+Outbound TTS calls against a local fake Azure endpoint, before and after the
+shared outbound layer (outbound.py).
+
+Synthesizes --podcasts podcasts of --lines dialogue lines, --parallel podcasts
+at a time, against fake_providers.FakeAzureTTS with a slow tail and a share of
+503s, in two modes:
+
+  direct     one requests.post per line, lines one after another, no retry
+             (what _generate_azure_tts did before)
+  outbound   generate_audio._generate_azure_tts through outbound: pooled
+             keep-alive connections, lines concurrent up to the provider's
+             concurrency, jittered retries and hedging
+
+Reports lines that failed, podcasts with at least one failed line (each fell
+back to GCP TTS), podcast latency percentiles, per-line p50/p95/p99 and the
+TCP connections the fake accepted. Then takes the fake down and reports how
+long callers wait before the circuit breaker fails them fast.
+
+    python benchmarks/bench_outbound.py --podcasts 40 --lines 12
+"""
+import argparse
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from common import percentile, save_results, use_service_dir
+from fake_providers import FakeAzureTTS
+
+DEPLOYMENT = "tts"
+
+
+def direct_line(url, text):
+    import requests
+
+    response = requests.post(
+        f"{url}/openai/deployments/{DEPLOYMENT}/audio/speech?api-version=bench",
+        headers={"api-key": "bench", "Content-Type": "application/json"},
+        json={"model": DEPLOYMENT, "input": text, "voice": "alloy"},
+        timeout=30,
+    )
+    response.raise_for_status()
+    return response.content
+
+
+def outbound_line(url, text):
+    from generate_audio import _generate_azure_tts
+
+    return _generate_azure_tts(text, voice="alloy")
+
+
+def run_podcast(mode, url, lines, line_latencies):
+    """(seconds, failed lines) of one podcast."""
+    texts = [f"line {i}" for i in range(lines)]
+
+    def one(text):
+        t0 = time.perf_counter()
+        try:
+            (direct_line if mode == "direct" else outbound_line)(url, text)
+            return True
+        except Exception:
+            return False
+        finally:
+            line_latencies.append(time.perf_counter() - t0)
+
+    t0 = time.perf_counter()
+    if mode == "direct":
+        results = [one(text) for text in texts]
+    else:
+        import outbound
+
+        with ThreadPoolExecutor(max_workers=outbound.provider("azure_tts").concurrency) as pool:
+            results = list(pool.map(one, texts))
+    return time.perf_counter() - t0, results.count(False)
+
+
+def run_mode(mode, fake, args):
+    if mode == "outbound":
+        # Import errors surface here, not as failed lines
+        import generate_audio  # noqa: F401
+    fake.reset()
+    line_latencies = []
+    with ThreadPoolExecutor(max_workers=args.parallel) as pool:
+        podcasts = list(pool.map(lambda _: run_podcast(mode, fake.url, args.lines, line_latencies), range(args.podcasts)))
+    seconds = [s for s, _ in podcasts]
+    failed_lines = sum(f for _, f in podcasts)
+    return {
+        "lines": args.podcasts * args.lines,
+        "failed_lines": failed_lines,
+        "podcasts_falling_back": sum(1 for _, f in podcasts if f),
+        "podcast_p50_s": round(percentile(seconds, 50), 3),
+        "podcast_p95_s": round(percentile(seconds, 95), 3),
+        "line_p50_ms": round(percentile(line_latencies, 50) * 1000, 1),
+        "line_p95_ms": round(percentile(line_latencies, 95) * 1000, 1),
+        "line_p99_ms": round(percentile(line_latencies, 99) * 1000, 1),
+        **{f"fake_{k}": v for k, v in fake.stats().items()},
+    }
+
+
+def run_outage(fake, calls):
+    """Latency of calls while the provider is down: retried until the breaker opens, then refused."""
+    import outbound
+
+    fake.down = True
+    fake.reset()
+    latencies, refused = [], 0
+    for i in range(calls):
+        t0 = time.perf_counter()
+        try:
+            outbound_line(fake.url, f"outage {i}")
+        except outbound.CircuitOpen:
+            refused += 1
+        except Exception:
+            pass
+        latencies.append(time.perf_counter() - t0)
+    fake.down = False
+    return {
+        "calls": calls,
+        "refused_by_breaker": refused,
+        "requests_reaching_provider": fake.stats()["requests"],
+        "first_call_s": round(latencies[0], 3),
+        "last_call_ms": round(latencies[-1] * 1000, 2),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--podcasts", type=int, default=40)
+    parser.add_argument("--lines", type=int, default=12)
+    parser.add_argument("--parallel", type=int, default=4, help="Podcasts generated at once")
+    parser.add_argument("--latency-ms", type=float, default=40)
+    parser.add_argument("--tail-p", type=float, default=0.03)
+    parser.add_argument("--tail-ms", type=float, default=1500)
+    parser.add_argument("--error-p", type=float, default=0.05)
+    parser.add_argument("--hedge-ms", type=float, default=300, help="Hedge delay of the outbound mode (0: off)")
+    parser.add_argument("--outage-calls", type=int, default=20)
+    parser.add_argument("--seed", type=int, default=1234)
+    args = parser.parse_args()
+    use_service_dir()
+
+    fake = FakeAzureTTS(latency_s=args.latency_ms / 1000, tail_p=args.tail_p, tail_s=args.tail_ms / 1000,
+                        error_p=args.error_p, seed=args.seed).start()
+    # Must be set before outbound and generate_audio are imported
+    os.environ.update({
+        "AZURE_TTS_KEY": "bench",
+        "AZURE_TTS_ENDPOINT": fake.url,
+        "AZURE_TTS_DEPLOYMENT": DEPLOYMENT,
+        "OUTBOUND_AZURE_TTS_HEDGE_S": str(args.hedge_ms / 1000),
+        "OUTBOUND_AZURE_TTS_BACKOFF_S": "0.05",
+        "OUTBOUND_AZURE_TTS_CIRCUIT_RESET_S": "60",
+    })
+
+    results = {}
+    try:
+        for mode in ("direct", "outbound"):
+            results[mode] = r = run_mode(mode, fake, args)
+            print(f"  {mode:<8} failed lines {r['failed_lines']}/{r['lines']}  "
+                  f"podcasts falling back {r['podcasts_falling_back']}/{args.podcasts}  "
+                  f"podcast p50 {r['podcast_p50_s']}s p95 {r['podcast_p95_s']}s  "
+                  f"line p50 {r['line_p50_ms']} p95 {r['line_p95_ms']} p99 {r['line_p99_ms']} ms  "
+                  f"connections {r['fake_connections']}")
+        results["outage"] = r = run_outage(fake, args.outage_calls)
+        print(f"  outage   {r['refused_by_breaker']}/{r['calls']} calls refused by the breaker, "
+              f"{r['requests_reaching_provider']} reached the provider, "
+              f"first call {r['first_call_s']}s, last {r['last_call_ms']} ms")
+    finally:
+        fake.stop()
+
+    save_results("outbound", {"params": vars(args), "results": results})
+
+
+if __name__ == "__main__":
+    sys.exit(main())
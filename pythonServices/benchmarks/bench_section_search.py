@@ -0,0 +1,117 @@
+"""
+Accuracy, latency and candidate count of flat vs two-stage (section, then chunk) search.
+
+Indexes a labeled corpus into a throw-away vector store, using the ground-truth
+outlines as headers, optionally copied --copies times into the same folder to
+make it larger. Then for --queries sampled chunks it searches with a window of
+--query-words words taken from the chunk, two ways:
+  - flat:      every chunk of the folder is ranked
+  - sections:  the SEARCH_TOP_SECTIONS best sections first, then only their chunks
+
+hit_at_k is the share of queries whose source chunk (or a copy) is among the top_k results;
+candidates is the number of chunks ranked per query.
+
+    python benchmarks/bench_section_search.py --corpus /tmp/corpus --copies 5
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+from collections import Counter
+
+from common import percentile, save_results, use_service_dir
+from synthetic_corpus import generate_corpus, load_corpus
+
+BENCH_FOLDER = "bench-sections"
+BENCH_USER = "bench-user"
+
+
+def build_index(corpus, copies):
+    from chunking_3 import build_chunks_with_sections, store_documents
+
+    indexed = []
+    for pdf_path, labels in corpus:
+        headers = [{"text": h["text"], "level": h["level"], "page": h["page"]} for h in labels["outline"]]
+        chunks, sections = build_chunks_with_sections(pdf_path, headers, BENCH_FOLDER, BENCH_USER)
+        for copy in range(copies):
+            # Same content under another file name, so the folder grows like a real upload history
+            filename = f"copy{copy}-{os.path.basename(pdf_path)}"
+            renamed = {s["id"]: s["id"].replace(os.path.basename(pdf_path), filename) for s in sections}
+            doc_sections = [{**s, "id": renamed[s["id"]]} for s in sections]
+            doc_chunks = [{**c, "section_id": renamed[c["section_id"]]} for c in chunks]
+            store_documents([(doc_chunks, doc_sections, BENCH_FOLDER, BENCH_USER, filename)])
+            indexed.extend((filename, c) for c in doc_chunks)
+    return indexed
+
+
+def run_mode(two_stage, samples, section_sizes, top_k, query_words):
+    import semantic_search_3
+
+    semantic_search_3.SECTION_SEARCH = two_stage
+    latencies = []
+    hits = 0
+    candidates = []
+    for filename, chunk in samples:
+        words = chunk["text"].split()
+        start = max(0, (len(words) - query_words) // 2)
+        query = " ".join(words[start:start + query_words])
+        t0 = time.perf_counter()
+        sections, results = semantic_search_3.search_sections_and_chunks(
+            query, top_k=top_k, folder_id=BENCH_FOLDER, user_id=BENCH_USER)
+        latencies.append(time.perf_counter() - t0)
+        # Copies share their text, so any copy of the source chunk counts
+        hits += any(r["text"] == chunk["text"] for r in results)
+        candidates.append(sum(section_sizes[s["section_id"]] for s in sections) if two_stage and sections else None)
+    ranked = [c for c in candidates if c is not None]
+    return {
+        "queries": len(samples),
+        "hit_at_k": round(hits / max(1, len(samples)), 3),
+        "p50_ms": round(percentile(latencies, 50) * 1000, 2),
+        "p95_ms": round(percentile(latencies, 95) * 1000, 2),
+        "mean_candidates": round(sum(ranked) / len(ranked), 1) if ranked else None,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--corpus", help="Labeled corpus directory (synthetic corpus generated if missing)")
+    parser.add_argument("--copies", type=int, default=3, help="Times each PDF is indexed into the folder")
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--query-words", type=int, default=12)
+    parser.add_argument("--top-k", type=int, default=10)
+    parser.add_argument("--seed", type=int, default=1234)
+    args = parser.parse_args()
+
+    work_dir = tempfile.mkdtemp(prefix="section-bench-")
+    corpus_dir = os.path.abspath(args.corpus) if args.corpus else os.path.join(work_dir, "corpus")
+    # Must be set before chroma_store, vector_store and extraction_cache are imported
+    os.environ["CHROMA_PATH"] = os.path.join(work_dir, "chroma")
+    os.environ["VECTOR_STORE_PATH"] = os.path.join(work_dir, "vectors")
+    # The copies are meant to grow the folder, not to be folded into one chunk
+    os.environ["DEDUP"] = "0"
+    os.environ["EXTRACTION_CACHE"] = "0"
+    os.environ.pop("CHROMA_HOST", None)
+    use_service_dir()
+
+    corpus = load_corpus(corpus_dir) if os.path.isdir(corpus_dir) else []
+    if not corpus:
+        corpus = generate_corpus(corpus_dir, [10, 40], 2, args.seed)
+    t0 = time.perf_counter()
+    indexed = build_index(corpus, args.copies)
+    print(f"✓ Indexed {len(indexed)} chunks from {len(corpus)} PDFs x {args.copies} in {time.perf_counter() - t0:.1f}s")
+
+    samples = random.Random(args.seed).sample(indexed, min(args.queries, len(indexed)))
+    section_sizes = Counter(c["section_id"] for _, c in indexed)
+    results = {}
+    for name, two_stage in (("flat", False), ("sections", True)):
+        results[name] = r = run_mode(two_stage, samples, section_sizes, args.top_k, args.query_words)
+        print(f"  {name:<9} hit@{args.top_k} {r['hit_at_k']}  p50 {r['p50_ms']} ms  p95 {r['p95_ms']} ms  "
+              f"candidates {r['mean_candidates'] or len(indexed)}")
+
+    save_results("section-search", {"params": vars(args), "chunks": len(indexed), "results": results})
+
+
+if __name__ == "__main__":
+    sys.exit(main())
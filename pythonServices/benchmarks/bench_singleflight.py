@@ -0,0 +1,124 @@
+"""
+Duplicate work under bursts of identical requests, with and without single-flight
+coalescing (singleflight.py).
+
+Indexes a corpus into a throw-away vector store, then sends --bursts bursts of
+--burst-size identical /relevance requests at once to the app (in process,
+over ASGI), each burst with a new query, with SINGLEFLIGHT off and on. Reports
+searches actually run (query embeddings), requests per second and the latency
+percentiles of the requests.
+
+    python benchmarks/bench_singleflight.py --corpus /tmp/corpus --burst-size 16
+"""
+import argparse
+import asyncio
+import os
+import random
+import sys
+import tempfile
+import time
+
+from common import percentile, save_results, use_service_dir
+from synthetic_corpus import generate_corpus, load_corpus
+
+BENCH_FOLDER = "bench-singleflight"
+BENCH_USER = "bench-user"
+
+
+def build_index(corpus):
+    from chunking_3 import build_chunks_with_sections, store_documents
+
+    texts = []
+    for pdf_path, labels in corpus:
+        headers = [{"text": h["text"], "level": h["level"], "page": h["page"]} for h in labels["outline"]]
+        chunks, sections = build_chunks_with_sections(pdf_path, headers, BENCH_FOLDER, BENCH_USER)
+        store_documents([(chunks, sections, BENCH_FOLDER, BENCH_USER, os.path.basename(pdf_path))])
+        texts.extend(c["text"] for c in chunks)
+    return texts
+
+
+async def run_bursts(queries, burst_size):
+    import httpx
+    import server
+
+    latencies = []
+    transport = httpx.ASGITransport(app=server.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=600) as client:
+        async def one(query):
+            t0 = time.perf_counter()
+            response = await client.post("/relevance", json={"folder_id": BENCH_FOLDER, "user_id": BENCH_USER, "query": query})
+            response.raise_for_status()
+            latencies.append(time.perf_counter() - t0)
+
+        t0 = time.perf_counter()
+        for query in queries:
+            await asyncio.gather(*[one(query) for _ in range(burst_size)])
+        wall = time.perf_counter() - t0
+    return latencies, wall
+
+
+def searches_run():
+    """Query embeddings so far, from the Prometheus exposition (one per search that ran)."""
+    import metrics
+
+    for line in metrics.render_prometheus().splitlines():
+        if line.startswith('embedding_texts_total{priority="search"}'):
+            return float(line.rsplit(" ", 1)[1])
+    return 0.0
+
+
+def run_mode(enabled, queries, burst_size):
+    import singleflight
+
+    singleflight.SINGLEFLIGHT = enabled
+    before = searches_run()
+    latencies, wall = asyncio.run(run_bursts(queries, burst_size))
+    searches = int(searches_run() - before)
+    return {
+        "requests": len(latencies),
+        "searches": searches,
+        "requests_per_s": round(len(latencies) / wall, 1),
+        "p50_ms": round(percentile(latencies, 50) * 1000, 1),
+        "p95_ms": round(percentile(latencies, 95) * 1000, 1),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--corpus", help="Labeled corpus directory (synthetic corpus generated if missing)")
+    parser.add_argument("--bursts", type=int, default=20)
+    parser.add_argument("--burst-size", type=int, default=16)
+    parser.add_argument("--query-words", type=int, default=12)
+    parser.add_argument("--seed", type=int, default=1234)
+    args = parser.parse_args()
+
+    work_dir = tempfile.mkdtemp(prefix="singleflight-bench-")
+    corpus_dir = os.path.abspath(args.corpus) if args.corpus else os.path.join(work_dir, "corpus")
+    # Must be set before vector_store, dedup and extraction_cache are imported
+    os.environ["VECTOR_BACKEND"] = "numpy"
+    os.environ["VECTOR_STORE_PATH"] = os.path.join(work_dir, "vectors")
+    os.environ["DEDUP_INDEX_PATH"] = os.path.join(work_dir, "dedup_index")
+    os.environ["EXTRACTION_CACHE"] = "0"
+    use_service_dir()
+
+    corpus = load_corpus(corpus_dir) if os.path.isdir(corpus_dir) else []
+    if not corpus:
+        corpus = generate_corpus(corpus_dir, [10], 2, args.seed)
+    texts = build_index(corpus)
+
+    rng = random.Random(args.seed)
+    results = {}
+    for name, enabled in (("off", False), ("on", True)):
+        queries = []
+        for text in rng.sample(texts, min(args.bursts, len(texts))):
+            words = text.split()
+            queries.append(" ".join(words[:args.query_words]) + f" ({name})")
+        results[name] = r = run_mode(enabled, queries, args.burst_size)
+        print(f"  singleflight {name:<3} requests {r['requests']}  searches {r['searches']}  "
+              f"{r['requests_per_s']} req/s  p50 {r['p50_ms']} ms  p95 {r['p95_ms']} ms")
+
+    save_results("singleflight", {"params": vars(args), "results": results})
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,137 @@
+"""
+Query latency, size and recall of the vector store backends and storage formats.
+
+Fills each backend with --folders folders of every requested size (clustered
+random 768-d vectors, like chunk embeddings of a few topics) and runs --queries
+searches against one folder. Backends:
+  - chroma:               Chroma collection, HNSW with the folder_id/user_id filter
+  - numpy:                per-folder memory-mapped float32 matrix, exact scan
+  - numpy-ivf:            the same files searched through the IVF index
+  - numpy-float16,
+    numpy-int8:           compact storage (int8 with a scale per vector), exact scan
+  - ...+rescore:          compact scan, then float32 re-scoring of the top candidates
+
+recall_at_k is measured against the exact float32 results; index_bytes is the
+size of the matrices scanned per query for the queried folder, disk_bytes
+everything stored for it.
+
+    python benchmarks/bench_vector_store.py --sizes 1000 5000 20000 --folders 10
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+from common import percentile, save_results, use_service_dir
+
+DIM = 768
+
+
+def make_vectors(rng, n, topics=32):
+    centers = rng.standard_normal((topics, DIM)).astype(np.float32)
+    vectors = centers[rng.integers(0, topics, n)] + 0.6 * rng.standard_normal((n, DIM)).astype(np.float32)
+    return vectors
+
+
+def fill(store, rng, size, folders):
+    t0 = time.perf_counter()
+    for f in range(folders):
+        vectors = make_vectors(rng, size)
+        ids = [f"f{f}:u:doc.pdf:{i}" for i in range(size)]
+        metas = [{"folder_id": f"f{f}", "user_id": "u", "filename": "doc.pdf", "page": 1} for _ in range(size)]
+        for start in range(0, size, 2048):
+            end = start + 2048
+            store.upsert(ids[start:end], vectors[start:end], [f"chunk {i}" for i in range(start, min(end, size))],
+                         metas[start:end])
+    return time.perf_counter() - t0
+
+
+def run_queries(store, queries, top_k):
+    latencies = []
+    results = []
+    for q in queries:
+        t0 = time.perf_counter()
+        hits = store.query(q, top_k, folder_id="f0", user_id="u")
+        latencies.append(time.perf_counter() - t0)
+        results.append([h["id"] for h in hits])
+    return latencies, results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 5000, 20000], help="Chunks per folder")
+    parser.add_argument("--folders", type=int, default=10, help="Folders of each size in the store")
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--top-k", type=int, default=10)
+    parser.add_argument("--backends", nargs="+", default=[
+        "chroma", "numpy", "numpy-ivf", "numpy-float16", "numpy-float16+rescore", "numpy-int8", "numpy-int8+rescore"])
+    args = parser.parse_args()
+
+    work_dir = tempfile.mkdtemp(prefix="vector-bench-")
+    os.environ["CHROMA_PATH"] = os.path.join(work_dir, "chroma")
+    os.environ.pop("CHROMA_HOST", None)
+    use_service_dir()
+    import vector_store
+
+    runs = []
+    for size in args.sizes:
+        queries = make_vectors(np.random.default_rng(size + 1), args.queries)
+        exact = None
+        for backend in args.backends:
+            index_bytes = disk_bytes = None
+            if backend == "chroma":
+                try:
+                    import chromadb  # noqa: F401
+                except ImportError:
+                    print("⚠️ chromadb is not installed, skipping the chroma backend")
+                    continue
+                store = vector_store.ChromaVectorStore(f"bench_{size}")
+                write_s = fill(store, np.random.default_rng(size), size, args.folders)
+            else:
+                # numpy[-ivf|-float16|-int8][+rescore]; the IVF variant searches the float32 files
+                name, _, rescore = backend.partition("+")
+                kind = name.split("-", 1)[1] if "-" in name else "float32"
+                dtype = "float32" if kind == "ivf" else kind
+                vector_store.VECTOR_DTYPE = dtype
+                vector_store.VECTOR_RESCORE = bool(rescore)
+                vector_store.VECTOR_IVF_MIN_ROWS = 1 if kind == "ivf" else 10 ** 12
+                store = vector_store.NumpyVectorStore(os.path.join(work_dir, f"numpy-{size}-{dtype}{rescore}"))
+                write_s = None
+                if not os.path.isdir(store.path):
+                    write_s = fill(store, np.random.default_rng(size), size, args.folders)
+                store.query(queries[0], args.top_k, folder_id="f0", user_id="u")  # map the files, build the index
+                tenant = store.tenant("f0", "u")
+                stats = tenant.stats()
+                disk_bytes = sum(stats["bytes"].values())
+                index_bytes = stats["bytes"].get(vector_store.MATRIX_FILES[dtype], 0) + stats["bytes"].get(vector_store.SCALES_FILE, 0)
+
+            latencies, results = run_queries(store, queries, args.top_k)
+            if backend == "numpy":
+                exact = results
+            recall = None
+            if exact is not None:
+                recall = round(float(np.mean([len(set(a) & set(b)) / max(1, len(b)) for a, b in zip(results, exact)])), 3)
+            run = {
+                "backend": backend,
+                "chunks_per_folder": size,
+                "folders": args.folders,
+                "write_s": round(write_s, 2) if write_s is not None else None,
+                "query_p50_ms": round(percentile(latencies, 50) * 1000, 2),
+                "query_p95_ms": round(percentile(latencies, 95) * 1000, 2),
+                "recall_at_k": recall,
+                "index_bytes": index_bytes,
+                "disk_bytes": disk_bytes,
+            }
+            runs.append(run)
+            index_mb = f"{index_bytes / 1e6:.1f} MB" if index_bytes is not None else "-"
+            print(f"  {size:>6} chunks/folder [{backend:<20}] p50 {run['query_p50_ms']} ms  p95 {run['query_p95_ms']} ms  "
+                  f"recall@{args.top_k} {recall}  index {index_mb}  write {run['write_s'] if write_s is not None else '-'}s")
+
+    save_results("vector-store", {"params": vars(args), "runs": runs})
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,125 @@
+"""
+Throughput of the /relevance endpoint as the number of gunicorn workers grows.
+
+For every worker count the server is started with gunicorn.conf.py, warmed up,
+and hammered by a pool of client threads for a fixed duration. A Chroma server
+must be reachable through CHROMA_HOST/CHROMA_PORT for counts above one.
+
+    python benchmarks/bench_workers.py --workers 1 2 4 --folder-id F --user-id U
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import time
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+from common import SERVICE_DIR, percentile, save_results
+
+QUERIES = [
+    "How is the model evaluated?",
+    "What are the main findings of the report?",
+    "Describe the methodology used in the study",
+    "Which risks are mentioned in the introduction?",
+    "Summary of the budget allocation",
+]
+
+
+def post_json(url, payload, timeout=120):
+    req = urllib.request.Request(
+        url,
+        data=json.dumps(payload).encode("utf-8"),
+        headers={"Content-Type": "application/json"},
+        method="POST",
+    )
+    with urllib.request.urlopen(req, timeout=timeout) as resp:
+        return resp.status, resp.read()
+
+
+def wait_until_up(base_url, payload, timeout=600):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            post_json(f"{base_url}/relevance", payload, timeout=30)
+            return True
+        except Exception:
+            time.sleep(1)
+    return False
+
+
+def drive(base_url, folder_id, user_id, concurrency, duration):
+    latencies = []
+    errors = 0
+    stop_at = time.time() + duration
+
+    def client(worker_idx):
+        nonlocal errors
+        i = worker_idx
+        while time.time() < stop_at:
+            payload = {"folder_id": folder_id, "user_id": user_id, "query": QUERIES[i % len(QUERIES)]}
+            t0 = time.perf_counter()
+            try:
+                post_json(f"{base_url}/relevance", payload)
+                latencies.append(time.perf_counter() - t0)
+            except Exception:
+                errors += 1
+            i += 1
+
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        list(pool.map(client, range(concurrency)))
+
+    n = len(latencies)
+    return {
+        "requests": n,
+        "errors": errors,
+        "throughput_rps": round(n / duration, 2),
+        "p50_ms": round(percentile(latencies, 50) * 1000, 1) if n else None,
+        "p99_ms": round(percentile(latencies, 99) * 1000, 1) if n else None,
+    }
+
+
+def run_for_workers(workers, args):
+    env = dict(os.environ, WEB_CONCURRENCY=str(workers), BIND=f"127.0.0.1:{args.port}")
+    proc = subprocess.Popen(
+        [sys.executable, "-m", "gunicorn", "server:app", "-c", "gunicorn.conf.py"],
+        cwd=SERVICE_DIR,
+        env=env,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+    )
+    base_url = f"http://127.0.0.1:{args.port}"
+    warm = {"folder_id": args.folder_id, "user_id": args.user_id, "query": QUERIES[0]}
+    try:
+        if not wait_until_up(base_url, warm):
+            return {"workers": workers, "error": "server did not come up"}
+        stats = drive(base_url, args.folder_id, args.user_id, args.concurrency, args.duration)
+        return {"workers": workers, **stats}
+    finally:
+        proc.terminate()
+        proc.wait(timeout=60)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4])
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--duration", type=float, default=30.0)
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--folder-id", required=True)
+    parser.add_argument("--user-id", required=True)
+    args = parser.parse_args()
+
+    runs = []
+    for workers in args.workers:
+        print(f"→ {workers} worker(s)")
+        result = run_for_workers(workers, args)
+        print(f"  {result}")
+        runs.append(result)
+
+    save_results("workers", {"concurrency": args.concurrency, "duration": args.duration, "runs": runs})
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,55 @@
+"""Helpers shared by the benchmark scripts (run them from pythonServices/)."""
+import json
+import math
+import os
+import platform
+import subprocess
+import sys
+from datetime import datetime
+
+SERVICE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+RESULTS_DIR = os.path.join(SERVICE_DIR, "benchmarks", "results")
+
+# Make the service modules importable and the relative model paths resolvable
+if SERVICE_DIR not in sys.path:
+    sys.path.insert(0, SERVICE_DIR)
+
+
+def use_service_dir():
+    os.chdir(SERVICE_DIR)
+
+
+def percentile(values, q):
+    """Nearest-rank percentile of a list of numbers (q in 0..100)."""
+    if not values:
+        return None
+    ordered = sorted(values)
+    rank = max(1, math.ceil(q / 100 * len(ordered)))
+    return ordered[rank - 1]
+
+
+def environment():
+    try:
+        commit = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            cwd=SERVICE_DIR, capture_output=True, text=True,
+        ).stdout.strip() or None
+    except OSError:
+        commit = None
+    return {
+        "python": sys.version.split()[0],
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "git_commit": commit,
+        "timestamp": datetime.now().isoformat(timespec="seconds"),
+    }
+
+
+def save_results(prefix: str, data: dict) -> str:
+    """Write a result file to benchmarks/results/<prefix>-<timestamp>.json and return its path."""
+    os.makedirs(RESULTS_DIR, exist_ok=True)
+    out_path = os.path.join(RESULTS_DIR, f"{prefix}-{datetime.now():%Y%m%d-%H%M%S}.json")
+    with open(out_path, "w", encoding="utf-8") as f:
+        json.dump({"environment": environment(), **data}, f, indent=2)
+    print(f"✓ Saved {out_path}")
+    return out_path
@@ -0,0 +1,109 @@
+"""
+Accuracy and speed of the header candidate modes on a labeled corpus.
+
+For every mode ("markdown": pymupdf4llm conversion, "spans": span styles only)
+each PDF goes through process_single_pdf and predict_single_pdf, and the result
+is scored against the ground-truth outline stored next to the PDF (the
+synthetic corpus, or any directory of <name>.pdf + <name>.json in the same
+{"title", "outline": [{"level", "text", "page"}]} shape):
+
+  - candidate_recall: labeled headings found among the extracted candidates
+  - precision/recall/f1: predicted headings matching a labeled one (text and page)
+  - level_accuracy: matched headings that also got the right level
+  - pages_per_s: extraction throughput
+
+The extraction cache is disabled so both modes pay their full cost.
+
+    python benchmarks/compare_candidate_modes.py --corpus /tmp/corpus
+"""
+import argparse
+import os
+import re
+import sys
+import tempfile
+import time
+
+# Must be set before extraction_cache is imported
+os.environ["EXTRACTION_CACHE"] = "0"
+
+from common import save_results, use_service_dir
+from synthetic_corpus import generate_corpus, load_corpus
+
+
+def normalize(text):
+    return re.sub(r"\s+", " ", text or "").strip().lower()
+
+
+def score(labels, candidates, predicted):
+    truth = {(normalize(h["text"]), h["page"]): h["level"] for h in labels["outline"]}
+    found = {(normalize(h["text"]), h["page"]) for h in candidates}
+    matched = [(key, level) for key, level in
+               (((normalize(h["text"]), h["page"]), h["level"]) for h in predicted)
+               if key in truth]
+    return {
+        "truth": len(truth),
+        "candidates_found": len(set(truth) & found),
+        "predicted": len(predicted),
+        "matched": len({key for key, _ in matched}),
+        "level_correct": sum(1 for key, level in matched if truth[key] == level),
+    }
+
+
+def evaluate(corpus, mode):
+    from infer_realtime import predict_single_pdf
+    from pdf_title_outline_extractor import process_single_pdf
+
+    totals = {"truth": 0, "candidates_found": 0, "predicted": 0, "matched": 0, "level_correct": 0}
+    pages = 0
+    extraction_s = 0.0
+    for pdf_path, labels in corpus:
+        t0 = time.perf_counter()
+        doc = process_single_pdf(pdf_path, mode=mode)
+        extraction_s += time.perf_counter() - t0
+        pages += labels["pages"]
+        result = predict_single_pdf(model_path="./xgb_model.pkl", doc=doc)
+        predicted = result.get("outline", []) if isinstance(result, dict) else []
+        for k, v in score(labels, doc.get("outline", []), predicted).items():
+            totals[k] += v
+
+    precision = totals["matched"] / totals["predicted"] if totals["predicted"] else 0.0
+    recall = totals["matched"] / totals["truth"] if totals["truth"] else 0.0
+    return {
+        **totals,
+        "candidate_recall": round(totals["candidates_found"] / max(1, totals["truth"]), 3),
+        "precision": round(precision, 3),
+        "recall": round(recall, 3),
+        "f1": round(2 * precision * recall / (precision + recall), 3) if precision + recall else 0.0,
+        "level_accuracy": round(totals["level_correct"] / max(1, totals["matched"]), 3),
+        "pages_per_s": round(pages / extraction_s, 2) if extraction_s else None,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--corpus", help="Labeled corpus directory (synthetic corpus generated if missing)")
+    parser.add_argument("--pages", type=int, nargs="+", default=[2, 10, 40])
+    parser.add_argument("--docs-per-size", type=int, default=2)
+    parser.add_argument("--seed", type=int, default=1234)
+    parser.add_argument("--modes", nargs="+", default=["markdown", "spans"])
+    args = parser.parse_args()
+
+    corpus_dir = os.path.abspath(args.corpus) if args.corpus else os.path.join(tempfile.mkdtemp(prefix="pdf-bench-"), "corpus")
+    use_service_dir()
+    corpus = load_corpus(corpus_dir) if os.path.isdir(corpus_dir) else []
+    if not corpus:
+        corpus = generate_corpus(corpus_dir, args.pages, args.docs_per_size, args.seed)
+    print(f"✓ Corpus: {len(corpus)} labeled PDFs in {corpus_dir}")
+
+    results = {}
+    for mode in args.modes:
+        results[mode] = evaluate(corpus, mode)
+        r = results[mode]
+        print(f"  {mode:<9} f1 {r['f1']}  precision {r['precision']}  recall {r['recall']}  "
+              f"candidate recall {r['candidate_recall']}  levels {r['level_accuracy']}  {r['pages_per_s']} pages/s")
+
+    save_results("candidate-modes", {"params": {"corpus": corpus_dir, "modes": args.modes}, "results": results})
+
+
+if __name__ == "__main__":
+    sys.exit(main())
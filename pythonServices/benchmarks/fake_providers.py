@@ -0,0 +1,342 @@
+"""
+Local fakes of the remote providers, for benchmarks and load tests that must
+not call them.
+
+Every fake serves HTTP on 127.0.0.1 from a background thread, with
+configurable behaviour per request:
+
+  latency_s         base response time (time to first byte for streams)
+  tail_p / tail_s   share of requests answered only after tail_s (slow tail)
+  error_p           share of requests answered with 503
+  down              every request answered with 503
+
+and counts requests, errors and TCP connections accepted, so a benchmark can
+tell pooled keep-alive connections from one connection per call.
+
+  FakeAzureTTS   POST /openai/deployments/<deployment>/audio/speech (a short WAV)
+  FakeGemini     the Gemini API routes google-genai uses: generateContent
+                 (text, JSON of the requested response schema, or TTS audio),
+                 streamGenerateContent (stream_chunks chunks, chunk_interval_s
+                 apart) and resumable file uploads. Point the app at it with
+                 GEMINI_BASE_URL.
+  ChromaProxy    forwards to a real Chroma server (a throw-away local one,
+                 see start_chroma) with the configured latency on top
+
+    with FakeAzureTTS(latency_s=0.05, error_p=0.1) as fake:
+        requests.post(fake.url + "/openai/deployments/tts/audio/speech", json={...})
+        print(fake.stats())
+"""
+import base64
+import http.client
+import io
+import itertools
+import json
+import random
+import shutil
+import socket
+import subprocess
+import threading
+import time
+import urllib.request
+import wave
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+def pcm_bytes(seconds: float = 0.2, rate: int = 24000) -> bytes:
+    """Silent mono 16-bit PCM."""
+    return b"\0\0" * int(seconds * rate)
+
+
+def wav_bytes(seconds: float = 0.2, rate: int = 24000) -> bytes:
+    """A silent mono 16-bit WAV."""
+    buf = io.BytesIO()
+    with wave.open(buf, "wb") as f:
+        f.setnchannels(1)
+        f.setsampwidth(2)
+        f.setframerate(rate)
+        f.writeframes(pcm_bytes(seconds, rate))
+    return buf.getvalue()
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+class FakeProvider:
+    """Base fake: the server, the injected latency and errors, and the counters."""
+
+    def __init__(self, latency_s=0.02, tail_p=0.0, tail_s=1.0, error_p=0.0, seed=1234):
+        self.latency_s = latency_s
+        self.tail_p = tail_p
+        self.tail_s = tail_s
+        self.error_p = error_p
+        self.down = False
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+        self.counts = {"requests": 0, "errors": 0, "connections": 0}
+        self._server = None
+        self._thread = None
+
+    # ----- behaviour -----
+
+    def _draw(self):
+        """(delay, fail) of the next request."""
+        with self._lock:
+            self.counts["requests"] += 1
+            slow = self._rng.random() < self.tail_p
+            fail = self.down or self._rng.random() < self.error_p
+            if fail:
+                self.counts["errors"] += 1
+        return (self.tail_s if slow else self.latency_s), fail
+
+    def count(self, name, n=1):
+        with self._lock:
+            self.counts[name] = self.counts.get(name, 0) + n
+
+    def stats(self):
+        with self._lock:
+            return dict(self.counts)
+
+    def reset(self):
+        with self._lock:
+            self.counts = {key: 0 for key in self.counts}
+
+    def route(self, method, path, headers, body):
+        """
+        (status, headers, body) of a request. The body is bytes, or an iterator
+        of bytes sent chunked as it is produced (streams).
+        """
+        return 404, {"Content-Type": "application/json"}, json.dumps({"error": f"no route {method} {path}"}).encode()
+
+    # ----- server -----
+
+    def _handler(self):
+        fake = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def setup(self):
+                super().setup()
+                fake.count("connections")
+
+            def log_message(self, *args):
+                pass
+
+            def _serve(self):
+                length = int(self.headers.get("Content-Length") or 0)
+                body = self.rfile.read(length) if length else b""
+                delay, fail = fake._draw()
+                time.sleep(delay)
+                if fail:
+                    status, headers, payload = 503, {"Content-Type": "application/json"}, b'{"error": "unavailable"}'
+                else:
+                    status, headers, payload = fake.route(self.command, self.path, self.headers, body)
+                self.send_response(status)
+                for name, value in headers.items():
+                    self.send_header(name, value)
+                if isinstance(payload, bytes):
+                    self.send_header("Content-Length", str(len(payload)))
+                    self.end_headers()
+                    self.wfile.write(payload)
+                    return
+                self.send_header("Transfer-Encoding", "chunked")
+                self.end_headers()
+                try:
+                    for chunk in payload:
+                        self.wfile.write(b"%x\r\n%s\r\n" % (len(chunk), chunk))
+                        self.wfile.flush()
+                    self.wfile.write(b"0\r\n\r\n")
+                except (BrokenPipeError, ConnectionResetError):
+                    self.close_connection = True
+
+            do_GET = do_POST = do_PUT = do_PATCH = do_DELETE = _serve
+
+        return Handler
+
+    def start(self):
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0), self._handler())
+        self._server.daemon_threads = True
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+
+    @property
+    def port(self):
+        return self._server.server_address[1]
+
+    @property
+    def url(self):
+        return f"http://127.0.0.1:{self.port}"
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+
+class FakeAzureTTS(FakeProvider):
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self.audio = wav_bytes()
+
+    def route(self, method, path, headers, body):
+        if method == "POST" and path.split("?")[0].endswith("/audio/speech"):
+            self.count("speech")
+            return 200, {"Content-Type": "audio/wav"}, self.audio
+        return super().route(method, path, headers, body)
+
+
+# Podcast scripts must name the two hosts the prompt asks for
+HOSTS = ("kore", "enceladus")
+WORDS = ("the document describes a method for analysing results across sections and compares "
+         "the findings with earlier reports while noting risks limits and open questions").split()
+
+
+class FakeGemini(FakeProvider):
+    """
+    The parts of the Gemini REST API the app uses. Generated text is filler;
+    structured responses follow the requested schema, so response.parsed works.
+    """
+
+    def __init__(self, stream_chunks=20, chunk_interval_s=0.05, chunk_words=12, **kwargs):
+        super().__init__(**kwargs)
+        self.stream_chunks = stream_chunks
+        self.chunk_interval_s = chunk_interval_s
+        self.chunk_words = chunk_words
+        self.audio = base64.b64encode(pcm_bytes(1.0)).decode("ascii")
+        self._uploads = itertools.count(1)
+
+    def _text(self, words):
+        return " ".join(self._rng.choice(WORDS) for _ in range(words))
+
+    def _fill(self, schema, defs):
+        """A value of a Gemini (OBJECT/ARRAY/...) or JSON schema."""
+        if "$ref" in schema:
+            return self._fill(defs[schema["$ref"].rsplit("/", 1)[1]], defs)
+        kind = str(schema.get("type", "object")).lower()
+        if kind == "object":
+            return {name: (self._rng.choice(HOSTS) if name == "speaker" else self._fill(prop, defs))
+                    for name, prop in schema.get("properties", {}).items()}
+        if kind == "array":
+            return [self._fill(schema.get("items", {"type": "string"}), defs) for _ in range(4)]
+        if kind in ("integer", "number"):
+            return 1
+        if kind == "boolean":
+            return True
+        if schema.get("enum"):
+            return schema["enum"][0]
+        return self._text(self.chunk_words)
+
+    def _candidate(self, parts):
+        return {"candidates": [{"content": {"role": "model", "parts": parts}, "finishReason": "STOP", "index": 0}]}
+
+    def _generate(self, request):
+        config = request.get("generationConfig", {})
+        if "AUDIO" in config.get("responseModalities", []):
+            self.count("tts")
+            return self._candidate([{"inlineData": {"mimeType": "audio/L16;codec=pcm;rate=24000", "data": self.audio}}])
+        schema = config.get("responseJsonSchema") or config.get("responseSchema")
+        if schema:
+            self.count("structured")
+            text = json.dumps(self._fill(schema, schema.get("$defs", {})))
+        else:
+            self.count("text")
+            text = self._text(self.chunk_words * self.stream_chunks)
+        return self._candidate([{"text": text}])
+
+    def _stream(self):
+        self.count("streams")
+        for i in range(self.stream_chunks):
+            if i:
+                time.sleep(self.chunk_interval_s)
+            event = self._candidate([{"text": self._text(self.chunk_words) + " "}])
+            yield b"data: " + json.dumps(event).encode() + b"\r\n\r\n"
+
+    def route(self, method, path, headers, body):
+        route = path.split("?")[0]
+        json_type = {"Content-Type": "application/json"}
+        if method == "POST" and route.endswith(":generateContent"):
+            return 200, json_type, json.dumps(self._generate(json.loads(body or b"{}"))).encode()
+        if method == "POST" and route.endswith(":streamGenerateContent"):
+            return 200, {"Content-Type": "text/event-stream"}, self._stream()
+        if method == "POST" and route.endswith("/upload/v1beta/files"):
+            if "upload_id=" not in path:
+                self.count("uploads")
+                upload_url = f"{self.url}/upload/v1beta/files?upload_id={next(self._uploads)}"
+                return 200, {**json_type, "X-Goog-Upload-URL": upload_url, "X-Goog-Upload-Status": "active"}, b"{}"
+            if "finalize" not in headers.get("X-Goog-Upload-Command", ""):
+                return 200, {**json_type, "X-Goog-Upload-Status": "active"}, b"{}"
+            name = "files/" + path.rsplit("upload_id=", 1)[1]
+            file = {"name": name, "uri": f"{self.url}/v1beta/{name}", "mimeType": "application/pdf", "state": "ACTIVE"}
+            return 200, {**json_type, "X-Goog-Upload-Status": "final"}, json.dumps({"file": file}).encode()
+        return super().route(method, path, headers, body)
+
+
+class ChromaProxy(FakeProvider):
+    """Forwards every request to a Chroma server, after the injected latency."""
+
+    def __init__(self, upstream_port, **kwargs):
+        super().__init__(**kwargs)
+        self.upstream_port = upstream_port
+        self._local = threading.local()
+
+    def _connection(self):
+        connection = getattr(self._local, "connection", None)
+        if connection is None:
+            connection = self._local.connection = http.client.HTTPConnection("127.0.0.1", self.upstream_port, timeout=120)
+        return connection
+
+    def route(self, method, path, headers, body):
+        forwarded = {k: v for k, v in headers.items() if k.lower() not in ("host", "connection", "content-length")}
+        for attempt in range(2):
+            connection = self._connection()
+            try:
+                connection.request(method, path, body=body or None, headers=forwarded)
+                response = connection.getresponse()
+                payload = response.read()
+                break
+            except (http.client.HTTPException, OSError):
+                # The upstream closed a kept-alive connection; reconnect once
+                connection.close()
+                self._local.connection = None
+                if attempt:
+                    raise
+        kept = {k: v for k, v in response.getheaders()
+                if k.lower() not in ("content-length", "transfer-encoding", "connection")}
+        return response.status, kept, payload
+
+
+def start_chroma(path, port=None, timeout=60):
+    """
+    A throw-away Chroma server on 127.0.0.1 storing in path, as
+    (process, port), or None when the chroma CLI is not installed.
+    """
+    executable = shutil.which("chroma")
+    if executable is None:
+        return None
+    port = port or free_port()
+    process = subprocess.Popen([executable, "run", "--path", path, "--host", "127.0.0.1", "--port", str(port)],
+                               stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        for version in ("v2", "v1"):
+            try:
+                with urllib.request.urlopen(f"http://127.0.0.1:{port}/api/{version}/heartbeat", timeout=2):
+                    return process, port
+            except OSError:
+                pass
+        if process.poll() is not None:
+            break
+        time.sleep(0.5)
+    process.terminate()
+    raise RuntimeError(f"Chroma server did not start on port {port}")
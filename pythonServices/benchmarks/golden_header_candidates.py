@@ -0,0 +1,180 @@
+"""
+Golden check and timing of header candidate detection.
+
+`record` converts every PDF of a corpus to markdown (once per candidate mode)
+and stores the markdown, the title and the candidates found by
+PDFTitleOutlineExtractor.find_header_candidates in a golden JSON file.
+With --detector-tree the candidates come from the detector of another
+checkout of the repository instead (e.g. a worktree of the commit before a
+detector change), run on the same markdown. `check` re-runs the detector on
+the stored markdown and fails on any difference, so a change to the detector
+can be verified without converting the PDFs again. `time` measures the
+detector on the stored markdown repeated 1x .. Nx to show how it scales with
+document length.
+
+benchmarks/golden/header_candidates.json is the synthetic corpus
+(synthetic_corpus.py --pages 2 10 40 --docs-per-size 1) with the candidates
+of the detector before the compiled-regex rewrite, and is the default --golden.
+
+    git worktree add /tmp/before <commit>
+    python benchmarks/golden_header_candidates.py record --corpus /tmp/corpus --detector-tree /tmp/before
+    python benchmarks/golden_header_candidates.py check
+    python benchmarks/golden_header_candidates.py time --scale 1 10 50
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+from common import save_results, use_service_dir
+from synthetic_corpus import load_corpus
+
+GOLDEN = os.path.join(os.path.dirname(os.path.abspath(__file__)), "golden", "header_candidates.json")
+
+# Runs in the pythonServices directory of another checkout: candidates of its detector for the cases in argv[1]
+REFERENCE = r"""
+import json, sys
+from pdf_title_outline_extractor import PDFTitleOutlineExtractor
+
+extractor = PDFTitleOutlineExtractor()
+
+
+def legacy_candidates(markdown_content, title, line_to_page_map):
+    # Step 3 of process_pdf, in checkouts from before find_header_candidates
+    headers = extractor.group_markdown_headers(markdown_content)
+    headers.pop(1, None)
+    level_mapping = {count: min(level + 1, 3) for level, count in enumerate(sorted(headers.keys()))}
+    markdown_headers = extractor.parse_markdown_headers(markdown_content, title, level_mapping)
+    semantic_headers = extractor.detect_semantic_headers(markdown_content, title)
+    all_headers = extractor.merge_and_sort_headers(markdown_headers, semantic_headers)
+    return extractor.estimate_page_numbers(all_headers, line_to_page_map)
+
+
+detect = getattr(extractor, "find_header_candidates", legacy_candidates)
+with open(sys.argv[1], encoding="utf-8") as f:
+    cases = json.load(f)
+candidates = [detect(case["markdown"], case["title"], case["line_to_page_map"]) for case in cases]
+with open(sys.argv[2], "w", encoding="utf-8") as f:
+    json.dump(candidates, f, ensure_ascii=False)
+"""
+
+
+def detect(extractor, case, repeat=1):
+    markdown_content = "\n".join([case["markdown"]] * repeat)
+    line_to_page_map = case["line_to_page_map"] * repeat
+    return extractor.find_header_candidates(markdown_content, case["title"], line_to_page_map)
+
+
+def reference_candidates(tree, cases):
+    """Candidates of the detector in another checkout of the repository, one list per case."""
+    service_dir = os.path.join(os.path.abspath(tree), "pythonServices")
+    with tempfile.TemporaryDirectory() as tmp:
+        cases_path, out_path = os.path.join(tmp, "cases.json"), os.path.join(tmp, "candidates.json")
+        with open(cases_path, "w", encoding="utf-8") as f:
+            json.dump(cases, f, ensure_ascii=False)
+        subprocess.run([sys.executable, "-c", REFERENCE, cases_path, out_path], cwd=service_dir, check=True,
+                       stdout=subprocess.DEVNULL)
+        with open(out_path, encoding="utf-8") as f:
+            return json.load(f)
+
+
+def record(args):
+    from pdf_title_outline_extractor import CANDIDATE_MODES, PDFTitleOutlineExtractor
+
+    extractor = PDFTitleOutlineExtractor()
+    cases = []
+    for pdf_path, _ in load_corpus(os.path.abspath(args.corpus)):
+        for mode in CANDIDATE_MODES:
+            pages = extractor.build_markdown_pages(pdf_path, mode)
+            markdown_content, line_to_page_map = extractor.join_markdown_pages(pages)
+            title = extractor.determine_title(pdf_path, markdown_content)
+            case = {
+                "pdf": os.path.basename(pdf_path),
+                "mode": mode,
+                "title": title,
+                "markdown": markdown_content,
+                "line_to_page_map": line_to_page_map,
+            }
+            if not args.detector_tree:
+                case["candidates"] = detect(extractor, case)
+            cases.append(case)
+    if args.detector_tree:
+        for case, candidates in zip(cases, reference_candidates(args.detector_tree, cases)):
+            case["candidates"] = candidates
+    for case in cases:
+        print(f"  {case['pdf']} [{case['mode']}]: {len(case['candidates'])} candidates")
+
+    os.makedirs(os.path.dirname(args.golden), exist_ok=True)
+    with open(args.golden, "w", encoding="utf-8") as f:
+        json.dump(cases, f, ensure_ascii=False)
+    print(f"✓ Recorded {len(cases)} cases in {args.golden}")
+
+
+def load_cases(path):
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def check(args):
+    from pdf_title_outline_extractor import PDFTitleOutlineExtractor
+
+    extractor = PDFTitleOutlineExtractor()
+    failures = 0
+    cases = load_cases(args.golden)
+    for case in cases:
+        got = detect(extractor, case)
+        if got != case["candidates"]:
+            failures += 1
+            first = next((i for i, (a, b) in enumerate(zip(got, case["candidates"])) if a != b),
+                         min(len(got), len(case["candidates"])))
+            print(f"❌ {case['pdf']} [{case['mode']}]: {len(got)} candidates, expected "
+                  f"{len(case['candidates'])}; first difference at #{first}")
+    if failures:
+        return 1
+    print(f"✓ {len(cases)} cases match the golden candidates")
+    return 0
+
+
+def time_detection(args):
+    from pdf_title_outline_extractor import PDFTitleOutlineExtractor
+
+    extractor = PDFTitleOutlineExtractor()
+    cases = load_cases(args.golden)
+    runs = []
+    for scale in args.scale:
+        lines = 0
+        t0 = time.perf_counter()
+        for case in cases:
+            detect(extractor, case, repeat=scale)
+            lines += len(case["line_to_page_map"]) * scale
+        elapsed = time.perf_counter() - t0
+        runs.append({"scale": scale, "lines": lines, "seconds": round(elapsed, 4),
+                     "lines_per_s": round(lines / elapsed, 1)})
+        print(f"  {scale:>4}x: {lines} lines in {elapsed:.3f}s ({runs[-1]['lines_per_s']} lines/s)")
+    save_results("header-candidates", {"params": {"golden": args.golden}, "runs": runs})
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    sub = parser.add_subparsers(dest="command", required=True)
+    rec = sub.add_parser("record")
+    rec.add_argument("--corpus", required=True)
+    rec.add_argument("--golden", default=GOLDEN)
+    rec.add_argument("--detector-tree", help="Checkout whose detector records the candidates (default: this one)")
+    chk = sub.add_parser("check")
+    chk.add_argument("--golden", default=GOLDEN)
+    tim = sub.add_parser("time")
+    tim.add_argument("--golden", default=GOLDEN)
+    tim.add_argument("--scale", type=int, nargs="+", default=[1, 10, 50])
+    args = parser.parse_args()
+
+    args.golden = os.path.abspath(args.golden)
+    use_service_dir()
+    return {"record": record, "check": check, "time": time_detection}[args.command](args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,83 @@
+"""
+Import-time profile of the API server.
+
+Runs `python -X importtime` in fresh interpreters for the fast path
+(`import server`) and for the full warm-up (`model_registry.warm_up()`), and
+writes the slowest modules plus the per-model load times to
+benchmarks/results/import-profile-<timestamp>.json.
+
+    python benchmarks/import_profile.py --top 25
+"""
+import argparse
+import json
+import subprocess
+import sys
+import time
+
+from common import SERVICE_DIR, save_results
+
+WARM_UP_SNIPPET = (
+    "import json, model_registry; model_registry.warm_up(); "
+    "print('READINESS=' + json.dumps(model_registry.readiness()))"
+)
+
+
+def parse_importtime(stderr: str):
+    """Parse `-X importtime` lines into (module, depth, self_us, cumulative_us) tuples."""
+    rows = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, field = line[len("import time:"):].split("|")
+        module = field.strip()
+        depth = (len(field) - len(field.lstrip()) - 1) // 2
+        rows.append((module, depth, int(self_us), int(cumulative_us)))
+    return rows
+
+
+def profile(snippet: str, top: int):
+    t0 = time.perf_counter()
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", snippet],
+        cwd=SERVICE_DIR,
+        capture_output=True,
+        text=True,
+    )
+    wall = time.perf_counter() - t0
+    rows = parse_importtime(proc.stderr)
+    top_level = [r for r in rows if r[1] == 0]
+    readiness = None
+    for line in proc.stdout.splitlines():
+        if line.startswith("READINESS="):
+            readiness = json.loads(line[len("READINESS="):])
+    return {
+        "snippet": snippet,
+        "returncode": proc.returncode,
+        "wall_seconds": round(wall, 3),
+        "imported_modules": len(rows),
+        "top_level_import_seconds": round(sum(r[3] for r in top_level) / 1e6, 3),
+        "slowest_cumulative": [
+            {"module": m, "cumulative_ms": round(c / 1000, 1), "self_ms": round(s / 1000, 1)}
+            for m, _, s, c in sorted(rows, key=lambda r: r[3], reverse=True)[:top]
+        ],
+        "readiness": readiness,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--top", type=int, default=25)
+    args = parser.parse_args()
+
+    report = {
+        "fast_path": profile("import server", args.top),
+        "warm_up": profile(WARM_UP_SNIPPET, args.top),
+    }
+    print(f"import server:  {report['fast_path']['wall_seconds']}s")
+    print(f"full warm-up:   {report['warm_up']['wall_seconds']}s")
+
+    save_results("import-profile", report)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,350 @@
+"""
+Load test of the FastAPI service with every remote provider replaced by a local
+fake (fake_providers.py), for capacity planning without cloud credentials.
+
+Starts FakeGemini, FakeAzureTTS and, when the chroma CLI is installed, a
+throw-away Chroma server behind ChromaProxy (otherwise the numpy vector store).
+For every --workers count the app is started with gunicorn.conf.py pointed at
+the fakes, a folder is seeded by posting the corpus to /predict and the mix
+runs --warmup seconds unmeasured. Then, for every --concurrency level, that
+many closed-loop clients (one keep-alive connection each) replay a weighted
+--mix of requests for --duration seconds:
+
+  predict    upload processing of a corpus PDF copied under a new name
+  relevance  search for words of the corpus vocabulary
+  insights   a selection against the folder's summaries (streamed)
+  guide      reading guide of a few of the folder's summaries (streamed)
+  podcast    podcast of a few summaries (script, then Azure TTS)
+
+Reports per worker count, concurrency level and endpoint: requests, errors,
+throughput and p50/p95/p99 latency, plus p50 time to first byte of the streamed
+endpoints. The saturation point of a worker count, overall and per endpoint, is
+the concurrency level after which more clients no longer raise throughput by
+--saturation-gain.
+
+Fake latencies are per request; --gemini-chunks and --gemini-chunk-ms set the
+streaming cadence of generated text.
+
+    python benchmarks/load_test.py --workers 1 2 4 --concurrency 1 4 16 32 --duration 30
+    python benchmarks/load_test.py --mix relevance=1 --concurrency 8 16 32 64
+"""
+import argparse
+import http.client
+import json
+import os
+import random
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import urllib.request
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+from common import SERVICE_DIR, percentile, save_results
+from fake_providers import ChromaProxy, FakeAzureTTS, FakeGemini, free_port, start_chroma
+from synthetic_corpus import TOPICS, generate_corpus, load_corpus, sentence
+
+ENDPOINTS = ("predict", "relevance", "insights", "guide", "podcast")
+STREAMED = ("insights", "guide")
+DEFAULT_MIX = "relevance=10,insights=4,guide=1,podcast=1,predict=1"
+LOAD_USER = "load-user"
+
+
+def parse_mix(text):
+    mix = {}
+    for item in text.split(","):
+        name, _, weight = item.partition("=")
+        if name.strip() not in ENDPOINTS:
+            raise SystemExit(f"Unknown endpoint in --mix: {name} (one of {', '.join(ENDPOINTS)})")
+        mix[name.strip()] = float(weight or 1)
+    return mix
+
+
+class Workload:
+    """Payloads of every endpoint for one seeded folder."""
+
+    def __init__(self, folder_id, corpus, uploads_dir, documents, seed):
+        self.folder_id = folder_id
+        self.corpus = corpus
+        self.uploads_dir = uploads_dir
+        self.documents = documents
+        self.rng = random.Random(seed)
+        self.lock = threading.Lock()
+
+    def _summaries(self, documents):
+        return "\n".join(f"{name}: {summary}" for name, summary in documents)
+
+    def payload(self, endpoint):
+        with self.lock:
+            rng = self.rng
+            if endpoint == "predict":
+                source = rng.choice(self.corpus)[0]
+                path = os.path.join(self.uploads_dir, f"{uuid.uuid4().hex[:12]}-{os.path.basename(source)}")
+                shutil.copyfile(source, path)
+                return {"file_path": path, "folder_id": self.folder_id, "user_id": LOAD_USER}
+            if endpoint == "relevance":
+                query = f"{rng.choice(TOPICS)} {sentence(rng, 4, 10)}"
+                return {"folder_id": self.folder_id, "user_id": LOAD_USER, "query": query}
+            if endpoint == "insights":
+                name = rng.choice(self.documents)[0]
+                return {
+                    "selected_text": sentence(rng, 20, 60),
+                    "currPDFName": name,
+                    "summaries": self._summaries(self.documents),
+                    "documents": [{"name": n, "summary": s} for n, s in self.documents],
+                }
+            documents = rng.sample(self.documents, min(len(self.documents), rng.randint(2, 4)))
+            return {"summaries": self._summaries(documents)}
+
+
+def post(connection, endpoint, payload):
+    """(seconds, seconds to first byte) of one request; raises on errors."""
+    body = json.dumps(payload).encode("utf-8")
+    t0 = time.perf_counter()
+    connection.request("POST", f"/{endpoint}", body=body, headers={"Content-Type": "application/json"})
+    response = connection.getresponse()
+    first = response.read1(65536) if response.status == 200 else b""
+    ttfb = time.perf_counter() - t0
+    rest = response.read()
+    if response.status != 200:
+        raise RuntimeError(f"{endpoint} returned {response.status}: {(first + rest)[:200]!r}")
+    return time.perf_counter() - t0, ttfb
+
+
+def drive(port, workload, mix, concurrency, duration, seed):
+    """Closed-loop clients replaying the mix; per-endpoint samples and the wall time."""
+    samples = {name: {"latencies": [], "ttfb": [], "errors": 0} for name in mix}
+    names, weights = list(mix), list(mix.values())
+    lock = threading.Lock()
+    stop_at = time.perf_counter() + duration
+
+    def client(index):
+        rng = random.Random(seed * 1000 + index)
+        connection = http.client.HTTPConnection("127.0.0.1", port, timeout=600)
+        while time.perf_counter() < stop_at:
+            endpoint = rng.choices(names, weights)[0]
+            try:
+                seconds, ttfb = post(connection, endpoint, workload.payload(endpoint))
+            except Exception:
+                connection.close()
+                with lock:
+                    samples[endpoint]["errors"] += 1
+                continue
+            with lock:
+                samples[endpoint]["latencies"].append(seconds)
+                samples[endpoint]["ttfb"].append(ttfb)
+        connection.close()
+
+    t0 = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        list(pool.map(client, range(concurrency)))
+    return samples, time.perf_counter() - t0
+
+
+def summarize(samples, wall):
+    endpoints = {}
+    for name, s in samples.items():
+        latencies = s["latencies"]
+        r = {"requests": len(latencies), "errors": s["errors"], "throughput_rps": round(len(latencies) / wall, 2)}
+        if latencies:
+            r.update({f"p{q}_ms": round(percentile(latencies, q) * 1000, 1) for q in (50, 95, 99)})
+            if name in STREAMED:
+                r["ttfb_p50_ms"] = round(percentile(s["ttfb"], 50) * 1000, 1)
+        endpoints[name] = r
+    total = sum(r["requests"] for r in endpoints.values())
+    return {
+        "requests": total,
+        "errors": sum(r["errors"] for r in endpoints.values()),
+        "throughput_rps": round(total / wall, 2),
+        "endpoints": endpoints,
+    }
+
+
+def saturation(levels, throughput, gain):
+    """(concurrency, throughput) of the level after which throughput stopped rising by `gain`."""
+    best = None
+    for concurrency in sorted(levels):
+        value = throughput(levels[concurrency])
+        if best is not None and value < best[1] * (1 + gain):
+            return {"concurrency": best[0], "throughput_rps": best[1], "reached": True}
+        best = (concurrency, value)
+    return {"concurrency": best[0], "throughput_rps": best[1], "reached": False}
+
+
+def wait_until_ready(port, process, timeout=600):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        if process.poll() is not None:
+            return False
+        try:
+            with urllib.request.urlopen(f"http://127.0.0.1:{port}/readyz", timeout=5) as response:
+                if response.status == 200:
+                    return True
+        except OSError:
+            pass
+        time.sleep(1)
+    return False
+
+
+def seed_folder(port, folder_id, corpus, uploads_dir):
+    """/predict every corpus PDF once; (name, summary) of each."""
+    connection = http.client.HTTPConnection("127.0.0.1", port, timeout=600)
+    documents = []
+    for pdf_path, _ in corpus:
+        path = os.path.join(uploads_dir, f"seed-{folder_id}-{os.path.basename(pdf_path)}")
+        shutil.copyfile(pdf_path, path)
+        connection.request("POST", "/predict", body=json.dumps({"file_path": path, "folder_id": folder_id, "user_id": LOAD_USER}),
+                           headers={"Content-Type": "application/json"})
+        response = connection.getresponse()
+        body = response.read()
+        if response.status != 200:
+            raise RuntimeError(f"Seeding /predict failed ({response.status}): {body[:200]!r}")
+        documents.append((os.path.basename(pdf_path), json.loads(body)["summary"]))
+    connection.close()
+    return documents
+
+
+def run_for_workers(workers, args, env, fakes, corpus, work_dir):
+    port = free_port()
+    log_path = os.path.join(work_dir, f"server-{workers}.log")
+    with open(log_path, "wb") as log:
+        process = subprocess.Popen(
+            [sys.executable, "-m", "gunicorn", "server:app", "-c", "gunicorn.conf.py"],
+            cwd=SERVICE_DIR,
+            env=dict(env, WEB_CONCURRENCY=str(workers), BIND=f"127.0.0.1:{port}"),
+            stdout=log, stderr=subprocess.STDOUT,
+        )
+    try:
+        if not wait_until_ready(port, process):
+            return {"error": f"server did not become ready, see {log_path}"}
+        uploads_dir = os.path.join(work_dir, f"uploads-{workers}")
+        os.makedirs(uploads_dir, exist_ok=True)
+        folder_id = f"load-{workers}-workers"
+        workload = Workload(folder_id, corpus, uploads_dir, seed_folder(port, folder_id, corpus, uploads_dir), args.seed)
+        # Not measured: the first requests of every worker pay for lazy imports and connections
+        if args.warmup > 0:
+            drive(port, workload, args.mix, 2 * workers, args.warmup, args.seed)
+
+        levels = {}
+        for concurrency in args.concurrency:
+            for fake in fakes.values():
+                fake.reset()
+            samples, wall = drive(port, workload, args.mix, concurrency, args.duration, args.seed)
+            levels[concurrency] = r = summarize(samples, wall)
+            r["providers"] = {name: fake.stats() for name, fake in fakes.items()}
+            print(f"  {workers} worker(s), {concurrency:>3} clients: {r['throughput_rps']} req/s, {r['errors']} errors")
+            for name, e in r["endpoints"].items():
+                if e["requests"]:
+                    ttfb = f"  ttfb p50 {e['ttfb_p50_ms']}" if "ttfb_p50_ms" in e else ""
+                    print(f"      {name:<10} {e['throughput_rps']:>7} req/s  p50 {e['p50_ms']}  p95 {e['p95_ms']}  "
+                          f"p99 {e['p99_ms']} ms{ttfb}  errors {e['errors']}")
+                else:
+                    print(f"      {name:<10} no completed requests, errors {e['errors']}")
+
+        result = {
+            "levels": levels,
+            "saturation": saturation(levels, lambda r: r["throughput_rps"], args.saturation_gain),
+            "endpoint_saturation": {
+                name: saturation(levels, lambda r, name=name: r["endpoints"][name]["throughput_rps"], args.saturation_gain)
+                for name in args.mix
+            },
+        }
+        s = result["saturation"]
+        print(f"  → {workers} worker(s) {'saturate' if s['reached'] else 'still scaling'} at "
+              f"{s['concurrency']} clients, {s['throughput_rps']} req/s")
+        return result
+    finally:
+        process.terminate()
+        try:
+            process.wait(timeout=60)
+        except subprocess.TimeoutExpired:
+            process.kill()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4])
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 4, 16, 32], help="Client counts per worker count")
+    parser.add_argument("--duration", type=float, default=30.0, help="Seconds per concurrency level")
+    parser.add_argument("--warmup", type=float, default=10.0, help="Unmeasured seconds of the mix before the first level")
+    parser.add_argument("--mix", type=parse_mix, default=parse_mix(DEFAULT_MIX), help=f"Endpoint weights (default {DEFAULT_MIX})")
+    parser.add_argument("--corpus", help="Labeled corpus directory (synthetic corpus generated if missing)")
+    parser.add_argument("--gemini-latency-ms", type=float, default=800, help="Gemini response time / time to first chunk")
+    parser.add_argument("--gemini-chunks", type=int, default=20, help="Chunks per streamed response")
+    parser.add_argument("--gemini-chunk-ms", type=float, default=50, help="Time between streamed chunks")
+    parser.add_argument("--tts-latency-ms", type=float, default=300, help="Azure TTS time per dialogue line")
+    parser.add_argument("--chroma-latency-ms", type=float, default=2, help="Added to every Chroma request")
+    parser.add_argument("--error-p", type=float, default=0.0, help="Share of provider requests failing with 503")
+    parser.add_argument("--vector-backend", choices=["chroma", "numpy"], default=None,
+                        help="Default: chroma when the chroma CLI is installed, else numpy")
+    parser.add_argument("--saturation-gain", type=float, default=0.1)
+    parser.add_argument("--seed", type=int, default=1234)
+    args = parser.parse_args()
+
+    work_dir = tempfile.mkdtemp(prefix="load-test-")
+    corpus_dir = os.path.abspath(args.corpus) if args.corpus else os.path.join(work_dir, "corpus")
+    corpus = load_corpus(corpus_dir) if os.path.isdir(corpus_dir) else []
+    if not corpus:
+        corpus = generate_corpus(corpus_dir, [2, 10], 2, args.seed)
+
+    fakes = {
+        "gemini": FakeGemini(latency_s=args.gemini_latency_ms / 1000, stream_chunks=args.gemini_chunks,
+                             chunk_interval_s=args.gemini_chunk_ms / 1000, error_p=args.error_p, seed=args.seed),
+        "azure_tts": FakeAzureTTS(latency_s=args.tts_latency_ms / 1000, error_p=args.error_p, seed=args.seed),
+    }
+    env = dict(
+        os.environ,
+        GOOGLE_API_KEY="load-test",
+        GEMINI_MODEL=os.getenv("GEMINI_MODEL", "gemini-2.5-flash"),
+        TTS_PROVIDER="azure",
+        AZURE_TTS_KEY="load-test",
+        AZURE_TTS_DEPLOYMENT="tts",
+        DEDUP_INDEX_PATH=os.path.join(work_dir, "dedup_index"),
+        EXTRACTION_CACHE_DIR=os.path.join(work_dir, "extraction_cache"),
+    )
+
+    chroma = None
+    backend = args.vector_backend
+    if backend != "numpy":
+        chroma = start_chroma(os.path.join(work_dir, "chroma"))
+        if chroma is None:
+            if backend == "chroma":
+                raise SystemExit("❌ The chroma CLI is not installed (pip install chromadb)")
+            print("⚠️ chromadb is not installed, using the numpy vector store")
+        backend = "chroma" if chroma else "numpy"
+    if chroma:
+        fakes["chroma"] = ChromaProxy(chroma[1], latency_s=args.chroma_latency_ms / 1000, seed=args.seed)
+    else:
+        env["VECTOR_STORE_PATH"] = os.path.join(work_dir, "vectors")
+    env["VECTOR_BACKEND"] = backend
+
+    for fake in fakes.values():
+        fake.start()
+    env.update(GEMINI_BASE_URL=fakes["gemini"].url, AZURE_TTS_ENDPOINT=fakes["azure_tts"].url)
+    if chroma:
+        env.update(CHROMA_HOST="127.0.0.1", CHROMA_PORT=str(fakes["chroma"].port))
+
+    results = {}
+    try:
+        for workers in args.workers:
+            print(f"→ {workers} worker(s), {backend} vector store")
+            results[workers] = run_for_workers(workers, args, env, fakes, corpus, work_dir)
+    finally:
+        for fake in fakes.values():
+            fake.stop()
+        if chroma:
+            chroma[0].terminate()
+            chroma[0].wait(timeout=60)
+
+    params = {**vars(args), "vector_backend": backend, "corpus": corpus_dir}
+    save_results("load-test", {"params": params, "results": results})
+    # Kept with the server logs when a worker count failed
+    if not any("error" in r for r in results.values()):
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,227 @@
+"""
+Throughput benchmarks for the ingestion and search pipeline.
+
+Generates (or reuses) a synthetic corpus and measures:
+  - extraction:  pages/s of process_single_pdf (with its per-stage breakdown)
+  - inference:   rows/s of predict_single_pdf on the extracted candidates
+  - chunking:    chunks/s of chunking, embedding and the vector store write
+  - search:      p50/p99 latency of perform_semantic_search
+
+Chroma is pointed at a throw-away directory, so the real ./chroma_storage is
+never touched. Results go to benchmarks/results/bench-<timestamp>.json; compare
+two runs with --compare.
+
+    python benchmarks/run_benchmarks.py --pages 2 10 40 --docs-per-size 2
+    python benchmarks/run_benchmarks.py --compare results/bench-A.json results/bench-B.json
+"""
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+
+from common import percentile, save_results, use_service_dir
+from synthetic_corpus import generate_corpus, load_corpus
+
+SEARCH_QUERIES = [
+    "budget allocation for the project",
+    "evaluation methodology and results",
+    "security requirements of the system",
+    "community health outcomes",
+    "training program timeline",
+    "risk review and governance",
+]
+
+BENCH_USER = "bench-user"
+BENCH_FOLDER = "bench-folder"
+
+
+def stage_totals(trace):
+    """Sum wall time and items per stage name over a list of stage records."""
+    totals = {}
+    for rec in trace:
+        t = totals.setdefault(rec["stage"], {"wall_s": 0.0, "thread_cpu_s": 0.0, "items": {}})
+        t["wall_s"] += rec["wall_s"]
+        t["thread_cpu_s"] += rec["thread_cpu_s"]
+        for k, v in rec["items"].items():
+            t["items"][k] = t["items"].get(k, 0) + v
+    for t in totals.values():
+        t["wall_s"] = round(t["wall_s"], 4)
+        t["thread_cpu_s"] = round(t["thread_cpu_s"], 4)
+    return totals
+
+
+def bench_extraction(corpus):
+    import metrics
+    from pdf_title_outline_extractor import process_single_pdf
+
+    docs = []
+    pages = 0
+    with metrics.collect() as trace:
+        t0 = time.perf_counter()
+        for pdf_path, labels in corpus:
+            docs.append((pdf_path, process_single_pdf(pdf_path)))
+            pages += labels["pages"]
+        elapsed = time.perf_counter() - t0
+    return docs, {
+        "documents": len(corpus),
+        "pages": pages,
+        "seconds": round(elapsed, 3),
+        "pages_per_s": round(pages / elapsed, 2),
+        "stages": stage_totals(trace),
+    }
+
+
+def bench_inference(docs, repeat):
+    from infer_realtime import predict_single_pdf
+
+    predictions = {}
+    rows = 0
+    t0 = time.perf_counter()
+    for _ in range(repeat):
+        for pdf_path, doc in docs:
+            predictions[pdf_path] = predict_single_pdf(model_path="./xgb_model.pkl", doc=doc)
+            rows += len(doc.get("outline", []))
+    elapsed = time.perf_counter() - t0
+    return predictions, {
+        "rows": rows,
+        "seconds": round(elapsed, 3),
+        "rows_per_s": round(rows / elapsed, 2) if elapsed else None,
+    }
+
+
+def bench_chunking(predictions):
+    import metrics
+    from chunking_3 import create_chunks_with_sections
+
+    n_chunks = 0
+    with metrics.collect() as trace:
+        t0 = time.perf_counter()
+        for pdf_path, result in predictions.items():
+            headers = result.get("outline", []) if isinstance(result, dict) else []
+            chunks, _ = create_chunks_with_sections(pdf_path, headers, BENCH_FOLDER, BENCH_USER)
+            n_chunks += len(chunks)
+        elapsed = time.perf_counter() - t0
+    stages = stage_totals(trace)
+
+    def rate(stage):
+        wall = stages.get(stage, {}).get("wall_s")
+        return round(n_chunks / wall, 2) if wall else None
+
+    return {
+        "chunks": n_chunks,
+        "seconds": round(elapsed, 3),
+        "chunks_per_s": round(n_chunks / elapsed, 2) if elapsed else None,
+        "chunking_chunks_per_s": rate("chunking"),
+        "embedding_chunks_per_s": rate("embedding"),
+        "store_chunks_per_s": rate("vector_store_write"),
+        "stages": stages,
+    }
+
+
+def bench_search(repeat):
+    from semantic_search_3 import perform_semantic_search
+
+    # First query pays for lazy loading; keep it out of the numbers
+    perform_semantic_search(SEARCH_QUERIES[0], top_k=10, folder_id=BENCH_FOLDER, user_id=BENCH_USER)
+    latencies = []
+    for i in range(repeat):
+        q = SEARCH_QUERIES[i % len(SEARCH_QUERIES)]
+        t0 = time.perf_counter()
+        perform_semantic_search(q, top_k=10, folder_id=BENCH_FOLDER, user_id=BENCH_USER)
+        latencies.append(time.perf_counter() - t0)
+    return {
+        "queries": len(latencies),
+        "p50_ms": round(percentile(latencies, 50) * 1000, 2),
+        "p99_ms": round(percentile(latencies, 99) * 1000, 2),
+        "mean_ms": round(sum(latencies) / len(latencies) * 1000, 2),
+    }
+
+
+def flatten(d, prefix=""):
+    out = {}
+    for k, v in d.items():
+        key = f"{prefix}{k}"
+        if isinstance(v, dict):
+            out.update(flatten(v, key + "."))
+        elif isinstance(v, (int, float)) and not isinstance(v, bool):
+            out[key] = v
+    return out
+
+
+def compare(path_a, path_b):
+    with open(path_a, encoding="utf-8") as f:
+        a = flatten(json.load(f)["results"])
+    with open(path_b, encoding="utf-8") as f:
+        b = flatten(json.load(f)["results"])
+    print(f"{'metric':<60} {'A':>12} {'B':>12} {'change':>9}")
+    for key in sorted(set(a) & set(b)):
+        va, vb = a[key], b[key]
+        change = f"{(vb - va) / va * 100:+.1f}%" if va else "n/a"
+        print(f"{key:<60} {va:>12} {vb:>12} {change:>9}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--corpus", help="Existing corpus directory (generated if missing)")
+    parser.add_argument("--pages", type=int, nargs="+", default=[2, 10, 40])
+    parser.add_argument("--docs-per-size", type=int, default=2)
+    parser.add_argument("--seed", type=int, default=1234)
+    parser.add_argument("--inference-repeat", type=int, default=5)
+    parser.add_argument("--search-queries", type=int, default=200)
+    parser.add_argument("--only", nargs="+", choices=["extraction", "inference", "chunking", "search"])
+    parser.add_argument("--compare", nargs=2, metavar=("A", "B"))
+    args = parser.parse_args()
+
+    if args.compare:
+        compare(*args.compare)
+        return
+
+    work_dir = tempfile.mkdtemp(prefix="pdf-bench-")
+    corpus_dir = os.path.abspath(args.corpus) if args.corpus else os.path.join(work_dir, "corpus")
+    # Must be set before chroma_store, vector_store and extraction_cache are imported
+    os.environ["CHROMA_PATH"] = os.path.join(work_dir, "chroma")
+    os.environ["VECTOR_STORE_PATH"] = os.path.join(work_dir, "vectors")
+    os.environ["DEDUP_INDEX_PATH"] = os.path.join(work_dir, "dedup_index")
+    # A cold extraction cache, so every document pays for the full pipeline
+    os.environ["EXTRACTION_CACHE_DIR"] = os.path.join(work_dir, "extraction_cache")
+    os.environ.pop("CHROMA_HOST", None)
+    use_service_dir()
+
+    corpus = load_corpus(corpus_dir) if os.path.isdir(corpus_dir) else []
+    if not corpus:
+        corpus = generate_corpus(corpus_dir, args.pages, args.docs_per_size, args.seed)
+    print(f"✓ Corpus: {len(corpus)} PDFs in {corpus_dir}")
+
+    selected = set(args.only or ["extraction", "inference", "chunking", "search"])
+    results = {}
+    docs, results["extraction"] = bench_extraction(corpus)
+    print(f"  extraction: {results['extraction']['pages_per_s']} pages/s")
+    predictions, inference = bench_inference(docs, args.inference_repeat)
+    if "inference" in selected:
+        results["inference"] = inference
+        print(f"  inference:  {inference['rows_per_s']} rows/s")
+    if selected & {"chunking", "search"}:
+        results["chunking"] = bench_chunking(predictions)
+        print(f"  chunking:   {results['chunking']['chunks_per_s']} chunks/s end to end")
+    if "search" in selected:
+        results["search"] = bench_search(args.search_queries)
+        print(f"  search:     p50 {results['search']['p50_ms']} ms, p99 {results['search']['p99_ms']} ms")
+    if "extraction" not in selected:
+        results.pop("extraction")
+
+    save_results("bench", {
+        "params": {
+            "pages": args.pages,
+            "docs_per_size": args.docs_per_size,
+            "seed": args.seed,
+            "inference_repeat": args.inference_repeat,
+            "search_queries": args.search_queries,
+        },
+        "results": results,
+    })
+
+
+if __name__ == "__main__":
+    sys.exit(main())
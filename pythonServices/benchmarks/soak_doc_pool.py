@@ -0,0 +1,114 @@
+"""
+Soak test of the PDF stages for file handle and memory leaks (doc_pool.py).
+
+Processes --uploads uploads in one process, each a copy of a corpus PDF under
+a new file name (as the app stores uploads), deleted afterwards. Every upload
+runs the stages that open the PDF: header candidates and features
+(process_pdf), the first-page title heuristic, chunking and the LLM text
+digest. Every --sample uploads it records RSS and open file descriptors.
+
+Reports both at the first sample after --warmup uploads and at the end, and
+the RSS growth per 1000 uploads (least squares over the samples after the
+warm-up). Flat RSS and a constant descriptor count mean nothing is leaked.
+
+    python benchmarks/soak_doc_pool.py --corpus /tmp/corpus --uploads 3000
+"""
+import argparse
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+from common import save_results, use_service_dir
+from synthetic_corpus import generate_corpus, load_corpus
+
+
+def rss_mb():
+    with open("/proc/self/status") as f:
+        for line in f:
+            if line.startswith("VmRSS:"):
+                return int(line.split()[1]) / 1024
+    return 0.0
+
+
+def open_fds():
+    return len(os.listdir("/proc/self/fd"))
+
+
+def slope_per_1000(points):
+    """Least-squares slope of (uploads, MB) points, in MB per 1000 uploads."""
+    if len(points) < 2:
+        return 0.0
+    n = len(points)
+    mx = sum(x for x, _ in points) / n
+    my = sum(y for _, y in points) / n
+    var = sum((x - mx) ** 2 for x, _ in points)
+    return 1000 * sum((x - mx) * (y - my) for x, y in points) / var if var else 0.0
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--corpus", help="Labeled corpus directory (synthetic corpus generated if missing)")
+    parser.add_argument("--uploads", type=int, default=3000)
+    parser.add_argument("--sample", type=int, default=100, help="Uploads between RSS samples")
+    parser.add_argument("--warmup", type=int, default=300, help="Uploads before the baseline sample")
+    parser.add_argument("--mode", default="spans", help="Header candidate mode of process_pdf")
+    parser.add_argument("--seed", type=int, default=1234)
+    args = parser.parse_args()
+
+    work_dir = tempfile.mkdtemp(prefix="doc-pool-soak-")
+    corpus_dir = os.path.abspath(args.corpus) if args.corpus else os.path.join(work_dir, "corpus")
+    os.environ["EXTRACTION_CACHE"] = "0"
+    use_service_dir()
+
+    corpus = load_corpus(corpus_dir) if os.path.isdir(corpus_dir) else []
+    if not corpus:
+        corpus = generate_corpus(corpus_dir, [2, 10], 2, args.seed)
+
+    import large_pdf
+    from chunking_3 import build_chunks_with_sections
+    from pdf_title_outline_extractor import PDFTitleOutlineExtractor
+
+    extractor = PDFTitleOutlineExtractor()
+    uploads_dir = os.path.join(work_dir, "uploads")
+    os.makedirs(uploads_dir)
+
+    samples = []
+    t0 = time.perf_counter()
+    for n in range(1, args.uploads + 1):
+        source, labels = corpus[n % len(corpus)]
+        path = os.path.join(uploads_dir, f"{n}-{os.path.basename(source)}")
+        shutil.copyfile(source, path)
+
+        extractor.process_pdf(path, verbose=False, mode=args.mode)
+        extractor.extract_title_from_first_page(path)
+        headers = [{"text": h["text"], "level": h["level"], "page": h["page"]} for h in labels["outline"]]
+        build_chunks_with_sections(path, headers, "soak-folder", "soak-user")
+        large_pdf.text_digest(path)
+        os.remove(path)
+
+        if n % args.sample == 0:
+            samples.append({"uploads": n, "rss_mb": round(rss_mb(), 1), "open_fds": open_fds()})
+            print(f"  {n:>6} uploads  rss {samples[-1]['rss_mb']} MB  fds {samples[-1]['open_fds']}  "
+                  f"{time.perf_counter() - t0:.0f}s")
+
+    after = [s for s in samples if s["uploads"] >= args.warmup] or samples
+    result = {
+        "baseline": after[0],
+        "final": samples[-1],
+        "rss_mb_per_1000_uploads": round(slope_per_1000([(s["uploads"], s["rss_mb"]) for s in after]), 2),
+        "seconds": round(time.perf_counter() - t0, 1),
+    }
+    if "doc_pool" in sys.modules:
+        result["doc_pool"] = sys.modules["doc_pool"].stats()
+    print(f"✓ rss {result['baseline']['rss_mb']} -> {result['final']['rss_mb']} MB "
+          f"({result['rss_mb_per_1000_uploads']} MB per 1000 uploads), "
+          f"fds {result['baseline']['open_fds']} -> {result['final']['open_fds']}")
+
+    shutil.rmtree(work_dir, ignore_errors=True)
+    save_results("doc-pool-soak", {"params": vars(args), "samples": samples, "results": result})
+
+
+if __name__ == "__main__":
+    sys.exit(main())
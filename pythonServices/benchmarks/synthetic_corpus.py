@@ -0,0 +1,203 @@
+"""
+Deterministic synthetic PDF corpus for the benchmarks.
+
+Every document gets a title, numbered H1/H2/H3 headings, body paragraphs in a
+mix of fonts, bullet lists, ruled tables and a running header/footer. The
+generated outline is written next to each PDF as <name>.json in the same
+{"title", "outline": [{"level", "text", "page"}]} shape the extractor returns,
+so it doubles as a labeled set.
+
+    python benchmarks/synthetic_corpus.py --out /tmp/corpus --pages 2 10 40 --docs-per-size 3
+"""
+import argparse
+import json
+import os
+import random
+
+import fitz  # PyMuPDF
+
+PAGE_W, PAGE_H = 595, 842  # A4 in points
+MARGIN = 56
+LINE_GAP = 1.35
+
+BODY_FONTS = ["helv", "tiro", "cour"]
+HEADING_STYLE = {"H1": ("hebo", 18), "H2": ("hebo", 14), "H3": ("hebo", 12)}
+TITLE_STYLE = ("hebo", 24)
+
+VOCAB = (
+    "analysis budget model report policy system network energy market design process "
+    "student research method result risk quality data service customer water health "
+    "project review strategy framework impact growth training evaluation community "
+    "performance resource planning security outcome guideline standard program "
+    "the of and to in for with on by from that this is are was be as an at"
+).split()
+
+TOPICS = (
+    "Introduction Background Methodology Results Discussion Overview Scope Timeline "
+    "Funding Evaluation Implementation Governance Requirements Appendix Summary "
+    "Recommendations Stakeholders Milestones Architecture Deployment Training"
+).split()
+
+
+def sentence(rng, lo=8, hi=20):
+    words = [rng.choice(VOCAB) for _ in range(rng.randint(lo, hi))]
+    return " ".join(words).capitalize() + "."
+
+
+def heading_text(rng):
+    return " ".join(rng.sample(TOPICS, rng.randint(1, 3)))
+
+
+def wrap(text, fontname, fontsize, width):
+    """Greedy word wrap using the real glyph widths of a base-14 font."""
+    lines, current = [], ""
+    for word in text.split():
+        candidate = f"{current} {word}".strip()
+        if fitz.get_text_length(candidate, fontname=fontname, fontsize=fontsize) <= width or not current:
+            current = candidate
+        else:
+            lines.append(current)
+            current = word
+    if current:
+        lines.append(current)
+    return lines
+
+
+class Writer:
+    """Flows text, headings and tables down the pages of a new document."""
+
+    def __init__(self, doc_title):
+        self.doc = fitz.open()
+        self.doc_title = doc_title
+        self.page = None
+        self.y = 0
+        self.new_page()
+
+    def new_page(self):
+        self.page = self.doc.new_page(width=PAGE_W, height=PAGE_H)
+        pno = self.page.number + 1
+        # Running header and footer, repeated on every page
+        self.page.insert_text((MARGIN, 30), self.doc_title, fontname="helv", fontsize=8)
+        self.page.insert_text((PAGE_W / 2 - 10, PAGE_H - 24), f"Page {pno}", fontname="helv", fontsize=8)
+        self.y = MARGIN
+
+    def ensure(self, height):
+        if self.y + height > PAGE_H - MARGIN:
+            self.new_page()
+
+    def text(self, text, fontname, fontsize, indent=0, space_before=0):
+        lines = wrap(text, fontname, fontsize, PAGE_W - 2 * MARGIN - indent)
+        self.y += space_before
+        for line in lines:
+            self.ensure(fontsize * LINE_GAP)
+            self.y += fontsize * LINE_GAP
+            self.page.insert_text((MARGIN + indent, self.y), line, fontname=fontname, fontsize=fontsize)
+        return self.page.number
+
+    def table(self, rng, rows, cols, fontsize=9):
+        row_h = fontsize * 2
+        self.ensure(row_h * rows + 10)
+        self.y += 8
+        col_w = (PAGE_W - 2 * MARGIN) / cols
+        for r in range(rows):
+            for c in range(cols):
+                rect = fitz.Rect(MARGIN + c * col_w, self.y, MARGIN + (c + 1) * col_w, self.y + row_h)
+                self.page.draw_rect(rect, color=(0, 0, 0), width=0.5)
+                label = rng.choice(TOPICS) if r == 0 else str(rng.randint(1, 9999))
+                self.page.insert_text((rect.x0 + 3, rect.y1 - fontsize * 0.6), label, fontname="helv", fontsize=fontsize)
+            self.y += row_h
+        self.y += 8
+
+
+def generate_document(path, pages, seed):
+    """Write one synthetic PDF of roughly `pages` pages and return its ground-truth outline."""
+    rng = random.Random(seed)
+    title = " ".join(rng.sample(TOPICS, 3)) + " Report"
+    w = Writer(title)
+    body_font = rng.choice(BODY_FONTS)
+
+    w.text(title, *TITLE_STYLE, space_before=10)
+    outline = []
+    h1 = h2 = 0
+
+    # Keep adding sections until the last requested page is at least half full
+    while w.doc.page_count < pages or w.y < PAGE_H / 2:
+        level = rng.choices(["H1", "H2", "H3"], weights=[2, 4, 3])[0]
+        if level == "H1" or h1 == 0:
+            level = "H1"
+            h1, h2 = h1 + 1, 0
+            number = f"{h1}."
+        elif level == "H2" or h2 == 0:
+            level = "H2"
+            h2 += 1
+            number = f"{h1}.{h2}"
+        else:
+            number = f"{h1}.{h2}.{rng.randint(1, 4)}"
+        text = f"{number} {heading_text(rng)}"
+        fontname, fontsize = HEADING_STYLE[level]
+        w.ensure(fontsize * 4)
+        page_no = w.text(text, fontname, fontsize, space_before=fontsize)
+        outline.append({"level": level, "text": text, "page": page_no})
+
+        for _ in range(rng.randint(1, 3)):
+            paragraph = " ".join(sentence(rng) for _ in range(rng.randint(2, 6)))
+            w.text(paragraph, body_font, rng.choice([9, 10, 11]), space_before=6)
+        if rng.random() < 0.3:
+            for _ in range(rng.randint(2, 5)):
+                w.text("• " + sentence(rng, 4, 10), body_font, 10, indent=12, space_before=2)
+        if rng.random() < 0.25:
+            w.table(rng, rows=rng.randint(3, 6), cols=rng.randint(2, 5))
+
+        if w.doc.page_count > pages:
+            break
+
+    w.doc.save(path, garbage=3, deflate=True)
+    page_count = w.doc.page_count
+    w.doc.close()
+    return {"title": title, "outline": outline, "pages": page_count}
+
+
+def generate_corpus(out_dir, page_counts=(2, 10, 40), docs_per_size=2, seed=1234):
+    """Generate the corpus and return [(pdf_path, labels)]."""
+    os.makedirs(out_dir, exist_ok=True)
+    corpus = []
+    for pages in page_counts:
+        for i in range(docs_per_size):
+            name = f"synthetic-{pages:04d}p-{i}"
+            pdf_path = os.path.join(out_dir, name + ".pdf")
+            labels = generate_document(pdf_path, pages, seed=seed + pages * 1000 + i)
+            with open(os.path.join(out_dir, name + ".json"), "w", encoding="utf-8") as f:
+                json.dump(labels, f, indent=2)
+            corpus.append((pdf_path, labels))
+    return corpus
+
+
+def load_corpus(corpus_dir):
+    """Return [(pdf_path, labels)] for every PDF in corpus_dir that has a <name>.json next to it."""
+    corpus = []
+    for name in sorted(os.listdir(corpus_dir)):
+        if not name.lower().endswith(".pdf"):
+            continue
+        label_path = os.path.join(corpus_dir, name[:-4] + ".json")
+        if not os.path.exists(label_path):
+            continue
+        with open(label_path, encoding="utf-8") as f:
+            corpus.append((os.path.join(corpus_dir, name), json.load(f)))
+    return corpus
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--out", required=True)
+    parser.add_argument("--pages", type=int, nargs="+", default=[2, 10, 40])
+    parser.add_argument("--docs-per-size", type=int, default=2)
+    parser.add_argument("--seed", type=int, default=1234)
+    args = parser.parse_args()
+
+    corpus = generate_corpus(args.out, args.pages, args.docs_per_size, args.seed)
+    total_pages = sum(labels["pages"] for _, labels in corpus)
+    print(f"✓ Generated {len(corpus)} PDFs ({total_pages} pages) in {args.out}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,52 @@
+import os
+import threading
+
+# ===== ChromaDB connection settings =====
+CHROMA_PATH = os.getenv("CHROMA_PATH", "./chroma_storage")
+CHROMA_HOST = os.getenv("CHROMA_HOST")
+CHROMA_PORT = int(os.getenv("CHROMA_PORT", "8001"))
+COLLECTION_NAME = "pdf_chunks"
+
+_lock = threading.Lock()
+_state = {"pid": None, "client": None, "collections": {}}
+
+
+def get_client():
+    """
+    Return the ChromaDB client owned by the current process.
+
+    The client is created lazily and re-created after a fork, so a client built in a
+    preloading parent is never shared with its workers. When CHROMA_HOST is set every
+    worker talks to one Chroma server instead of opening the persistent store itself,
+    which is the only safe way to share ./chroma_storage between processes.
+    """
+    pid = os.getpid()
+    with _lock:
+        if _state["pid"] != pid:
+            import chromadb
+
+            if CHROMA_HOST:
+                client = chromadb.HttpClient(host=CHROMA_HOST, port=CHROMA_PORT)
+            else:
+                client = chromadb.PersistentClient(path=CHROMA_PATH)
+            _state.update(pid=pid, client=client, collections={})
+        return _state["client"]
+
+
+def get_collection(name: str = COLLECTION_NAME):
+    """Return (creating if needed) a cosine-space collection for the current process."""
+    client = get_client()
+    with _lock:
+        collection = _state["collections"].get(name)
+        if collection is None:
+            collection = client.get_or_create_collection(
+                name=name,
+                metadata={"hnsw:space": "cosine"}
+            )
+            _state["collections"][name] = collection
+        return collection
+
+
+def is_shared() -> bool:
+    """True when the store is served by a Chroma server and safe for several workers."""
+    return bool(CHROMA_HOST)
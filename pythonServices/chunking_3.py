@@ -2,69 +2,55 @@ from typing import List, Dict, Tuple, Any
 import os
 import re
 import fitz  # PyMuPDF
-import chromadb
-from sentence_transformers import SentenceTransformer
-import nltk
-nltk.download("punkt", quiet=True)
+import numpy as np
+import dedup
+import doc_pool
+import embedding_scheduler
+import extraction_cache
+import index_gc
+import large_pdf
+import metrics
+import vector_store
+from span_index import PageSpanIndex
 
-# ===== Embedding + ChromaDB Setup =====
-EMBEDDING_MODEL = "all-mpnet-base-v2"
-embedding_model = SentenceTransformer(EMBEDDING_MODEL)
-
-chroma_client = chromadb.PersistentClient(path="./chroma_storage")
-collection = chroma_client.get_or_create_collection(
-    name="pdf_chunks",
-    metadata={"hnsw:space": "cosine"}
-)
+# Characters of a section's chunk text stored with its title
+SECTION_DIGEST_CHARS = int(os.getenv("SECTION_DIGEST_CHARS", "500"))
+# Weight of the title in a section vector, next to the mean of its chunk vectors
+SECTION_TITLE_WEIGHT = float(os.getenv("SECTION_TITLE_WEIGHT", "0.3"))
 
 def find_header_bbox_precise(page, header_text: str) -> Any:
     """
-    Find header bbox by grouping all spans that match fully or partially.
-    Returns merged bbox or None.
-    """
-    header_lower = header_text.lower().strip()
-    spans = []
-    blocks = page.get_text("dict")["blocks"]
-
-    for block in blocks:
-        if "lines" in block:
-            for line in block["lines"]:
-                for span in line["spans"]:
-                    span_text = span["text"].lower().strip()
-                    if span_text and (header_lower in span_text or span_text in header_lower):
-                        spans.append(span["bbox"])
-
-    if spans:
-        x0 = min(b[0] for b in spans)
-        y0 = min(b[1] for b in spans)
-        x1 = max(b[2] for b in spans)
-        y1 = max(b[3] for b in spans)
-        return (x0, y0, x1, y1)
-    else:
-        return None
-
-def batch_add_to_chromadb(collection, ids, embeddings, documents, metadatas, batch_size=5000):
-    total = len(ids)
-    for start in range(0, total, batch_size):
-        end = min(start + batch_size, total)
-        collection.add(
-            ids=ids[start:end],
-            embeddings=embeddings[start:end],
-            documents=documents[start:end],
-            metadatas=metadatas[start:end]
-        )
+    Find header bbox: the merged bbox of the contiguous spans matching the header.
+    Returns None if the header is not on the page. Builds a span index of the page,
+    so when resolving several headers, build one PageSpanIndex and reuse it.
+    """
+    index = PageSpanIndex(page)
+    run = index.find(header_text)
+    return index.bbox(*run) if run else None
 
-def store_chunks_in_chromadb(chunks: List[Dict], folder_id: str, user_id: str, filename: str):
+def embed_texts(texts: List[str]) -> np.ndarray:
     """
-    Stores chunks in ChromaDB with embeddings, replacing existing ones if IDs match.
-    Uses batch processing to respect max batch size limits.
+    Embeddings of texts in input order, encoded by the shared scheduler in batches
+    of similar length so little compute is spent on padding.
+    """
+    return embedding_scheduler.embed(texts, priority=embedding_scheduler.BULK)
+
+def chunk_records(chunks: List[Dict], folder_id: str, user_id: str, filename: str) -> Tuple[List[str], List[str], List[Dict]]:
+    """
+    Ids, documents and metadatas of one document's chunks. Ids are keyed by
+    content (the dedup exact key and its occurrence in the document), not by
+    position: when a PDF is chunked differently, an id never ends up on
+    another text, so locations kept by id stay with the text they belong to.
     """
     ids = []
     documents = []
     metadatas = []
+    occurrences: Dict[str, int] = {}
 
     for chunk in chunks:
-        pk = f"{folder_id}:{user_id}:{filename}:{chunk['chunk_index']}"
+        key = dedup.exact_key(dedup.normalize(chunk["text"]))[:16]
+        occurrences[key] = occurrences.get(key, -1) + 1
+        pk = f"{folder_id}:{user_id}:{filename}:{key}-{occurrences[key]}"
         ids.append(pk)
         documents.append(chunk["text"])
         metadatas.append({
@@ -74,34 +60,196 @@ def store_chunks_in_chromadb(chunks: List[Dict], folder_id: str, user_id: str, f
             "page": chunk["page"]+1,
             "bbox": str(chunk["bbox"]),
             "section": chunk["section"],
+            "section_id": chunk["section_id"],
             "section_level": chunk["section_level"],
             "page_height": chunk["page_height"]
         })
+    return ids, documents, metadatas
 
-    unique_ids = list(dict.fromkeys(ids))
-    id_to_doc = dict(zip(ids, documents))
+def section_records(sections: List[Dict], chunks: List[Dict], folder_id: str, user_id: str, filename: str) -> Tuple[List[str], List[str], List[Dict]]:
+    """
+    Ids, documents and metadatas of one document's sections. A section is stored as
+    its title followed by the start of its text; sections without chunks are skipped.
+    """
+    texts_by_section: Dict[str, List[str]] = {}
+    for chunk in chunks:
+        texts_by_section.setdefault(chunk["section_id"], []).append(chunk["text"])
+
+    ids = []
+    documents = []
+    metadatas = []
+    for section in sections:
+        texts = texts_by_section.get(section["id"])
+        if not texts:
+            continue
+        digest = " ".join(texts)[:SECTION_DIGEST_CHARS]
+        ids.append(section["id"])
+        documents.append(f"{section['text']}\n{digest}")
+        metadatas.append({
+            "folder_id": folder_id,
+            "user_id": user_id,
+            "filename": filename,
+            "page": section["page"],
+            "bbox": str(section["bbox"]),
+            "section": section["text"],
+            "section_id": section["id"],
+            "section_level": section["level"],
+            "page_height": section["page_height"],
+            "chunks": len(texts)
+        })
+    return ids, documents, metadatas
+
+def section_vectors(chunk_embeddings: np.ndarray, chunk_section_ids: List[str], section_ids: List[str], title_embeddings: np.ndarray) -> np.ndarray:
+    """
+    One vector per section: the mean of its (normalized) chunk vectors plus
+    SECTION_TITLE_WEIGHT times its title vector. Covers the whole section, not just
+    its first paragraph, without encoding any text twice.
+    """
+    def normalized(v):
+        return v / np.maximum(np.linalg.norm(v, axis=1, keepdims=True), 1e-12)
+
+    position = {sid: i for i, sid in enumerate(section_ids)}
+    rows = np.array([position.get(sid, -1) for sid in chunk_section_ids], dtype=np.int64)
+    keep = rows >= 0
+    sums = np.zeros((len(section_ids), chunk_embeddings.shape[1]), dtype=np.float32)
+    np.add.at(sums, rows[keep], normalized(chunk_embeddings[keep]))
+    return normalized(sums) + SECTION_TITLE_WEIGHT * normalized(title_embeddings)
+
+def _unique(ids: List[str], texts: List[str], metadatas: List[Dict]) -> Tuple[List[str], List[str], List[Dict]]:
+    # Last write wins, in first-seen order
+    id_to_doc = dict(zip(ids, texts))
     id_to_meta = dict(zip(ids, metadatas))
+    unique_ids = list(dict.fromkeys(ids))
+    return unique_ids, [id_to_doc[uid] for uid in unique_ids], [id_to_meta[uid] for uid in unique_ids]
+
+def store_documents(documents: List[Tuple[List[Dict], List[Dict], str, str, str]]) -> int:
+    """
+    Stores the chunks and sections of several documents, given as
+    (chunks, sections, folder_id, user_id, filename), in the vector store: one pooled
+    embedding pass and large writes, replacing the PDFs' previous entries. Near-duplicate chunks
+    (dedup.py) are folded into one stored chunk with a list of locations instead of
+    being embedded again. Returns the number of chunks stored.
+    """
+    chunk_rows = ([], [], [])
+    section_rows = ([], [], [])
+    for chunks, sections, folder_id, user_id, filename in documents:
+        for rows, records in ((chunk_rows, chunk_records(chunks, folder_id, user_id, filename)),
+                              (section_rows, section_records(sections or [], chunks, folder_id, user_id, filename))):
+            for column, values in zip(rows, records):
+                column.extend(values)
 
-    embeddings = embedding_model.encode(
-        [id_to_doc[uid] for uid in unique_ids],
-        show_progress_bar=True,
-        convert_to_numpy=True
-    )
+    chunk_ids, chunk_texts, chunk_metas = _unique(*chunk_rows)
+    section_ids, section_texts, section_metas = _unique(*section_rows)
+    replaced = {(d[2], d[3], d[4]) for d in documents}
+    if not chunk_ids:
+        # The PDFs now give no chunks: only their earlier entries are left to remove
+        _remove_replaced(replaced, [], [], {})
+        return 0
 
-    existing = collection.get(ids=unique_ids)
-    if existing["ids"]:
-        collection.delete(ids=existing["ids"])
+    chunk_store = vector_store.get_store(vector_store.CHUNKS)
 
-    batch_add_to_chromadb(
-        collection,
-        unique_ids,
-        embeddings.tolist(),
-        [id_to_doc[uid] for uid in unique_ids],
-        [id_to_meta[uid] for uid in unique_ids],
-        batch_size=5000  # safe limit below 5461
-    )
+    def stored_ids(folder_id, user_id, ids):
+        # Entries of the PDFs being replaced are removed after this run, so nothing is folded into them
+        return [i for i, meta in _stored_chunk_metas(folder_id, user_id, ids).items()
+                if (folder_id, user_id, meta["filename"]) not in replaced]
+
+    duplicates = None
+    if dedup.DEDUP:
+        with metrics.stage("dedup", chunks=len(chunk_ids)) as st:
+            duplicates = dedup.deduplicate(chunk_ids, chunk_texts, chunk_metas, stored_ids=stored_ids)
+            st.count(duplicates=duplicates.duplicates)
+        chunk_metas = _keep_stored_locations(chunk_store, duplicates.metadatas, chunk_ids, duplicates.kept)
+        chunk_ids, chunk_texts, chunk_metas = (
+            [column[i] for i in duplicates.kept] for column in (chunk_ids, chunk_texts, chunk_metas)
+        )
+
+    with metrics.stage("embedding", chunks=len(chunk_ids), sections=len(section_ids), documents=len(documents)):
+        embeddings = embed_texts(chunk_texts + [meta["section"] for meta in section_metas])
+        chunk_embeddings = embeddings[:len(chunk_ids)]
+        section_embeddings = section_vectors(
+            chunk_embeddings, [meta["section_id"] for meta in chunk_metas], section_ids, embeddings[len(chunk_ids):]
+        )
 
-    print(f"✅ Stored {len(unique_ids)} unique chunks for {filename} in ChromaDB.")
+    with metrics.stage("vector_store_write", chunks=len(chunk_ids), sections=len(section_ids)):
+        if chunk_ids:
+            chunk_store.upsert(chunk_ids, chunk_embeddings, chunk_texts, chunk_metas)
+        if section_ids:
+            vector_store.get_store(vector_store.SECTIONS).upsert(
+                section_ids, section_embeddings, section_texts, section_metas
+            )
+        if duplicates is not None:
+            _add_stored_locations(chunk_store, duplicates.stored_updates)
+            dedup.commit(duplicates)
+    # Only now that this run is stored: a PDF processed again may produce fewer chunks
+    _remove_replaced(replaced, chunk_ids + section_ids, chunk_metas,
+                     duplicates.stored_updates if duplicates is not None else {})
+    return len(chunk_ids)
+
+def _stored_chunk_metas(folder_id: str, user_id: str, ids: List[str]) -> Dict[str, Dict]:
+    return vector_store.get_store(vector_store.CHUNKS).get_metadata(ids, folder_id, user_id)
+
+def _remove_replaced(replaced, stored_ids: List[str], chunk_metas: List[Dict], stored_updates: Dict) -> None:
+    """Removes the entries and locations of the (folder_id, user_id, filename) PDFs that this run did not store again."""
+    locations = [loc for meta in chunk_metas for loc in dedup.all_locations(meta)]
+    locations += [loc for updates in stored_updates.values() for locs in updates.values() for loc in locs]
+    by_tenant: Dict[Tuple[str, str], List[str]] = {}
+    for folder_id, user_id, filename in replaced:
+        by_tenant.setdefault((folder_id, user_id), []).append(filename)
+    for (folder_id, user_id), filenames in by_tenant.items():
+        index_gc.delete_files(folder_id, user_id, filenames, keep_ids=stored_ids, keep_locations=locations)
+
+def _keep_stored_locations(store: "vector_store.VectorStore", metadatas: List[Dict], ids: List[str], kept: List[int]) -> List[Dict]:
+    """
+    A chunk stored again (same document re-ingested) keeps the locations other
+    documents' duplicates added to it. Ids are content-keyed (chunk_records), so
+    a stored entry with the same id holds the same text.
+    """
+    metadatas = list(metadatas)
+    by_tenant: Dict[Tuple[str, str], List[int]] = {}
+    for i in kept:
+        by_tenant.setdefault((metadatas[i]["folder_id"], metadatas[i]["user_id"]), []).append(i)
+    for (folder_id, user_id), rows in by_tenant.items():
+        stored = store.get_metadata([ids[i] for i in rows], folder_id, user_id)
+        for i in rows:
+            old = stored.get(ids[i])
+            if old and old.get("locations"):
+                others = [loc for loc in dedup.all_locations(old) if loc["filename"] != metadatas[i]["filename"]]
+                metadatas[i] = dedup.add_locations(metadatas[i], others)
+    return metadatas
+
+def _add_stored_locations(store: "vector_store.VectorStore", updates: Dict[Tuple[str, str], Dict[str, List[Dict]]]):
+    """Appends the locations of this batch's duplicates to the stored chunks they duplicate."""
+    for (folder_id, user_id), locations in updates.items():
+        stored = store.get_metadata(list(locations), folder_id, user_id)
+        ids = [i for i in locations if i in stored]
+        if ids:
+            store.update_metadata(ids, [dedup.add_locations(stored[i], locations[i]) for i in ids], folder_id, user_id)
+
+def store_chunks_in_chromadb(chunks: List[Dict], folder_id: str, user_id: str, filename: str, sections: List[Dict] = None):
+    """
+    Stores chunks (and their sections) in the vector store (VECTOR_BACKEND) with embeddings,
+    replacing existing ones if IDs match.
+    """
+    stored = store_documents([(chunks, sections or [], folder_id, user_id, filename)])
+    print(f"✅ Stored {stored} unique chunks for {filename} in the {vector_store.VECTOR_BACKEND} vector store.")
+
+def build_chunks_with_sections(
+    pdf_path: str,
+    headers: List[Dict],
+    folder_id: str,
+    user_id: str
+) -> Tuple[List[Dict], List[Dict]]:
+    """
+    Creates chunks by merging 5 consecutive spans between headers, without storing them.
+    Served from the extraction cache when this PDF was chunked with the same headers before.
+    """
+    cached = extraction_cache.get_chunks(pdf_path, headers, folder_id, user_id)
+    if cached is not None:
+        return cached
+    with metrics.stage("chunking") as st, doc_pool.document(pdf_path) as doc:
+        chunks, sections = _build_chunks(doc, pdf_path, headers, folder_id, user_id, st)
+    extraction_cache.put_chunks(pdf_path, headers, chunks, sections)
+    return chunks, sections
 
 def create_chunks_with_sections(
     pdf_path: str,
@@ -115,10 +263,26 @@ def create_chunks_with_sections(
     Creates chunks by merging 3 consecutive spans between headers.
     Each chunk contains merged text, combined bbox, and metadata.
     """
-    doc = fitz.open(pdf_path)
+    filename = os.path.basename(pdf_path)
+    chunks, sections = build_chunks_with_sections(pdf_path, headers, folder_id, user_id)
+    if chunks:
+        store_chunks_in_chromadb(chunks, folder_id, user_id, filename, sections)
+    return chunks, sections
+
+def _build_chunks(
+    doc: fitz.Document,
+    pdf_path: str,
+    headers: List[Dict],
+    folder_id: str,
+    user_id: str,
+    st: "metrics.Stage"
+) -> Tuple[List[Dict], List[Dict]]:
+    window = large_pdf.page_window(pdf_path)
     chunks: List[Dict] = []
     sections: List[Dict] = []
     index = 0
+    span_count = 0
+    pages_scanned = 0
     filename = os.path.basename(pdf_path)
 
     def _sort_key(h: Dict):
@@ -128,35 +292,53 @@ def create_chunks_with_sections(
             round(h.get("x", 0.0), 1),
         )
 
-    # Sort and resolve headers with bbox
+    # Span index of each page, built once; pages before the current section are dropped
+    page_indexes: Dict[int, PageSpanIndex] = {}
+
+    def page_index(p: int) -> PageSpanIndex:
+        nonlocal pages_scanned
+        idx = page_indexes.get(p)
+        if idx is None:
+            idx = page_indexes[p] = PageSpanIndex(doc[p])
+            pages_scanned += 1
+            if window and pages_scanned % window == 0:
+                large_pdf.release_page_cache()
+        return idx
+
+    # Sort and resolve headers to their span run
     headers_sorted = sorted(headers, key=_sort_key)
     resolved = []
+    next_span: Dict[int, int] = {}
     for h in headers_sorted:
         page_num = h["page"]
         if page_num < 0 or page_num >= doc.page_count:
             continue
-        page = doc[page_num]
-        bbox = find_header_bbox_precise(page, h["text"])
-        if not bbox:
+        idx = page_index(page_num)
+        run = idx.find(h["text"], after=next_span.get(page_num, 0))
+        if not run:
             continue
-        resolved.append({**h, "bbox": bbox})
+        next_span[page_num] = run[1] + 1
+        resolved.append({**h, "bbox": idx.bbox(*run), "span": run[0]})
 
     if not resolved:
-        doc.close()
         return [], []
 
+    # Sections in reading order: each one runs from its header's first span to
+    # the next header's first span
+    resolved.sort(key=lambda h: (h["page"], h["span"]))
+
     # Iterate over sections
     for si, h in enumerate(resolved):
-        start_page = h["page"]
-        start_y = h["bbox"][1]
+        start_page, start_span = h["page"], h["span"]
 
         if si + 1 < len(resolved):
             next_h = resolved[si + 1]
-            end_page = next_h["page"]
-            end_y = next_h["bbox"][1]
+            end_page, end_span = next_h["page"], next_h["span"]
         else:
-            end_page = doc.page_count - 1
-            end_y = doc[end_page].rect.height
+            end_page, end_span = doc.page_count - 1, None
+
+        for p in [p for p in page_indexes if p < start_page]:
+            del page_indexes[p]
 
         section_id = f"{folder_id}:{user_id}:{filename}:sec{si}"
         sections.append({
@@ -166,48 +348,43 @@ def create_chunks_with_sections(
             "page": start_page + 1,
             "bbox": tuple(h["bbox"]),
             "document_path": pdf_path,
-            "page_height": doc[start_page].rect.height
+            "page_height": page_index(start_page).height
         })
 
         # Buffer for merging spans
         span_buffer = []
 
         for p in range(start_page, end_page + 1):
-            page = doc[p]
-            blocks = page.get_text("dict")["blocks"]
-
-            for block in blocks:
-                if "lines" in block:
-                    for line in block["lines"]:
-                        for span in line["spans"]:
-                            span_text = span["text"].strip()
-                            if not span_text:
-                                continue
-                            span_bbox = tuple(span["bbox"])
-                            span_buffer.append((span_text, span_bbox, p))
-
-                            # If we have 5 spans, merge them
-                            if len(span_buffer) == 5:
-                                merged_text = " ".join(s[0] for s in span_buffer)
-                                x0 = min(s[1][0] for s in span_buffer)
-                                y0 = min(s[1][1] for s in span_buffer)
-                                x1 = max(s[1][2] for s in span_buffer)
-                                y1 = max(s[1][3] for s in span_buffer)
-                                chunks.append({
-                                    "text": merged_text,
-                                    "bbox": (x0, y0, x1, y1),
-                                    "page": span_buffer[0][2],
-                                    "section_id": section_id,
-                                    "section": h["text"],
-                                    "section_level": h.get("level"),
-                                    "chunk_index": index,
-                                    "document_path": pdf_path,
-                                    "page_height": page.rect.height
-                                })
-                                index += 1
-                                span_buffer = []
-
-        # Add any leftover spans (less than 3)
+            idx = page_index(p)
+            first = start_span if p == start_page else 0
+            last = end_span if p == end_page and end_span is not None else len(idx.spans)
+
+            for span_text, span_bbox in idx.spans[first:last]:
+                span_buffer.append((span_text, span_bbox, p))
+                span_count += 1
+
+                # If we have 5 spans, merge them
+                if len(span_buffer) == 5:
+                    merged_text = " ".join(s[0] for s in span_buffer)
+                    x0 = min(s[1][0] for s in span_buffer)
+                    y0 = min(s[1][1] for s in span_buffer)
+                    x1 = max(s[1][2] for s in span_buffer)
+                    y1 = max(s[1][3] for s in span_buffer)
+                    chunks.append({
+                        "text": merged_text,
+                        "bbox": (x0, y0, x1, y1),
+                        "page": span_buffer[0][2],
+                        "section_id": section_id,
+                        "section": h["text"],
+                        "section_level": h.get("level"),
+                        "chunk_index": index,
+                        "document_path": pdf_path,
+                        "page_height": idx.height
+                    })
+                    index += 1
+                    span_buffer = []
+
+        # Add any leftover spans (less than 5)
         if span_buffer:
             merged_text = " ".join(s[0] for s in span_buffer)
             x0 = min(s[1][0] for s in span_buffer)
@@ -223,11 +400,10 @@ def create_chunks_with_sections(
                 "section_level": h.get("level"),
                 "chunk_index": index,
                 "document_path": pdf_path,
-                "page_height": doc[span_buffer[0][2]].rect.height
+                "page_height": page_index(span_buffer[0][2]).height
             })
             index += 1
             span_buffer = []
 
-    doc.close()
-    store_chunks_in_chromadb(chunks, folder_id, user_id, filename)
+    st.count(pages=pages_scanned, spans=span_count, chunks=len(chunks))
     return chunks, sections
@@ -0,0 +1,191 @@
+"""
+Context of an /insights prompt: the summaries of the folder's PDFs that relate
+to the selected text, within a token budget.
+
+The app sends the summary of every PDF of the folder with each selection, so
+the prompt (and time to first token) grew with the folder. assemble() keeps
+them all while they fit in INSIGHT_CONTEXT_TOKENS estimated tokens; beyond
+that it ranks the summaries by cosine similarity to the selected text and
+keeps the best ones that fit. Summaries are embedded once (cached by their
+text) and selections are cached, so repeated selections and unchanged folders
+cost no model calls.
+"""
+import hashlib
+import os
+import re
+import threading
+from collections import OrderedDict
+from typing import List, Optional, Sequence, Tuple
+
+import numpy as np
+
+import embedding_scheduler
+import metrics
+
+# Estimated tokens (embedding_scheduler.estimate_tokens) of summaries in the prompt
+INSIGHT_CONTEXT_TOKENS = int(os.getenv("INSIGHT_CONTEXT_TOKENS", "3000"))
+# Summaries less similar than this are left out; the best one is always kept
+INSIGHT_MIN_SIMILARITY = float(os.getenv("INSIGHT_MIN_SIMILARITY", "0.15"))
+# Cached selections; summary vectors are cached for 8 times as many summaries
+INSIGHT_CONTEXT_CACHE_SIZE = int(os.getenv("INSIGHT_CONTEXT_CACHE_SIZE", "1024"))
+# A summary is embedded in pieces of about this many tokens (the model truncates at 384)
+PIECE_TOKENS = 256
+
+metrics.describe("insight_context_cache_total", "counter", "Insight context selections served from the cache or computed")
+
+Document = Tuple[str, str]
+
+
+class _LRU:
+    def __init__(self, size: int):
+        self.size = size
+        self._items: "OrderedDict[str, object]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str):
+        with self._lock:
+            if key not in self._items:
+                return None
+            self._items.move_to_end(key)
+            return self._items[key]
+
+    def put(self, key: str, value) -> None:
+        with self._lock:
+            self._items[key] = value
+            self._items.move_to_end(key)
+            while len(self._items) > self.size:
+                self._items.popitem(last=False)
+
+
+_vectors = _LRU(INSIGHT_CONTEXT_CACHE_SIZE * 8)
+_selections = _LRU(INSIGHT_CONTEXT_CACHE_SIZE)
+
+
+def _digest(*parts: str) -> str:
+    h = hashlib.sha1()
+    for part in parts:
+        h.update(part.encode("utf-8"))
+        h.update(b"\0")
+    return h.hexdigest()
+
+
+def _document_name(line: str) -> Optional[str]:
+    """The file name if line starts a "<filename>: <summary>" entry, as the app joins summaries."""
+    head, sep, _ = line.partition(": ")
+    if sep and len(head) <= 255 and (head.lower().endswith(".pdf") or head == "undefined"):
+        return head
+    return None
+
+
+def split_summaries(summaries: str) -> List[Document]:
+    """(name, summary) pairs from the app's "<filename>: <summary>" lines; a summary may span several lines."""
+    documents = []
+    name, lines = "", []
+    for line in summaries.split("\n"):
+        start = _document_name(line)
+        if start is None:
+            lines.append(line)
+            continue
+        if "\n".join(lines).strip():
+            documents.append((name, "\n".join(lines).strip()))
+        name, lines = start, [line[len(start) + 2:]]
+    if "\n".join(lines).strip():
+        documents.append((name, "\n".join(lines).strip()))
+    return documents
+
+
+def _pieces(text: str) -> List[str]:
+    """Paragraphs of text, merged up to PIECE_TOKENS each."""
+    pieces, current = [], ""
+    for paragraph in re.split(r"\n\s*\n", text):
+        paragraph = paragraph.strip()
+        if not paragraph:
+            continue
+        if current and embedding_scheduler.estimate_tokens(current + "\n\n" + paragraph) > PIECE_TOKENS:
+            pieces.append(current)
+            current = paragraph
+        else:
+            current = f"{current}\n\n{paragraph}" if current else paragraph
+    if current:
+        pieces.append(current)
+    return pieces or [text]
+
+
+def _unit(vectors: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    return vectors / np.maximum(norms, 1e-12)
+
+
+def _summary_vectors(summaries: Sequence[str]) -> List[np.ndarray]:
+    """Unit vectors of the pieces of each summary, embedding only summaries not seen before."""
+    keys = [_digest(s) for s in summaries]
+    found = {key: _vectors.get(key) for key in keys}
+    missing = [(key, s) for key, s in zip(keys, summaries) if found[key] is None]
+    if missing:
+        pieces = [_pieces(s) for _, s in missing]
+        vectors = embedding_scheduler.embed([p for ps in pieces for p in ps], priority=embedding_scheduler.SEARCH)
+        start = 0
+        for (key, _), ps in zip(missing, pieces):
+            found[key] = _unit(np.asarray(vectors[start:start + len(ps)], dtype=np.float32))
+            _vectors.put(key, found[key])
+            start += len(ps)
+    return [found[key] for key in keys]
+
+
+def _fit(text: str, tokens: int) -> str:
+    """text cut to about `tokens` estimated tokens."""
+    return text if embedding_scheduler.estimate_tokens(text) <= tokens else text[:max(0, tokens - 2) * 4].rstrip() + " …"
+
+
+def select(selected_text: str, documents: Sequence[Document], budget: int = None) -> List[Document]:
+    """
+    The documents to put in the prompt, in their original order: all of them if
+    they fit in `budget` tokens, otherwise the most similar to selected_text that
+    fit (the most similar one cut to the budget if it is too long by itself).
+    """
+    budget = INSIGHT_CONTEXT_TOKENS if budget is None else budget
+    documents = [(name, summary) for name, summary in documents if summary.strip()]
+    costs = [embedding_scheduler.estimate_tokens(f"{name}: {summary}") for name, summary in documents]
+    if sum(costs) <= budget:
+        return documents
+
+    query = _unit(embedding_scheduler.embed([selected_text], priority=embedding_scheduler.SEARCH))[0]
+    scores = [float(np.max(vectors @ query)) for vectors in _summary_vectors([s for _, s in documents])]
+    ranked = sorted(range(len(documents)), key=lambda i: -scores[i])
+
+    chosen, used = {}, 0
+    for rank, i in enumerate(ranked):
+        if rank > 0 and scores[i] < INSIGHT_MIN_SIMILARITY:
+            break
+        name, summary = documents[i]
+        if used + costs[i] <= budget:
+            chosen[i] = summary
+            used += costs[i]
+        elif rank == 0:
+            chosen[i] = _fit(summary, budget - embedding_scheduler.estimate_tokens(f"{name}: "))
+            used = budget
+    return [(documents[i][0], chosen[i]) for i in sorted(chosen)]
+
+
+def assemble(summaries: str, selected_text: str, documents: Optional[Sequence[Document]] = None, budget: int = None) -> str:
+    """
+    The previous-summaries part of the insights prompt. `documents` are
+    (name, summary) pairs; without them they are parsed from `summaries`.
+    """
+    budget = INSIGHT_CONTEXT_TOKENS if budget is None else budget
+    documents = list(documents or ())
+    key = _digest(str(budget), selected_text, summaries if not documents else "",
+                  *(part for doc in documents for part in doc))
+    cached = _selections.get(key)
+    if cached is not None:
+        metrics.inc("insight_context_cache_total", result="hit")
+        return cached
+
+    metrics.inc("insight_context_cache_total", result="miss")
+    documents = documents or split_summaries(summaries)
+    with metrics.stage("insight_context", documents=len(documents)) as st:
+        selected = select(selected_text, documents, budget)
+        context = "\n".join(f"{name}: {summary}" if name else summary for name, summary in selected)
+        st.count(selected=len(selected), tokens=embedding_scheduler.estimate_tokens(context))
+    _selections.put(key, context)
+    return context
@@ -0,0 +1,330 @@
+"""
+Near-duplicate chunk elimination before embedding.
+
+Running headers and footers, page numbers and repeated boilerplate come out
+of the chunker once per page. Before a batch is embedded, every chunk is
+compared with the chunks already stored for its folder and with the earlier
+chunks of the batch:
+
+  exact   same text after lower-casing, collapsing punctuation/whitespace and
+          dropping page-number lines and a section number at the chunk's edges
+          ("Page 3 of 40" == "Page 4 of 40"); other figures are kept, so text
+          that differs only in its numbers is not a duplicate
+  near    MinHash signatures of word 3-grams, candidates found through LSH
+          bands, kept when the estimated Jaccard similarity is >= DEDUP_THRESHOLD
+
+A duplicate is not embedded or stored; its location (filename, page, bbox) is
+appended to the "locations" of the chunk it duplicates. The signatures of a
+folder's stored chunks live in DEDUP_INDEX_PATH/<user>/<folder>/index.jsonl,
+file-locked like the numpy vector store.
+"""
+import fcntl
+import hashlib
+import json
+import os
+import re
+import threading
+import zlib
+from contextlib import contextmanager
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+DEDUP = os.getenv("DEDUP", "1") == "1"
+DEDUP_THRESHOLD = float(os.getenv("DEDUP_THRESHOLD", "0.8"))
+DEDUP_INDEX_PATH = os.getenv("DEDUP_INDEX_PATH", "./dedup_index")
+
+SHINGLE_WORDS = 3
+NUM_PERM = 64
+# 16 bands of 4 rows: pairs above ~0.5 Jaccard share a band with high probability
+BANDS = 16
+ROWS_PER_BAND = NUM_PERM // BANDS
+_PRIME = (1 << 31) - 1
+_rng = np.random.RandomState(20240601)
+_A = _rng.randint(1, _PRIME, NUM_PERM).astype(np.uint64)
+_B = _rng.randint(0, _PRIME, NUM_PERM).astype(np.uint64)
+
+_NON_ALNUM_RE = re.compile(r"[\W_]+")
+_DIGIT_RE = re.compile(r"\d")
+# A line holding only a page number: "3", "Page 3", "p. 3 of 40", "3/40"
+_PAGE_LINE_RE = re.compile(r"^\s*(?:(?:page|pg|p)\.?\s*)?\d+(?:\s*(?:of|/)\s*\d+)?\s*$", re.IGNORECASE)
+# A section number opening the chunk: "2.", "3.1", "4.2.1)"
+_SECTION_NUMBER_RE = re.compile(r"^\s*\d+(?:\.\d+)*[.)]?\s+(?=\D)")
+
+INDEX_FILE = "index.jsonl"
+LOCK_FILE = "lock"
+
+
+def _strip_edge_numbers(text: str) -> str:
+    """The text without page-number lines at its start and end and without a leading section number."""
+    lines = text.strip().splitlines()
+    while lines and (not lines[0].strip() or _PAGE_LINE_RE.match(lines[0])):
+        lines.pop(0)
+    while lines and (not lines[-1].strip() or _PAGE_LINE_RE.match(lines[-1])):
+        lines.pop()
+    if not lines:
+        # Nothing but a page number (a footer): equal on every page
+        return _DIGIT_RE.sub("0", text)
+    return _SECTION_NUMBER_RE.sub("", "\n".join(lines), count=1)
+
+
+def normalize(text: str) -> str:
+    return _NON_ALNUM_RE.sub(" ", _strip_edge_numbers(text).lower()).strip()
+
+
+def exact_key(normalized: str) -> str:
+    return hashlib.sha1(normalized.encode("utf-8")).hexdigest()
+
+
+def signature(normalized: str) -> np.ndarray:
+    """MinHash signature (NUM_PERM uint32 values) of the text's word 3-grams."""
+    words = normalized.split()
+    if len(words) <= SHINGLE_WORDS:
+        shingles = {normalized}
+    else:
+        shingles = {" ".join(words[i:i + SHINGLE_WORDS]) for i in range(len(words) - SHINGLE_WORDS + 1)}
+    hashes = np.fromiter((zlib.crc32(s.encode("utf-8")) for s in shingles), dtype=np.uint64, count=len(shingles))
+    return ((hashes[:, None] * _A + _B) % _PRIME).min(axis=0).astype(np.uint32)
+
+
+def band_keys(sig: np.ndarray) -> List[Tuple[int, bytes]]:
+    return [(b, sig[b * ROWS_PER_BAND:(b + 1) * ROWS_PER_BAND].tobytes()) for b in range(BANDS)]
+
+
+def similarity(a: np.ndarray, b: np.ndarray) -> float:
+    """Estimated Jaccard similarity of two signatures."""
+    return float(np.mean(a == b))
+
+
+def _safe_name(value: str) -> str:
+    return re.sub(r"[^\w.-]", "_", str(value)) or "_"
+
+
+class FolderIndex:
+    """Exact keys and MinHash signatures of the chunks stored for one folder."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        self.ids: List[str] = []
+        self.keys: List[str] = []
+        self.sigs: List[np.ndarray] = []
+        self.by_key: Dict[str, str] = {}
+        self.by_band: Dict[Tuple[int, bytes], List[int]] = {}
+        self._offset = 0
+        self._inode = None
+
+    def _file(self, name):
+        return os.path.join(self.path, name)
+
+    @contextmanager
+    def _flock(self, mode):
+        os.makedirs(self.path, exist_ok=True)
+        with open(self._file(LOCK_FILE), "a") as f:
+            fcntl.flock(f, mode)
+            try:
+                yield
+            finally:
+                fcntl.flock(f, fcntl.LOCK_UN)
+
+    def _add(self, chunk_id: str, key: str, sig: np.ndarray):
+        # The latest entry wins: earlier ones may belong to deleted chunks
+        self.by_key[key] = chunk_id
+        pos = len(self.ids)
+        self.ids.append(chunk_id)
+        self.keys.append(key)
+        self.sigs.append(sig)
+        for band in band_keys(sig):
+            self.by_band.setdefault(band, []).append(pos)
+
+    def _refresh_locked(self):
+        try:
+            st = os.stat(self._file(INDEX_FILE))
+        except FileNotFoundError:
+            if self._inode is not None:
+                self.__init__(self.path)
+            return
+        if st.st_ino != self._inode:
+            # Rewritten by rewrite(): start over
+            self.__init__(self.path)
+            self._inode = st.st_ino
+        if st.st_size == self._offset:
+            return
+        with open(self._file(INDEX_FILE), "rb") as f:
+            f.seek(self._offset)
+            data = f.read()
+        end = data.rfind(b"\n") + 1
+        self._offset += end
+        for line in data[:end].splitlines():
+            if line.strip():
+                entry = json.loads(line)
+                self._add(entry["id"], entry["key"], np.array(entry["sig"], dtype=np.uint32))
+
+    def refresh(self):
+        with self._lock:
+            if self._inode is None and not os.path.exists(self._file(INDEX_FILE)):
+                return
+            with self._flock(fcntl.LOCK_SH):
+                self._refresh_locked()
+
+    def match(self, key: str, sig: np.ndarray, threshold: float = DEDUP_THRESHOLD) -> Optional[str]:
+        """Id of a stored chunk with the same key, or the most similar one above the threshold."""
+        if key in self.by_key:
+            return self.by_key[key]
+        candidates = {pos for band in band_keys(sig) for pos in self.by_band.get(band, ())}
+        best, best_sim = None, threshold
+        for pos in sorted(candidates):
+            sim = similarity(sig, self.sigs[pos])
+            if sim >= best_sim:
+                best, best_sim = self.ids[pos], sim
+        return best
+
+    def commit(self, entries: List[Tuple[str, str, np.ndarray]]):
+        """Record newly stored chunks as (id, key, signature)."""
+        if not entries:
+            return
+        with self._lock, self._flock(fcntl.LOCK_EX):
+            self._refresh_locked()
+            with open(self._file(INDEX_FILE), "a", encoding="utf-8") as f:
+                f.write("".join(json.dumps({"id": i, "key": k, "sig": s.tolist()}) + "\n" for i, k, s in entries))
+            self._refresh_locked()
+
+    def rewrite(self, keep_ids) -> int:
+        """Drop the entries of chunks not in keep_ids (deleted from the store). Returns the entries left."""
+        keep_ids = set(keep_ids)
+        with self._lock, self._flock(fcntl.LOCK_EX):
+            self._refresh_locked()
+            kept = [entry for entry in zip(self.ids, self.keys, self.sigs) if entry[0] in keep_ids]
+            with open(self._file(INDEX_FILE + ".tmp"), "w", encoding="utf-8") as f:
+                f.write("".join(json.dumps({"id": i, "key": k, "sig": s.tolist()}) + "\n" for i, k, s in kept))
+            os.replace(self._file(INDEX_FILE + ".tmp"), self._file(INDEX_FILE))
+            self._refresh_locked()
+            return len(kept)
+
+
+_indexes_lock = threading.Lock()
+_indexes: Dict[tuple, FolderIndex] = {}
+
+
+def index_path(folder_id: str, user_id: str) -> str:
+    return os.path.join(DEDUP_INDEX_PATH, _safe_name(user_id), _safe_name(folder_id))
+
+
+def folder_index(folder_id: str, user_id: str) -> FolderIndex:
+    key = (str(user_id), str(folder_id))
+    with _indexes_lock:
+        index = _indexes.get(key)
+        if index is None:
+            index = _indexes[key] = FolderIndex(index_path(folder_id, user_id))
+    index.refresh()
+    return index
+
+
+def location(meta: Dict) -> Dict:
+    return {"filename": meta["filename"], "page": meta["page"], "bbox": meta["bbox"],
+            "page_height": meta.get("page_height"), "section": meta.get("section"),
+            "section_id": meta.get("section_id")}
+
+
+def all_locations(meta: Dict) -> List[Dict]:
+    """Every place a stored chunk's text occurs; its own location first."""
+    return json.loads(meta.get("locations") or "[]") or [location(meta)]
+
+
+def add_locations(meta: Dict, locations: List[Dict]) -> Dict:
+    """Copy of a chunk's metadata with more locations, each listed once."""
+    current = all_locations(meta)
+    seen = {json.dumps(loc, sort_keys=True) for loc in current}
+    for loc in locations:
+        k = json.dumps(loc, sort_keys=True)
+        if k not in seen:
+            seen.add(k)
+            current.append(loc)
+    return {**meta, "locations": json.dumps(current)}
+
+
+class DedupResult:
+    """
+    kept:            positions of the chunks to embed and store
+    metadatas:       metadata of every chunk, with "locations" filled in for kept ones
+    stored_updates:  {(folder_id, user_id): {stored chunk id: [locations of new duplicates]}}
+    new_entries:     index entries to commit once the kept chunks are stored
+    """
+
+    def __init__(self):
+        self.kept: List[int] = []
+        self.metadatas: List[Dict] = []
+        self.stored_updates: Dict[tuple, Dict[str, List[Dict]]] = {}
+        self.new_entries: Dict[tuple, List[Tuple[str, str, np.ndarray]]] = {}
+        self.duplicates = 0
+
+
+def deduplicate(ids: List[str], texts: List[str], metadatas: List[Dict], stored_ids=None) -> DedupResult:
+    """
+    Split a batch of chunks into the ones to store and duplicates folded into
+    another chunk. stored_ids(folder_id, user_id, ids) returns which of the given
+    ids still exist in the vector store, so index entries of deleted chunks are ignored.
+    """
+    result = DedupResult()
+    result.metadatas = list(metadatas)
+    position = {chunk_id: pos for pos, chunk_id in enumerate(ids)}
+    # Per folder: the stored chunks, and the chunks kept from this batch
+    stored_indexes: Dict[tuple, FolderIndex] = {}
+    batch_indexes: Dict[tuple, FolderIndex] = {}
+    pending_matches: List[Tuple[int, tuple, str]] = []
+    # Locations of the duplicates folded into each kept chunk
+    folded_locations: Dict[int, List[Dict]] = {}
+
+    for pos, (chunk_id, text, meta) in enumerate(zip(ids, texts, metadatas)):
+        tenant = (meta["folder_id"], meta["user_id"])
+        if tenant not in batch_indexes:
+            stored_indexes[tenant] = folder_index(*tenant)
+            batch_indexes[tenant] = FolderIndex("")
+        norm = normalize(text)
+        key, sig = exact_key(norm), signature(norm)
+
+        match = batch_indexes[tenant].match(key, sig)
+        if match is not None:
+            # Duplicate of a chunk kept earlier in this batch
+            folded_locations.setdefault(position[match], []).append(location(meta))
+            result.duplicates += 1
+            continue
+
+        stored_match = stored_indexes[tenant].match(key, sig)
+        result.kept.append(pos)
+        batch_indexes[tenant]._add(chunk_id, key, sig)
+        if stored_match == chunk_id:
+            # The same document stored again: already in the index
+            continue
+        if stored_match is not None:
+            pending_matches.append((pos, tenant, stored_match))
+        result.new_entries.setdefault(tenant, []).append((chunk_id, key, sig))
+
+    # Fold chunks into stored ones that still exist
+    if pending_matches:
+        by_tenant: Dict[tuple, List[str]] = {}
+        for _, tenant, stored_id in pending_matches:
+            by_tenant.setdefault(tenant, []).append(stored_id)
+        alive = {tenant: set(stored_ids(tenant[0], tenant[1], list(dict.fromkeys(sids))) if stored_ids else sids)
+                 for tenant, sids in by_tenant.items()}
+        folded = set()
+        for pos, tenant, stored_id in pending_matches:
+            if stored_id in alive[tenant]:
+                locations = result.stored_updates.setdefault(tenant, {}).setdefault(stored_id, [])
+                locations.append(location(metadatas[pos]))
+                # Locations already folded into this chunk within the batch move along with it
+                locations.extend(folded_locations.get(pos, []))
+                folded.add(pos)
+        result.duplicates += len(folded)
+        result.kept = [pos for pos in result.kept if pos not in folded]
+        for tenant in result.new_entries:
+            result.new_entries[tenant] = [e for e in result.new_entries[tenant] if position[e[0]] not in folded]
+
+    for pos in result.kept:
+        result.metadatas[pos] = add_locations(metadatas[pos], folded_locations.get(pos, []))
+    return result
+
+
+def commit(result: DedupResult):
+    for (folder_id, user_id), entries in result.new_entries.items():
+        folder_index(folder_id, user_id).commit(entries)
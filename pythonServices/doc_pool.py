@@ -0,0 +1,174 @@
+"""
+Pool of open PyMuPDF documents.
+
+Every stage of a PDF's processing (title, span-style markdown, features,
+chunking, LLM digest) used to open the file again, and a document that was not
+closed on every path (extract_title_from_first_page returned without closing)
+kept its file handle and MuPDF memory until garbage collection. Stages now
+borrow documents from a per-process pool:
+
+    with doc_pool.document(pdf_path) as doc:
+        ...
+
+A borrowed document is used by one caller at a time; concurrent callers on the
+same file get separate handles. Returned documents stay open, least recently
+used first out, keyed by path, mtime and size (a file replaced at the same path
+is opened again). At most DOC_POOL_MAX_DOCS idle documents and DOC_POOL_MAX_MB
+of their files are kept, and documents idle for DOC_POOL_IDLE_S are closed on
+the next use of the pool.
+
+Callers that modify the document (pymupdf4llm bakes annotations and removes
+page rotation) borrow with reuse=False: they get their own handle, closed on
+exit.
+"""
+import os
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+from typing import Dict, Iterator, List, Tuple
+
+import fitz  # PyMuPDF
+
+import large_pdf
+import metrics
+
+DOC_POOL_MAX_DOCS = int(os.getenv("DOC_POOL_MAX_DOCS", "8"))
+DOC_POOL_MAX_MB = float(os.getenv("DOC_POOL_MAX_MB", "256"))
+DOC_POOL_IDLE_S = float(os.getenv("DOC_POOL_IDLE_S", "60"))
+
+metrics.describe("doc_pool_opens_total", "counter", "PDF documents opened by the document pool")
+metrics.describe("doc_pool_hits_total", "counter", "PDF documents borrowed from the pool while open")
+
+Key = Tuple[str, int, int]
+
+
+def _key(pdf_path: str) -> Key:
+    st = os.stat(pdf_path)
+    return os.path.abspath(pdf_path), st.st_mtime_ns, st.st_size
+
+
+class DocumentPool:
+    def __init__(self, max_docs: int, max_bytes: int, idle_s: float):
+        self.max_docs = max_docs
+        self.max_bytes = max_bytes
+        self.idle_s = idle_s
+        # id(doc) -> (key, doc, returned at), least recently returned first
+        self._idle: "OrderedDict[int, Tuple[Key, fitz.Document, float]]" = OrderedDict()
+        self._idle_bytes = 0
+        self._in_use = 0
+        self._opens = 0
+        self._hits = 0
+        self._lock = threading.Lock()
+
+    def _pop(self, doc_id: int) -> fitz.Document:
+        key, doc, _ = self._idle.pop(doc_id)
+        self._idle_bytes -= key[2]
+        return doc
+
+    def _expired(self, now: float, key: Key = None) -> List[fitz.Document]:
+        """Idle documents past idle_s, or (with key) of the same path at another version."""
+        return [self._pop(doc_id) for doc_id, (k, _, returned) in list(self._idle.items())
+                if now - returned > self.idle_s or (key and k[0] == key[0] and k != key)]
+
+    def _over_limits(self) -> List[fitz.Document]:
+        closing = []
+        while self._idle and (len(self._idle) > self.max_docs or self._idle_bytes > self.max_bytes):
+            closing.append(self._pop(next(iter(self._idle))))
+        return closing
+
+    @staticmethod
+    def _close(docs: List[fitz.Document]) -> None:
+        for doc in docs:
+            doc.close()
+
+    def acquire(self, pdf_path: str) -> Tuple[Key, fitz.Document]:
+        key = _key(pdf_path)
+        with self._lock:
+            closing = self._expired(time.monotonic(), key)
+            doc = None
+            for doc_id in reversed(self._idle):
+                if self._idle[doc_id][0] == key:
+                    doc = self._pop(doc_id)
+                    self._hits += 1
+                    break
+            self._in_use += 1
+        self._close(closing)
+        if doc is not None:
+            metrics.inc("doc_pool_hits_total")
+            return key, doc
+        try:
+            doc = large_pdf.open_pdf(pdf_path)
+        except Exception:
+            with self._lock:
+                self._in_use -= 1
+            raise
+        with self._lock:
+            self._opens += 1
+        metrics.inc("doc_pool_opens_total")
+        return key, doc
+
+    def release(self, key: Key, doc: fitz.Document, reuse: bool = True) -> None:
+        with self._lock:
+            self._in_use -= 1
+            closing = self._expired(time.monotonic())
+            if reuse and not doc.is_closed:
+                self._idle[id(doc)] = (key, doc, time.monotonic())
+                self._idle_bytes += key[2]
+                closing += self._over_limits()
+            elif not doc.is_closed:
+                closing.append(doc)
+        self._close(closing)
+
+    @contextmanager
+    def document(self, pdf_path: str, reuse: bool = True) -> Iterator[fitz.Document]:
+        """
+        An open document of pdf_path for the duration of the block. With
+        reuse=False it is a new handle that is closed afterwards.
+        """
+        if not reuse:
+            doc = large_pdf.open_pdf(pdf_path)
+            with self._lock:
+                self._opens += 1
+            metrics.inc("doc_pool_opens_total")
+            try:
+                yield doc
+            finally:
+                doc.close()
+            return
+        key, doc = self.acquire(pdf_path)
+        try:
+            yield doc
+        finally:
+            self.release(key, doc)
+
+    def clear(self) -> None:
+        """Closes every idle document."""
+        with self._lock:
+            closing = [self._pop(doc_id) for doc_id in list(self._idle)]
+        self._close(closing)
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {
+                "idle": len(self._idle),
+                "idle_bytes": self._idle_bytes,
+                "in_use": self._in_use,
+                "opens": self._opens,
+                "hits": self._hits,
+            }
+
+
+_pool = DocumentPool(DOC_POOL_MAX_DOCS, int(DOC_POOL_MAX_MB * 1024 * 1024), DOC_POOL_IDLE_S)
+
+
+def document(pdf_path: str, reuse: bool = True):
+    return _pool.document(pdf_path, reuse)
+
+
+def clear() -> None:
+    _pool.clear()
+
+
+def stats() -> Dict:
+    return _pool.stats()
@@ -0,0 +1,220 @@
+"""
+Shared embedding scheduler: one SentenceTransformer, many callers.
+
+Ingestion and search threads submit texts and block on the result. A single
+dispatcher thread per process waits EMBED_BATCH_WINDOW_MS after the first
+arrival so concurrent requests can join, groups the queued texts into buckets
+of similar (estimated) token length and encodes one bucket per batch, so a
+short query is never padded to the length of a long chunk. Search texts are
+always taken before bulk ingestion texts; a query waits for at most the batch
+that is already running.
+"""
+import bisect
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future
+from typing import List
+
+import numpy as np
+
+import metrics
+from model_registry import get_embedding_model
+
+# Texts per encode call
+EMBED_BATCH_SIZE = int(os.getenv("EMBED_BATCH_SIZE", "256"))
+# Estimated tokens per encode call; keeps a batch of long chunks short enough that a query is not held up
+EMBED_BATCH_TOKENS = int(os.getenv("EMBED_BATCH_TOKENS", "16384"))
+# How long the dispatcher waits for more requests before encoding a partial batch
+EMBED_BATCH_WINDOW_MS = float(os.getenv("EMBED_BATCH_WINDOW_MS", "5"))
+# Upper bounds (in estimated tokens) of the length buckets; longer texts share the last bucket
+LENGTH_BUCKETS = tuple(int(b) for b in os.getenv("EMBED_LENGTH_BUCKETS", "16,32,64,128,256").split(","))
+# all-mpnet-base-v2 truncates at 384 tokens, so no text costs more than this
+MAX_SEQ_TOKENS = 384
+
+SEARCH = 0
+BULK = 1
+PRIORITY_NAMES = {SEARCH: "search", BULK: "bulk"}
+
+metrics.describe("embedding_queue_seconds", "histogram", "Time a text waited in the embedding scheduler before its batch started")
+metrics.describe("embedding_texts_total", "counter", "Texts embedded by the scheduler per priority")
+metrics.describe("embedding_batches_total", "counter", "Encode calls made by the scheduler per length bucket")
+metrics.describe("embedding_batch_size", "histogram", "Texts per encode call")
+metrics.describe("embedding_queue_depth", "gauge", "Texts waiting in the embedding scheduler per priority")
+
+BATCH_SIZE_BUCKETS = (1, 2, 4, 8, 16, 32, 64, 128, 256, 512)
+
+
+def estimate_tokens(text: str) -> int:
+    # About four characters per word piece for English prose; good enough to group by length
+    return len(text) // 4 + 2
+
+
+class _Request:
+    __slots__ = ("future", "embeddings", "remaining")
+
+    def __init__(self, count: int):
+        self.future = Future()
+        self.embeddings = None
+        self.remaining = count
+
+
+class EmbeddingScheduler:
+    """
+    Collects texts from concurrent callers and encodes them in length-bucketed batches.
+
+    The dispatcher thread is started on first use, so it is never inherited
+    across a gunicorn fork.
+    """
+
+    def __init__(self, batch_size: int = EMBED_BATCH_SIZE, window_ms: float = EMBED_BATCH_WINDOW_MS,
+                 buckets=LENGTH_BUCKETS, batch_tokens: int = EMBED_BATCH_TOKENS):
+        self.batch_size = max(1, batch_size)
+        self.window = window_ms / 1000.0
+        self.buckets = tuple(sorted(buckets))
+        # Texts per batch for each bucket, sized by its longest possible text
+        self._capacity = [
+            max(1, min(self.batch_size, batch_tokens // min(bound, MAX_SEQ_TOKENS)))
+            for bound in self.buckets + (MAX_SEQ_TOKENS,)
+        ]
+        # _queues[priority][bucket] -> deque of (enqueued_at, text, request, index)
+        self._queues = {p: [deque() for _ in range(len(self.buckets) + 1)] for p in PRIORITY_NAMES}
+        self._depth = {p: 0 for p in PRIORITY_NAMES}
+        self._cond = threading.Condition()
+        self._thread = None
+        self._stopped = False
+        self._texts = 0
+        self._batches = 0
+        self._encode_s = 0.0
+
+    def _bucket(self, text: str) -> int:
+        return bisect.bisect_left(self.buckets, estimate_tokens(text))
+
+    def submit(self, texts: List[str], priority: int = BULK) -> Future:
+        """Queue texts; the future resolves to their embeddings, in input order."""
+        request = _Request(len(texts))
+        if not texts:
+            request.future.set_result(np.empty((0, 0), dtype=np.float32))
+            return request.future
+        now = time.monotonic()
+        with self._cond:
+            if self._stopped:
+                raise RuntimeError("embedding scheduler is shut down")
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._dispatch, name="embedding-scheduler", daemon=True)
+                self._thread.start()
+            queues = self._queues[priority]
+            for i, text in enumerate(texts):
+                queues[self._bucket(text)].append((now, text, request, i))
+            self._depth[priority] += len(texts)
+            self._cond.notify()
+        return request.future
+
+    def embed(self, texts: List[str], priority: int = BULK) -> np.ndarray:
+        """Embeddings of texts in input order (blocks until they are encoded)."""
+        return self.submit(texts, priority).result()
+
+    def _oldest(self, priority):
+        heads = [(q[0][0], b) for b, q in enumerate(self._queues[priority]) if q]
+        return min(heads) if heads else None
+
+    def _next_batch(self):
+        """Pop the next batch (called with the lock held): highest priority, oldest bucket first."""
+        for priority in PRIORITY_NAMES:
+            oldest = self._oldest(priority)
+            if oldest is None:
+                continue
+            queue = self._queues[priority][oldest[1]]
+            batch = [queue.popleft() for _ in range(min(self._capacity[oldest[1]], len(queue)))]
+            self._depth[priority] -= len(batch)
+            return priority, oldest[1], batch
+        return None
+
+    def _ready(self, now):
+        # A full bucket does not need to wait for the window
+        oldest = [o for o in (self._oldest(p) for p in PRIORITY_NAMES) if o]
+        if not oldest:
+            return False
+        if min(oldest)[0] + self.window <= now:
+            return True
+        return any(len(q) >= self._capacity[b] for p in PRIORITY_NAMES for b, q in enumerate(self._queues[p]))
+
+    def _dispatch(self):
+        while True:
+            with self._cond:
+                while not self._stopped and not any(self._depth.values()):
+                    self._cond.wait()
+                if self._stopped:
+                    return
+                while not self._ready(time.monotonic()):
+                    oldest = min(o for o in (self._oldest(p) for p in PRIORITY_NAMES) if o)[0]
+                    self._cond.wait(max(0.0, oldest + self.window - time.monotonic()))
+                priority, bucket, batch = self._next_batch()
+                for p, depth in self._depth.items():
+                    metrics.set_gauge("embedding_queue_depth", depth, priority=PRIORITY_NAMES[p])
+            self._run_batch(priority, bucket, batch)
+
+    def _run_batch(self, priority, bucket, batch):
+        started = time.monotonic()
+        for enqueued_at, _, _, _ in batch:
+            metrics.observe("embedding_queue_seconds", started - enqueued_at, priority=PRIORITY_NAMES[priority])
+        try:
+            with metrics.stage("embedding_batch", texts=len(batch)):
+                vectors = get_embedding_model().encode(
+                    [text for _, text, _, _ in batch],
+                    batch_size=len(batch), show_progress_bar=False, convert_to_numpy=True,
+                )
+        except Exception as e:
+            for _, _, request, _ in batch:
+                if not request.future.done():
+                    request.future.set_exception(e)
+            return
+
+        self._texts += len(batch)
+        self._batches += 1
+        self._encode_s += time.monotonic() - started
+        metrics.inc("embedding_texts_total", len(batch), priority=PRIORITY_NAMES[priority])
+        metrics.inc("embedding_batches_total", bucket=str(self.buckets[bucket]) if bucket < len(self.buckets) else "+Inf")
+        metrics.observe("embedding_batch_size", len(batch), buckets=BATCH_SIZE_BUCKETS)
+
+        for (_, _, request, index), vector in zip(batch, vectors):
+            if request.future.done():
+                continue
+            if request.embeddings is None:
+                request.embeddings = np.empty((request.remaining, vector.shape[0]), dtype=vector.dtype)
+            request.embeddings[index] = vector
+            request.remaining -= 1
+            if request.remaining == 0:
+                request.future.set_result(request.embeddings)
+
+    def stats(self) -> dict:
+        return {
+            "batch_size": self.batch_size,
+            "bucket_capacity": dict(zip([str(b) for b in self.buckets] + ["+Inf"], self._capacity)),
+            "window_ms": self.window * 1000,
+            "queued": {PRIORITY_NAMES[p]: d for p, d in self._depth.items()},
+            "texts": self._texts,
+            "batches": self._batches,
+            "avg_batch_size": round(self._texts / self._batches, 1) if self._batches else None,
+            "texts_per_s": round(self._texts / self._encode_s, 1) if self._encode_s else None,
+        }
+
+    def shutdown(self):
+        with self._cond:
+            self._stopped = True
+            for p in PRIORITY_NAMES:
+                for queue in self._queues[p]:
+                    while queue:
+                        _, _, request, _ = queue.popleft()
+                        if not request.future.done():
+                            request.future.set_exception(RuntimeError("embedding scheduler is shut down"))
+                self._depth[p] = 0
+            self._cond.notify_all()
+
+
+scheduler = EmbeddingScheduler()
+
+
+def embed(texts: List[str], priority: int = BULK) -> np.ndarray:
+    return scheduler.embed(texts, priority)
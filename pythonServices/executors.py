@@ -0,0 +1,148 @@
+import asyncio
+import contextvars
+import functools
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+import metrics
+
+# ===== Pool sizing (per server worker) =====
+# Under gunicorn, post_fork divides the default extraction pool between the workers.
+EXTRACTION_PROCESSES = int(os.getenv("EXTRACTION_PROCESSES", max(1, (os.cpu_count() or 2) // 2)))
+EXTRACTION_QUEUE_DEPTH = int(os.getenv("EXTRACTION_QUEUE_DEPTH", "8"))
+EMBEDDING_THREADS = int(os.getenv("EMBEDDING_THREADS", "2"))
+EMBEDDING_QUEUE_DEPTH = int(os.getenv("EMBEDDING_QUEUE_DEPTH", "32"))
+LLM_THREADS = int(os.getenv("LLM_THREADS", "8"))
+LLM_QUEUE_DEPTH = int(os.getenv("LLM_QUEUE_DEPTH", "32"))
+
+
+metrics.describe("executor_inflight", "gauge", "Requests running or waiting per executor pool")
+
+
+class Overloaded(Exception):
+    """Raised when a pool already has as many requests as it is allowed to hold."""
+
+    def __init__(self, pool_name: str, retry_after: int = 5):
+        super().__init__(f"{pool_name} pool is saturated, retry later")
+        self.pool_name = pool_name
+        self.retry_after = retry_after
+
+
+def _init_extraction_worker():
+    # Each extraction process loads the classifier and NLTK data once, up front.
+    import model_registry
+    model_registry.ensure_nltk()
+    model_registry.get_xgb_model()
+
+
+class BoundedExecutor:
+    """
+    Wraps a thread or process pool with admission control.
+
+    At most `workers` tasks run and `max_queue` more wait; anything beyond that is
+    rejected immediately with Overloaded instead of queueing without bound. The
+    underlying pool is created on first use, so a pool is never inherited across
+    a gunicorn fork.
+    """
+
+    def __init__(self, name: str, kind: str, workers: int, max_queue: int):
+        self.name = name
+        self.kind = kind
+        self.workers = workers
+        self.max_queue = max_queue
+        self._executor = None
+        self._inflight = 0
+        self._lock = threading.Lock()
+
+    def _get_executor(self):
+        if self._executor is None:
+            if self.kind == "process":
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.workers,
+                    mp_context=multiprocessing.get_context("spawn"),
+                    initializer=_init_extraction_worker,
+                )
+            else:
+                self._executor = ThreadPoolExecutor(
+                    max_workers=self.workers,
+                    thread_name_prefix=self.name,
+                )
+        return self._executor
+
+    @property
+    def inflight(self) -> int:
+        return self._inflight
+
+    def _admit(self):
+        with self._lock:
+            if self._inflight >= self.workers + self.max_queue:
+                raise Overloaded(self.name)
+            self._inflight += 1
+
+    def _release(self):
+        with self._lock:
+            self._inflight -= 1
+
+    async def run(self, fn, *args, **kwargs):
+        """
+        Run fn(*args, **kwargs) in the pool and await its result.
+
+        Stage timings recorded by fn end up in the caller's metrics and request trace:
+        threads run inside a copy of the caller's context, processes send their
+        records back with the result.
+        """
+        self._admit()
+        try:
+            loop = asyncio.get_running_loop()
+            with self._lock:
+                executor = self._get_executor()
+            try:
+                if self.kind == "process":
+                    result, records = await loop.run_in_executor(
+                        executor, functools.partial(metrics.call_with_trace, fn, *args, **kwargs)
+                    )
+                    metrics.replay(records)
+                    return result
+                ctx = contextvars.copy_context()
+                return await loop.run_in_executor(executor, functools.partial(ctx.run, fn, *args, **kwargs))
+            except BrokenProcessPool:
+                # A crashed extraction process poisons the pool; start a fresh one next time.
+                with self._lock:
+                    if self._executor is executor:
+                        self._executor = None
+                raise
+        finally:
+            self._release()
+
+    def shutdown(self):
+        with self._lock:
+            if self._executor is not None:
+                self._executor.shutdown(wait=False, cancel_futures=True)
+                self._executor = None
+
+    def stats(self) -> dict:
+        return {
+            "kind": self.kind,
+            "workers": self.workers,
+            "max_queue": self.max_queue,
+            "inflight": self._inflight,
+        }
+
+
+# PyMuPDF parsing, feature generation and XGBoost inference (GIL-heavy, CPU-bound)
+extraction = BoundedExecutor("extraction", "process", EXTRACTION_PROCESSES, EXTRACTION_QUEUE_DEPTH)
+
+# SentenceTransformer inference and vector store reads/writes (torch releases the GIL)
+embedding = BoundedExecutor("embedding", "thread", EMBEDDING_THREADS, EMBEDDING_QUEUE_DEPTH)
+
+# Blocking summary/FAQ calls to the LLM (mostly waiting on the network)
+llm = BoundedExecutor("llm", "thread", LLM_THREADS, LLM_QUEUE_DEPTH)
+
+
+def shutdown_all():
+    extraction.shutdown()
+    embedding.shutdown()
+    llm.shutdown()
@@ -0,0 +1,335 @@
+"""
+On-disk cache of per-PDF extraction results, keyed by the SHA-256 of the file.
+
+Two kinds of entries live under <EXTRACTION_CACHE_DIR>/<sha[:2]>/<sha>-v<EXTRACTOR_VERSION>/:
+
+  outline-<mode>.json      process_single_pdf output (title, outline candidates with features)
+                           for one header candidate mode
+  chunks-<digest>.json     resolved header bboxes, sections and chunk text for one set of
+                           classified headers (digest of their text/level/page)
+
+The same PDF uploaded to another folder, or re-classified after a model update,
+skips markdown conversion, feature extraction and span scanning. Nothing that
+depends on the upload (folder, user, file name) is stored; it is filled back in
+on a hit.
+
+Bump EXTRACTOR_VERSION whenever pdf_title_outline_extractor, final_nltk or the
+chunking in chunking_3 change their output: old entries are ignored and evicted.
+
+Eviction runs in a background thread after every EXTRACTION_CACHE_EVICT_EVERY_MB
+written by this process (and after its first write), not on every write. A
+failed write is logged and counted; the request goes on without caching.
+
+    python extraction_cache.py stats
+    python extraction_cache.py invalidate path/to/file.pdf [<sha256> ...]
+    python extraction_cache.py evict [--max-mb 256]
+    python extraction_cache.py clear
+"""
+import argparse
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+import threading
+from typing import Dict, List, Optional, Tuple
+
+import metrics
+
+EXTRACTOR_VERSION = "3"
+
+CACHE_DIR = os.getenv("EXTRACTION_CACHE_DIR", "./extraction_cache")
+MAX_BYTES = int(float(os.getenv("EXTRACTION_CACHE_MAX_MB", "512")) * 1024 * 1024)
+ENABLED = os.getenv("EXTRACTION_CACHE", "1") == "1"
+# Bytes written between two evictions
+EVICT_EVERY_BYTES = int(float(os.getenv("EXTRACTION_CACHE_EVICT_EVERY_MB", "32")) * 1024 * 1024)
+
+_HASH_BLOCK = 1024 * 1024
+
+metrics.describe("extraction_cache_write_errors_total", "counter", "Extraction cache entries that could not be written")
+
+_lock = threading.Lock()
+# Bytes written since the last eviction; starts full so a process evicts after its first write
+_evict_state = {"written": EVICT_EVERY_BYTES, "running": False}
+# (path, mtime_ns, size) -> sha256, so extraction and chunking of one upload hash the file once
+_digests = {}
+
+
+def file_sha256(pdf_path: str) -> str:
+    st = os.stat(pdf_path)
+    key = (os.path.abspath(pdf_path), st.st_mtime_ns, st.st_size)
+    with _lock:
+        digest = _digests.get(key)
+    if digest:
+        return digest
+    h = hashlib.sha256()
+    with open(pdf_path, "rb") as f:
+        for block in iter(lambda: f.read(_HASH_BLOCK), b""):
+            h.update(block)
+    digest = h.hexdigest()
+    with _lock:
+        if len(_digests) > 1024:
+            _digests.clear()
+        _digests[key] = digest
+    return digest
+
+
+def _entry_dir(sha: str) -> str:
+    return os.path.join(CACHE_DIR, sha[:2], f"{sha}-v{EXTRACTOR_VERSION}")
+
+
+def _read(path: str):
+    try:
+        with open(path, encoding="utf-8") as f:
+            data = json.load(f)
+    except (OSError, ValueError):
+        return None
+    # Entry mtime is the recency used by eviction
+    try:
+        os.utime(os.path.dirname(path))
+    except OSError:
+        pass
+    return data
+
+
+def _write(path: str, data) -> None:
+    """Stores one entry. Failures are logged, never raised: the cache is only an optimization."""
+    try:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # Write-then-rename so concurrent workers never read a half-written entry
+        fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+        try:
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                json.dump(data, f, ensure_ascii=False)
+            size = os.path.getsize(tmp)
+            os.replace(tmp, path)
+        except BaseException:
+            if os.path.exists(tmp):
+                os.remove(tmp)
+            raise
+    except (OSError, TypeError, ValueError) as e:
+        # e.g. a full disk, or an eviction removing the entry directory mid-write
+        metrics.inc("extraction_cache_write_errors_total")
+        print(f"⚠️ Extraction cache write failed for {path}: {e}")
+        return
+    _note_written(size)
+
+
+def _note_written(size: int) -> None:
+    """Counts written bytes and starts a background eviction once EVICT_EVERY_BYTES have been written."""
+    with _lock:
+        _evict_state["written"] += size
+        if _evict_state["running"] or _evict_state["written"] < EVICT_EVERY_BYTES:
+            return
+        _evict_state.update(written=0, running=True)
+    threading.Thread(target=_evict_in_background, name="extraction-cache-evict", daemon=True).start()
+
+
+def _evict_in_background() -> None:
+    try:
+        evict()
+    except Exception as e:
+        print(f"⚠️ Extraction cache eviction failed: {e}")
+    finally:
+        with _lock:
+            _evict_state["running"] = False
+
+
+# ===== Outline candidates =====
+
+def _outline_path(pdf_path: str, mode: str) -> str:
+    return os.path.join(_entry_dir(file_sha256(pdf_path)), f"outline-{mode}.json")
+
+
+def get_outline(pdf_path: str, mode: str = "markdown") -> Optional[Dict]:
+    if not ENABLED:
+        return None
+    with metrics.stage("extraction_cache_outline") as st:
+        data = _read(_outline_path(pdf_path, mode))
+        if data is None:
+            st.count(misses=1)
+        else:
+            st.count(hits=1)
+    return data
+
+
+def put_outline(pdf_path: str, result: Dict, mode: str = "markdown") -> None:
+    if not ENABLED or result.get("error"):
+        return
+    _write(_outline_path(pdf_path, mode), result)
+
+
+# ===== Resolved headers and chunks =====
+
+def headers_digest(headers: List[Dict]) -> str:
+    key = [[h.get("text"), h.get("level"), h.get("page")] for h in headers]
+    return hashlib.sha256(json.dumps(key, ensure_ascii=False).encode("utf-8")).hexdigest()[:16]
+
+
+def _chunks_path(pdf_path: str, headers: List[Dict]) -> str:
+    return os.path.join(_entry_dir(file_sha256(pdf_path)), f"chunks-{headers_digest(headers)}.json")
+
+
+def get_chunks(pdf_path: str, headers: List[Dict], folder_id: str, user_id: str) -> Optional[Tuple[List[Dict], List[Dict]]]:
+    """Cached (chunks, sections) for these headers, with this upload's ids and path filled in."""
+    if not ENABLED:
+        return None
+    with metrics.stage("extraction_cache_chunks") as st:
+        data = _read(_chunks_path(pdf_path, headers))
+        if data is None:
+            st.count(misses=1)
+        else:
+            st.count(hits=1)
+    if data is None:
+        return None
+
+    filename = os.path.basename(pdf_path)
+    section_ids = [f"{folder_id}:{user_id}:{filename}:sec{si}" for si in range(len(data["sections"]))]
+    sections = [
+        {"id": section_ids[si], **s, "bbox": tuple(s["bbox"]), "document_path": pdf_path}
+        for si, s in enumerate(data["sections"])
+    ]
+    chunks = []
+    for c in data["chunks"]:
+        chunk = dict(c)
+        si = chunk.pop("section_index")
+        chunk["bbox"] = tuple(chunk["bbox"])
+        chunk["section_id"] = section_ids[si]
+        chunk["document_path"] = pdf_path
+        chunks.append(chunk)
+    return chunks, sections
+
+
+def put_chunks(pdf_path: str, headers: List[Dict], chunks: List[Dict], sections: List[Dict]) -> None:
+    if not ENABLED:
+        return
+    index_of = {s["id"]: si for si, s in enumerate(sections)}
+    data = {
+        "sections": [
+            {k: v for k, v in s.items() if k not in ("id", "document_path")}
+            for s in sections
+        ],
+        "chunks": [
+            {**{k: v for k, v in c.items() if k not in ("section_id", "document_path")},
+             "section_index": index_of[c["section_id"]]}
+            for c in chunks
+        ],
+    }
+    _write(_chunks_path(pdf_path, headers), data)
+
+
+# ===== Maintenance =====
+
+def _entries() -> List[Tuple[str, float, int]]:
+    """[(entry dir, last use, bytes)] for every entry of every extractor version."""
+    entries = []
+    if not os.path.isdir(CACHE_DIR):
+        return entries
+    for shard in os.scandir(CACHE_DIR):
+        if not shard.is_dir():
+            continue
+        try:
+            shard_entries = list(os.scandir(shard.path))
+        except OSError:
+            continue  # removed by a concurrent eviction
+        for entry in shard_entries:
+            if not entry.is_dir():
+                continue
+            size = 0
+            try:
+                for f in os.scandir(entry.path):
+                    try:
+                        size += f.stat().st_size
+                    except OSError:
+                        pass
+            except OSError:
+                continue
+            try:
+                entries.append((entry.path, entry.stat().st_mtime, size))
+            except OSError:
+                pass
+    return entries
+
+
+def evict(max_bytes: int = None) -> int:
+    """Drop entries of other extractor versions, then least recently used ones above max_bytes."""
+    max_bytes = MAX_BYTES if max_bytes is None else max_bytes
+    suffix = f"-v{EXTRACTOR_VERSION}"
+    removed = 0
+    entries = []
+    for path, used, size in _entries():
+        if not path.endswith(suffix):
+            shutil.rmtree(path, ignore_errors=True)
+            removed += 1
+        else:
+            entries.append((path, used, size))
+    total = sum(size for _, _, size in entries)
+    for path, _, size in sorted(entries, key=lambda e: e[1]):
+        if total <= max_bytes:
+            break
+        shutil.rmtree(path, ignore_errors=True)
+        total -= size
+        removed += 1
+    return removed
+
+
+def invalidate(pdf_path_or_sha: str) -> bool:
+    """Remove every cached entry (all versions) of one PDF, given its path or SHA-256."""
+    sha = file_sha256(pdf_path_or_sha) if os.path.isfile(pdf_path_or_sha) else pdf_path_or_sha.lower()
+    shard = os.path.join(CACHE_DIR, sha[:2])
+    found = False
+    if os.path.isdir(shard):
+        for entry in os.scandir(shard):
+            if entry.name.startswith(sha + "-v"):
+                shutil.rmtree(entry.path, ignore_errors=True)
+                found = True
+    return found
+
+
+def clear() -> None:
+    shutil.rmtree(CACHE_DIR, ignore_errors=True)
+
+
+def stats() -> Dict:
+    entries = _entries()
+    current = [e for e in entries if e[0].endswith(f"-v{EXTRACTOR_VERSION}")]
+    return {
+        "dir": os.path.abspath(CACHE_DIR),
+        "enabled": ENABLED,
+        "extractor_version": EXTRACTOR_VERSION,
+        "entries": len(current),
+        "stale_entries": len(entries) - len(current),
+        "bytes": sum(size for _, _, size in entries),
+        "max_bytes": MAX_BYTES,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    sub = parser.add_subparsers(dest="command", required=True)
+    sub.add_parser("stats")
+    sub.add_parser("clear")
+    inv = sub.add_parser("invalidate")
+    inv.add_argument("targets", nargs="+", help="PDF paths or SHA-256 digests")
+    ev = sub.add_parser("evict")
+    ev.add_argument("--max-mb", type=float)
+    args = parser.parse_args()
+
+    if args.command == "stats":
+        print(json.dumps(stats(), indent=2))
+    elif args.command == "clear":
+        clear()
+        print(f"✓ Cleared {os.path.abspath(CACHE_DIR)}")
+    elif args.command == "invalidate":
+        for target in args.targets:
+            if invalidate(target):
+                print(f"✓ Invalidated {target}")
+            else:
+                print(f"⚠️ Not cached: {target}")
+    elif args.command == "evict":
+        max_bytes = int(args.max_mb * 1024 * 1024) if args.max_mb is not None else None
+        print(f"✓ Evicted {evict(max_bytes)} entries")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,156 @@
+from array import array
+from typing import Dict, List
+
+import numpy as np
+import pandas as pd
+
+# array typecodes in promotion order; text and anything else stays a Python list
+_BOOL, _INT, _FLOAT = "b", "q", "d"
+_PROMOTION = {_BOOL: 0, _INT: 1, _FLOAT: 2}
+_NUMPY_DTYPE = {_BOOL: np.bool_, _INT: np.int64, _FLOAT: np.float64}
+
+
+def _typecode(value):
+    if isinstance(value, bool):
+        return _BOOL
+    if isinstance(value, int):
+        return _INT
+    if isinstance(value, float):
+        return _FLOAT
+    return None
+
+
+class FeatureColumns:
+    """
+    Accumulates feature rows column by column.
+
+    Numeric and boolean features go into typed `array.array` buffers (8 bytes or
+    1 byte per value instead of a boxed Python object per dict entry); text stays
+    in plain lists. Rows must be appended in page order.
+    """
+
+    def __init__(self):
+        self.names: List[str] = []
+        self.columns: Dict[str, object] = {}
+        self.codes: Dict[str, str] = {}
+        self.length = 0
+
+    def __len__(self):
+        return self.length
+
+    def _add_column(self, name, value):
+        code = _typecode(value)
+        self.names.append(name)
+        self.codes[name] = code
+        self.columns[name] = array(code) if code else []
+
+    def _promote(self, name, code):
+        current = self.codes[name]
+        if current and code:
+            # bool -> int -> float; a narrower value fits a wider column as is
+            if _PROMOTION[code] > _PROMOTION[current]:
+                self.columns[name] = array(code, self.columns[name])
+                self.codes[name] = code
+        elif current:
+            # A numeric column got a non-numeric value: keep Python objects from now on
+            self.columns[name] = [self.value(name, i) for i in range(self.length)]
+            self.codes[name] = None
+
+    def append(self, row: dict):
+        if not self.names:
+            for name, value in row.items():
+                self._add_column(name, value)
+        for name, value in row.items():
+            if name not in self.columns:
+                raise KeyError(f"Unexpected feature column {name!r}")
+            code = _typecode(value)
+            if code != self.codes[name]:
+                self._promote(name, code)
+            self.columns[name].append(value)
+        self.length += 1
+
+    def extend(self, other: "FeatureColumns"):
+        if not other.length:
+            return
+        if not self.names:
+            self.names = list(other.names)
+            self.codes = dict(other.codes)
+            self.columns = {n: (array(c) if c else []) for n, c in other.codes.items()}
+        for name in self.names:
+            if other.codes[name] != self.codes[name]:
+                # Rare: let append() sort out the promotion value by value
+                for i in range(other.length):
+                    self.append({n: other.value(n, i) for n in other.names})
+                return
+        for name in self.names:
+            self.columns[name].extend(other.columns[name])
+        self.length += other.length
+
+    def value(self, name, i):
+        v = self.columns[name][i]
+        return bool(v) if self.codes[name] == _BOOL else v
+
+    def finish(self, page_column: str = "page_num") -> "FeatureTable":
+        arrays = {}
+        for name in self.names:
+            code = self.codes[name]
+            col = self.columns[name]
+            if code:
+                # frombuffer shares the array's memory, no copy
+                arrays[name] = np.frombuffer(col, dtype=np.int8 if code == _BOOL else _NUMPY_DTYPE[code]).view(_NUMPY_DTYPE[code])
+            else:
+                arrays[name] = np.array(col, dtype=object)
+        return FeatureTable(arrays, self.names, page_column)
+
+
+class FeatureTable:
+    """
+    Typed feature columns with a page-offset index.
+
+    `page(n)` returns a FeatureTable whose columns are NumPy slices (views) of
+    this one, so per-page filtering copies nothing.
+    """
+
+    def __init__(self, arrays: Dict[str, np.ndarray], names: List[str], page_column: str = "page_num", offsets=None):
+        self.arrays = arrays
+        self.names = list(names)
+        self.page_column = page_column
+        self.length = len(arrays[names[0]]) if names else 0
+        self.offsets = offsets if offsets is not None else self._build_offsets()
+
+    def _build_offsets(self) -> Dict[int, tuple]:
+        if not self.length or self.page_column not in self.arrays:
+            return {}
+        pages = self.arrays[self.page_column]
+        uniques, starts = np.unique(pages, return_index=True)
+        order = np.argsort(starts)
+        uniques, starts = uniques[order], starts[order]
+        stops = np.append(starts[1:], self.length)
+        return {int(p): (int(a), int(b)) for p, a, b in zip(uniques, starts, stops)}
+
+    def __len__(self):
+        return self.length
+
+    def column(self, name: str) -> np.ndarray:
+        return self.arrays[name]
+
+    def page(self, page_num: int) -> "FeatureTable":
+        start, stop = self.offsets.get(page_num, (0, 0))
+        return self.slice(start, stop)
+
+    def slice(self, start: int, stop: int) -> "FeatureTable":
+        arrays = {name: arr[start:stop] for name, arr in self.arrays.items()}
+        return FeatureTable(arrays, self.names, self.page_column, offsets={})
+
+    def row(self, i: int) -> dict:
+        """One row as a dict of plain Python values, in column order."""
+        out = {}
+        for name in self.names:
+            v = self.arrays[name][i]
+            out[name] = v.item() if isinstance(v, np.generic) else v
+        return out
+
+    def to_dataframe(self) -> pd.DataFrame:
+        if not self.names:
+            return pd.DataFrame()
+        return pd.DataFrame({name: self.arrays[name] for name in self.names}, columns=self.names)
@@ -3,16 +3,33 @@ import pandas as pd
 import re
 import nltk
 import os
+import math
+import multiprocessing
 import numpy as np
 import string
+import threading
+import zlib
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
 from nltk.corpus import stopwords
+from feature_table import FeatureColumns, FeatureTable
+import doc_pool
+import large_pdf
 
 
 STOPWORDS = set(stopwords.words('english'))
 
-def build_style_profile(doc: fitz.Document) -> dict:
+# Page-sharded extraction: number of worker processes (0 = serial) and the
+# smallest page range worth shipping to a worker.
+PAGE_SHARD_WORKERS = int(os.getenv("FEATURE_PAGE_WORKERS", "0"))
+MIN_PAGES_PER_SHARD = int(os.getenv("FEATURE_MIN_PAGES_PER_SHARD", "16"))
+
+_shard_pool = None
+_shard_pool_lock = threading.Lock()
+
+def count_font_sizes(pages) -> dict:
     font_sizes = {}
-    for page in doc:
+    for page in pages:
         for b in page.get_text("dict").get("blocks", []):
             if b.get('type') != 0:
                 continue
@@ -20,9 +37,54 @@ def build_style_profile(doc: fitz.Document) -> dict:
                 for s in l["spans"]:
                     size = round(s['size'])
                     font_sizes[size] = font_sizes.get(size, 0) + 1
+    return font_sizes
+
+def rank_font_sizes(font_sizes: dict) -> dict:
     sorted_sizes = sorted(font_sizes.keys(), reverse=True)
     return {size: rank for rank, size in enumerate(sorted_sizes)}
 
+def build_style_profile(doc: fitz.Document, window: int = None) -> dict:
+    return rank_font_sizes(count_font_sizes(page for _, page in large_pdf.iter_pages(doc, window=window)))
+
+class StyleContext:
+    """Per-document font statistics, computed once and shared by every block."""
+
+    def __init__(self, font_size_map: dict):
+        self.font_size_map = font_size_map
+        # Average font size for relative calculation
+        self.avg_font_size = np.mean(list(font_size_map.keys())) if font_size_map else 1
+        self._family_hashes = {}
+
+    def font_size_rank(self, size: int) -> int:
+        return self.font_size_map.get(size, -1)
+
+    def font_family_hash(self, font: str) -> int:
+        h = self._family_hashes.get(font)
+        if h is None:
+            h = zlib.crc32(font.split(',')[0].encode("utf-8")) % 256
+            self._family_hashes[font] = h
+        return h
+
+_PUNCTUATION = frozenset(string.punctuation)
+_char_classes = {}
+
+def classify_chars(txt: str) -> tuple:
+    """(letters, digits, punctuation) counts of txt in one pass over the text."""
+    letters = digits = punct = 0
+    # Counter runs in C; only the distinct characters are classified in Python
+    for c, n in Counter(txt).items():
+        cls = _char_classes.get(c)
+        if cls is None:
+            cls = 1 if c.isalpha() else 2 if c.isdigit() else 3 if c in _PUNCTUATION else 0
+            _char_classes[c] = cls
+        if cls == 1:
+            letters += n
+        elif cls == 2:
+            digits += n
+        elif cls == 3:
+            punct += n
+    return letters, digits, punct
+
 def detect_table_regions(page: fitz.Page) -> list:
     return [d['rect'] for d in page.get_drawings() if d.get('rect')]
 
@@ -86,92 +148,166 @@ def should_merge(prev_lines, next_lines, gap_thr, indent_centers):
     ind1 = cluster_indent(r1.x0, indent_centers)
     return ind0 == ind1
 
-def extract_additional_features(txt, spans, bbox, page, font_size_map, indent_cluster, page_num):
-    # Average font size for relative calculation
-    avg_font_size = np.mean(list(font_size_map.keys())) if font_size_map else 1
-    words = txt.split()
+def extract_additional_features(txt, spans, bbox, page, style, indent_cluster, page_num, words=None, char_counts=None):
+    words = txt.split() if words is None else words
     num_words = len(words)
     total_chars = len(txt)
-    total_digits = sum(c.isdigit() for c in txt)
-    punctuation_count = sum(1 for c in txt if c in string.punctuation)
+    _, total_digits, punctuation_count = classify_chars(txt) if char_counts is None else char_counts
     
     return {
-        "rel_font_size": round(spans[0]['size'] / avg_font_size, 2),
+        "rel_font_size": round(spans[0]['size'] / style.avg_font_size, 2),
         "indent_cluster": indent_cluster,
         "ends_with_colon": txt.endswith(":"),
         "punct_density": round(punctuation_count / max(1, num_words), 2),
         "is_title_case": all(w.istitle() for w in words if len(w) > 1),
         "digit_ratio": round(total_digits / max(1, total_chars), 2),
         "is_first_page": page_num == 1,
-        "font_family_hash": hash(spans[0]["font"].split(',')[0]) % 256,
+        "font_family_hash": style.font_family_hash(spans[0]["font"]),
         "lines_in_block": len(set([l['bbox'][1] for l in spans])),
         "avg_word_length": round(sum(len(w) for w in words) / max(1, num_words), 2),
     }
 
-def generate_feature_rich_dataset(pdf_path: str) -> pd.DataFrame:
-    doc = fitz.open(pdf_path)
-    font_size_map = build_style_profile(doc)
-    all_rows = []
+def extract_page_rows(page: fitz.Page, pnum: int, style: StyleContext, rows: FeatureColumns) -> FeatureColumns:
+    """Append the feature rows for the text blocks of one page (pnum is 1-based) to rows."""
+    raw_blocks = page.get_text("dict", sort=True)["blocks"]
+    lines = [l for b in raw_blocks if b.get('type')==0 for l in b["lines"]]
+    gap_thr, indent_centers = compute_gap_and_indents(lines)
+    previous_y1 = 0
+    # Page-level values, shared by every block of the page
+    table_regions = detect_table_regions(page)
+    page_width, page_height = page.rect.width, page.rect.height
 
-    for pnum, page in enumerate(doc, start=1):
-        raw_blocks = page.get_text("dict", sort=True)["blocks"]
-        lines = [l for b in raw_blocks if b.get('type')==0 for l in b["lines"]]
-        gap_thr, indent_centers = compute_gap_and_indents(lines)
-        previous_y1 = 0
+    for bnum, b in enumerate(raw_blocks):
+        if b.get('type') != 0 or not b.get('lines'):
+            continue
 
-        for bnum, b in enumerate(raw_blocks):
-            if b.get('type') != 0 or not b.get('lines'):
+        sub_blocks = []
+        curr = [b["lines"][0]]
+        for ln in b["lines"][1:]:
+            if should_merge(curr, [ln], gap_thr, indent_centers):
+                curr.append(ln)
+            else:
+                sub_blocks.append(curr)
+                curr = [ln]
+        sub_blocks.append(curr)
+
+        for sub in sub_blocks:
+            spans = [s for l in sub for s in l["spans"]]
+            if not spans:
+                continue
+            txt = " ".join(s["text"] for s in spans).strip()
+            if not txt:
                 continue
 
-            sub_blocks = []
-            curr = [b["lines"][0]]
-            for ln in b["lines"][1:]:
-                if should_merge(curr, [ln], gap_thr, indent_centers):
-                    curr.append(ln)
-                else:
-                    sub_blocks.append(curr)
-                    curr = [ln]
-            sub_blocks.append(curr)
-
-            for sub in sub_blocks:
-                spans = [s for l in sub for s in l["spans"]]
-                if not spans:
-                    continue
-                txt = " ".join(s["text"] for s in spans).strip()
-                if not txt:
-                    continue
-
-                bbox = fitz.Rect(sub[0]["bbox"])
-                space_above = round(bbox.y0 - previous_y1, 2)
-                previous_y1 = bbox.y1
-                indent_cluster = cluster_indent(bbox.x0, indent_centers)
-
-                base_feats = {
-                    "page_num": pnum,
-                    "block_num": bnum,
-                    "full_text": txt,
-                    "font_size": round(spans[0]["size"]),
-                    "text_length": len(txt),
-                    "number_of_words": len(txt.split()),
-                    "number_of_spaces": txt.count(" "),
-                    "number_of_letters": len([c for c in txt if c.isalpha()]),
-                    "font_size_rank": font_size_map.get(round(spans[0]["size"]), -1),
-                    "is_bold": "bold" in spans[0]["font"].lower(),
-                    "is_in_table": any(bbox.intersects(r) for r in detect_table_regions(page)),
-                    "normalized_y_pos": round(bbox.y0 / page.rect.height, 2),
-                    "is_centered": abs(((page.rect.width - bbox.width)/2) - bbox.x0) < 10,
-                    "is_all_caps": txt.isupper() and len(txt) > 1,
-                    "starts_with_number_or_bullet": bool(re.match(r'^\s*(\d+(\.\d+)*\.?|[A-Za-z]\.|[•-])', txt)),
-                    "space_above": space_above,
-                }
-
-                base_feats.update(get_linguistic_features_nltk(txt))
-                base_feats.update(extract_additional_features(txt, spans, bbox, page, font_size_map, indent_cluster, pnum))
-
-                all_rows.append(base_feats)
-
-    doc.close()
-    return pd.DataFrame(all_rows)
+            bbox = fitz.Rect(sub[0]["bbox"])
+            space_above = round(bbox.y0 - previous_y1, 2)
+            previous_y1 = bbox.y1
+            indent_cluster = cluster_indent(bbox.x0, indent_centers)
+
+            words = txt.split()
+            char_counts = classify_chars(txt)
+            font_size = round(spans[0]["size"])
+
+            base_feats = {
+                "page_num": pnum,
+                "block_num": bnum,
+                "full_text": txt,
+                "font_size": font_size,
+                "text_length": len(txt),
+                "number_of_words": len(words),
+                "number_of_spaces": txt.count(" "),
+                "number_of_letters": char_counts[0],
+                "font_size_rank": style.font_size_rank(font_size),
+                "is_bold": "bold" in spans[0]["font"].lower(),
+                "is_in_table": any(bbox.intersects(r) for r in table_regions),
+                "normalized_y_pos": round(bbox.y0 / page_height, 2),
+                "is_centered": abs(((page_width - bbox.width)/2) - bbox.x0) < 10,
+                "is_all_caps": txt.isupper() and len(txt) > 1,
+                "starts_with_number_or_bullet": bool(re.match(r'^\s*(\d+(\.\d+)*\.?|[A-Za-z]\.|[•-])', txt)),
+                "space_above": space_above,
+            }
+
+            base_feats.update(get_linguistic_features_nltk(txt))
+            base_feats.update(extract_additional_features(txt, spans, bbox, page, style, indent_cluster, pnum, words, char_counts))
+
+            rows.append(base_feats)
+    return rows
+
+def _count_font_sizes_shard(pdf_path: str, start: int, stop: int) -> dict:
+    doc = large_pdf.open_pdf(pdf_path)
+    try:
+        window = large_pdf.page_window(pdf_path)
+        return count_font_sizes(page for _, page in large_pdf.iter_pages(doc, range(start, stop), window))
+    finally:
+        doc.close()
+
+def _extract_rows_shard(pdf_path: str, start: int, stop: int, font_size_map: dict) -> FeatureColumns:
+    # Each worker opens its own handle; fitz documents cannot cross processes.
+    doc = large_pdf.open_pdf(pdf_path)
+    try:
+        style = StyleContext(font_size_map)
+        rows = FeatureColumns()
+        window = large_pdf.page_window(pdf_path)
+        for p, page in large_pdf.iter_pages(doc, range(start, stop), window):
+            extract_page_rows(page, p + 1, style, rows)
+        return rows
+    finally:
+        doc.close()
+
+def _page_shards(page_count: int, workers: int) -> list:
+    """Split [0, page_count) into at most `workers` contiguous ranges of MIN_PAGES_PER_SHARD or more."""
+    if workers <= 1 or page_count < 2 * MIN_PAGES_PER_SHARD:
+        return [(0, page_count)]
+    n = min(workers, page_count // MIN_PAGES_PER_SHARD)
+    size = math.ceil(page_count / n)
+    return [(start, min(start + size, page_count)) for start in range(0, page_count, size)]
+
+def _get_shard_pool(workers: int) -> ProcessPoolExecutor:
+    global _shard_pool
+    with _shard_pool_lock:
+        if _shard_pool is None:
+            _shard_pool = ProcessPoolExecutor(
+                max_workers=workers,
+                mp_context=multiprocessing.get_context("spawn"),
+            )
+        return _shard_pool
+
+def generate_feature_table(pdf_path: str, workers: int = None) -> FeatureTable:
+    """
+    Feature rows for every text block of the PDF, as typed columns indexed by page.
+
+    With workers > 1 (default FEATURE_PAGE_WORKERS) a large document is split into
+    contiguous page ranges that worker processes extract independently; the rows are
+    concatenated back in page order, so the result is the same as the serial pass.
+    """
+    workers = PAGE_SHARD_WORKERS if workers is None else workers
+    all_rows = FeatureColumns()
+    with doc_pool.document(pdf_path) as doc:
+        shards = _page_shards(doc.page_count, workers)
+        if len(shards) == 1 or multiprocessing.current_process().daemon:
+            window = large_pdf.page_window(pdf_path)
+            style = StyleContext(build_style_profile(doc, window))
+            for p, page in large_pdf.iter_pages(doc, window=window):
+                extract_page_rows(page, p + 1, style, all_rows)
+            return all_rows.finish()
+
+    pool = _get_shard_pool(workers)
+    starts, stops = [a for a, _ in shards], [b for _, b in shards]
+    paths = [pdf_path] * len(shards)
+
+    # The style profile needs every page, so it is merged before the row pass.
+    font_sizes = {}
+    for counts in pool.map(_count_font_sizes_shard, paths, starts, stops):
+        for size, n in counts.items():
+            font_sizes[size] = font_sizes.get(size, 0) + n
+    font_size_map = rank_font_sizes(font_sizes)
+
+    for rows in pool.map(_extract_rows_shard, paths, starts, stops, [font_size_map] * len(shards)):
+        all_rows.extend(rows)
+    return all_rows.finish()
+
+def generate_feature_rich_dataset(pdf_path: str, workers: int = None) -> pd.DataFrame:
+    return generate_feature_table(pdf_path, workers).to_dataframe()
 
 def process_pdf_directory(input_dir: str, output_dir: str):
     os.makedirs(output_dir, exist_ok=True)
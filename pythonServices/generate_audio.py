@@ -1,31 +1,34 @@
+import io
 import os
 import wave
+from concurrent.futures import ThreadPoolExecutor
+
 import requests
 from dotenv import load_dotenv
 from pydub import AudioSegment
 from pydub.utils import which
 
-# gcp
-from google import genai
-from google.genai import types
+import metrics
+import outbound
+# gcp client is created on first use
+from model_registry import get_genai_client
 
 load_dotenv()
 
-# Initialize gcp client only if needed
-client = None
-if os.getenv("TTS_PROVIDER", "gcp").lower() == "gcp":
-    client = genai.Client(api_key=os.getenv("GOOGLE_API_KEY"))
-
 def generate_gcp_podcast(conversation, output_file="podcast.wav"):
     """
     Generate a multi-speaker podcast audio file from a conversation list.
     conversation = [("kore", "line1"), ("enceladus", "line2"), ...]
     """
 
+    from google.genai import types
+
+    client = get_genai_client()
+
     # Build script for gcp
     script = "\n".join([f"{speaker.capitalize()}: {line}" for speaker, line in conversation])
 
-    response = client.models.generate_content(
+    response = outbound.call("gemini_tts", lambda: client.models.generate_content(
         model="gemini-2.5-flash-preview-tts",
         contents=f"TTS the following conversation:\n{script}",
         config=types.GenerateContentConfig(
@@ -49,7 +52,7 @@ def generate_gcp_podcast(conversation, output_file="podcast.wav"):
                 )
             ),
         ),
-    )
+    ))
 
     data = response.candidates[0].content.parts[0].inline_data.data
 
@@ -63,8 +66,8 @@ def generate_gcp_podcast(conversation, output_file="podcast.wav"):
     print(f"Podcast saved to {output_file}")
 
 
-def _generate_azure_tts(text, output_file, voice="alloy"):
-    """Generate audio using Azure OpenAI TTS."""
+def _generate_azure_tts(text, voice="alloy"):
+    """Generate audio using Azure OpenAI TTS. Returns the audio bytes."""
     api_key = os.getenv("AZURE_TTS_KEY")
     endpoint = os.getenv("AZURE_TTS_ENDPOINT")
     deployment = os.getenv("AZURE_TTS_DEPLOYMENT", "tts")
@@ -85,29 +88,28 @@ def _generate_azure_tts(text, output_file, voice="alloy"):
         "voice": voice,
     }
 
-    try:
-        response = requests.post(
+    # Pooled keep-alive connections, retries and circuit breaker (see outbound.py)
+    provider = outbound.provider("azure_tts")
+
+    def post():
+        response = provider.session().post(
             f"{endpoint}/openai/deployments/{deployment}/audio/speech?api-version={api_version}",
             headers=headers,
             json=payload,
-            timeout=30,
+            timeout=provider.timeout,
         )
         response.raise_for_status()
+        return response.content
 
-        with open(output_file, "wb") as f:
-            f.write(response.content)
-
-        return output_file
-
+    try:
+        return provider.call(post)
     except requests.exceptions.RequestException as e:
         raise RuntimeError(f"Azure OpenAI TTS failed: {e}")
 
 
 def synthesize_azure(text, voice):
     """Wrapper to return AudioSegment from Azure OpenAI TTS."""
-    temp_file = "temp.wav"
-    _generate_azure_tts(text, temp_file, voice=voice)
-    return AudioSegment.from_wav(temp_file)
+    return AudioSegment.from_wav(io.BytesIO(_generate_azure_tts(text, voice=voice)))
 
 
 def generate_azure_podcast(conversation, output_file="podcast.mp3"):
@@ -116,9 +118,14 @@ def generate_azure_podcast(conversation, output_file="podcast.mp3"):
         "enceladus": "echo",  
     }
 
+    # Lines are synthesized concurrently (up to the provider's concurrency), joined in order
+    with ThreadPoolExecutor(max_workers=outbound.provider("azure_tts").concurrency) as pool:
+        segments = list(pool.map(
+            lambda line: synthesize_azure(line[1], speaker_voices[line[0].lower()]), conversation
+        ))
+
     final_track = AudioSegment.silent(1000)
-    for speaker, text in conversation:
-        audio_segment = synthesize_azure(text, speaker_voices[speaker.lower()])
+    for audio_segment in segments:
         final_track += audio_segment + AudioSegment.silent(400)
 
     export_audio(final_track, output_file)
@@ -135,14 +142,16 @@ def export_audio(audio: AudioSegment, output_file: str):
 def generate_podcast(conversation, output_file="podcast.mp3"):
     backend = os.getenv("TTS_PROVIDER", "gcp").lower()
 
-    if backend == "gcp":
-        return generate_gcp_podcast(conversation, output_file)
-    elif backend == "azure":
-        try:
-            return generate_azure_podcast(conversation, output_file)
-        except:
+    with metrics.stage(f"tts_{backend}", lines=len(conversation)):
+        if backend == "gcp":
             return generate_gcp_podcast(conversation, output_file)
-    else:
-        raise NotImplementedError(f"Backend '{backend}' is not implemented yet.")
+        elif backend == "azure":
+            try:
+                return generate_azure_podcast(conversation, output_file)
+            except Exception as e:
+                print(f"⚠️ Azure TTS failed, falling back to GCP: {e}")
+                return generate_gcp_podcast(conversation, output_file)
+        else:
+            raise NotImplementedError(f"Backend '{backend}' is not implemented yet.")
 
 
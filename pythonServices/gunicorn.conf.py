@@ -0,0 +1,59 @@
+"""
+Gunicorn settings for running the FastAPI service with several workers.
+
+The app is imported once in the master (preload_app) and the models are warmed
+up there, so the SentenceTransformer, the XGBoost model and the NLTK data are
+loaded before forking and shared copy-on-write by every worker.
+
+    gunicorn server:app -c gunicorn.conf.py
+"""
+import gc
+import multiprocessing
+import os
+
+bind = os.getenv("BIND", "0.0.0.0:8000")
+workers = int(os.getenv("WEB_CONCURRENCY", multiprocessing.cpu_count()))
+worker_class = "uvicorn.workers.UvicornWorker"
+preload_app = True
+timeout = int(os.getenv("WORKER_TIMEOUT", "300"))
+graceful_timeout = 30
+keepalive = 5
+
+# A persistent Chroma store must only be opened by one process. Without a Chroma
+# server to share, stay on a single worker rather than corrupt the index. The numpy
+# vector store locks its files and is safe for any number of workers.
+if workers > 1 and os.getenv("VECTOR_BACKEND", "chroma") == "chroma" and not os.getenv("CHROMA_HOST"):
+    print("⚠️ CHROMA_HOST is not set, running a single worker on ./chroma_storage")
+    workers = 1
+
+
+def when_ready(server):
+    # Load the models in the master so the workers inherit them instead of each
+    # running its own warm-up.
+    import model_registry
+    model_registry.warm_up()
+
+    # Everything allocated while preloading is long-lived. Moving it to the permanent
+    # generation keeps the cyclic GC from touching (and un-sharing) those pages.
+    gc.collect()
+    gc.freeze()
+
+
+def post_fork(server, worker):
+    # Split the cores between workers instead of letting every worker's torch
+    # spawn one thread per core.
+    threads = int(os.getenv("TORCH_THREADS_PER_WORKER", "0")) or max(
+        1, multiprocessing.cpu_count() // server.cfg.workers
+    )
+    try:
+        import torch
+        torch.set_num_threads(threads)
+    except ImportError:
+        pass
+
+    # Every worker starts its own extraction process pool, so the default half of
+    # the cores is split between workers as well.
+    import executors
+    executors.extraction.workers = int(os.getenv("EXTRACTION_PROCESSES", "0")) or max(
+        1, multiprocessing.cpu_count() // 2 // server.cfg.workers
+    )
@@ -0,0 +1,276 @@
+"""
+Garbage collection of the vector index.
+
+Chunks and sections used to stay in the index forever: after their PDF or
+folder was deleted, and (higher chunk indexes) after a PDF was processed again
+into fewer chunks. This module removes them:
+
+  delete_files(folder_id, user_id, filenames)   a folder's PDFs (DELETE /index/{user}/{folder}/{filename})
+  delete_folder(folder_id, user_id)              a whole folder (DELETE /index/{user}/{folder})
+  reconcile()                                    diff the index against the PDFs in MongoDB and delete
+                                                 what is gone; every INDEX_RECONCILE_INTERVAL_S seconds
+                                                 in the background, or POST /index/reconcile
+  compact()                                      offline: rewrite the storage without deleted entries
+
+A chunk that dedup.py shared between several PDFs is only deleted with the
+last of them; until then it moves to one of its remaining locations.
+
+    python index_gc.py reconcile --dry-run
+    python index_gc.py compact          # with the service stopped
+"""
+import argparse
+import fcntl
+import json
+import os
+import shutil
+import tempfile
+import threading
+import time
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+import dedup
+import metrics
+import vector_store
+
+MONGODB_URI = os.getenv("MONGODB_URI", "mongodb://localhost:27017/pdf-analysis")
+# Seconds between background reconciliations; 0 disables them
+INDEX_RECONCILE_INTERVAL_S = float(os.getenv("INDEX_RECONCILE_INTERVAL_S", "0"))
+# Held by the process running the background reconciler, so one gunicorn worker does it
+RECONCILE_LOCK_PATH = os.path.join(tempfile.gettempdir(), "pdf-index-reconcile.lock")
+
+metrics.describe("index_gc_deleted_total", "counter", "Index entries deleted by garbage collection")
+metrics.describe("index_gc_moved_total", "counter", "Shared chunks moved to another PDF's location")
+
+
+def _move(meta: Dict, remaining: List[Dict]) -> Dict:
+    """Metadata of a shared chunk whose own PDF is gone, pointing at its first remaining location."""
+    first = remaining[0]
+    return {
+        **meta,
+        "filename": first["filename"],
+        "page": first["page"],
+        "bbox": first["bbox"],
+        "page_height": first.get("page_height"),
+        "section": first.get("section") or meta.get("section"),
+        "section_id": first.get("section_id") or meta.get("section_id"),
+        "locations": json.dumps(remaining),
+    }
+
+
+def delete_files(folder_id: str, user_id: str, filenames: Iterable[str], keep_ids: Iterable[str] = (),
+                 keep_locations: Iterable[Dict] = ()) -> Dict[str, int]:
+    """
+    Removes PDFs of one folder from the index. Returns the number of entries deleted and moved.
+    A PDF that was just stored again passes the chunk and section ids and the locations of
+    that run as keep_ids and keep_locations, so only its entries from earlier runs go.
+    """
+    filenames = set(filenames)
+    keep_ids = set(keep_ids)
+    kept_locations = {json.dumps(loc, sort_keys=True) for loc in keep_locations}
+    chunk_store = vector_store.get_store(vector_store.CHUNKS)
+    section_store = vector_store.get_store(vector_store.SECTIONS)
+
+    with metrics.stage("index_gc", files=len(filenames)) as st:
+        deleted, moved_ids, moved_metas = [], [], []
+        for chunk_id, meta in chunk_store.entries(folder_id, user_id).items():
+            if chunk_id in keep_ids:
+                continue
+            locations = dedup.all_locations(meta)
+            # A kept location is one a new duplicate added to another PDF's chunk; a chunk
+            # of a deleted PDF that was not stored again only has stale locations
+            kept = kept_locations if meta["filename"] not in filenames else ()
+            remaining = [loc for loc in locations if loc["filename"] not in filenames
+                         or json.dumps(loc, sort_keys=True) in kept]
+            if len(remaining) == len(locations):
+                continue
+            if not remaining:
+                deleted.append(chunk_id)
+            else:
+                moved_ids.append(chunk_id)
+                moved_metas.append(_move(meta, remaining) if meta["filename"] in filenames
+                                   else {**meta, "locations": json.dumps(remaining)})
+        sections = [section_id for section_id, meta in section_store.entries(folder_id, user_id).items()
+                    if meta.get("filename") in filenames and section_id not in keep_ids]
+
+        chunk_store.delete(deleted, folder_id, user_id)
+        if moved_ids:
+            chunk_store.update_metadata(moved_ids, moved_metas, folder_id, user_id)
+        section_store.delete(sections, folder_id, user_id)
+        st.count(chunks_deleted=len(deleted), chunks_moved=len(moved_ids), sections_deleted=len(sections))
+
+    metrics.inc("index_gc_deleted_total", len(deleted), collection=vector_store.CHUNKS)
+    metrics.inc("index_gc_deleted_total", len(sections), collection=vector_store.SECTIONS)
+    metrics.inc("index_gc_moved_total", len(moved_ids))
+    return {"chunks_deleted": len(deleted), "chunks_moved": len(moved_ids), "sections_deleted": len(sections)}
+
+
+def delete_folder(folder_id: str, user_id: str) -> Dict[str, int]:
+    """Removes every chunk and section of one folder, and its dedup signatures."""
+    counts = {}
+    with metrics.stage("index_gc", folders=1) as st:
+        for collection in (vector_store.CHUNKS, vector_store.SECTIONS):
+            store = vector_store.get_store(collection)
+            ids = list(store.entries(folder_id, user_id))
+            store.delete(ids, folder_id, user_id)
+            counts[f"{collection}_deleted"] = len(ids)
+            metrics.inc("index_gc_deleted_total", len(ids), collection=collection)
+        dedup.folder_index(folder_id, user_id).rewrite(())
+        st.count(**counts)
+    return counts
+
+
+def indexed_files() -> Dict[Tuple[str, str], Set[str]]:
+    """{(folder_id, user_id): file names} of everything in the index, shared chunk locations included."""
+    files: Dict[Tuple[str, str], Set[str]] = {}
+    for collection in (vector_store.CHUNKS, vector_store.SECTIONS):
+        store = vector_store.get_store(collection)
+        for folder_id, user_id in store.tenants():
+            names = files.setdefault((folder_id, user_id), set())
+            for meta in store.entries(folder_id, user_id).values():
+                names.update(loc["filename"] for loc in dedup.all_locations(meta))
+    return files
+
+
+def live_files() -> Optional[Set[Tuple[str, str, str]]]:
+    """(folder_id, user_id, filename) of every PDF in MongoDB, or None when it cannot be read."""
+    try:
+        from pymongo import MongoClient
+    except ImportError:
+        print("⚠️ pymongo is not installed, cannot read the live PDFs")
+        return None
+    client = MongoClient(MONGODB_URI, serverSelectionTimeoutMS=5000)
+    try:
+        pdfs = client.get_default_database()["pdfs"].find({}, {"filename": 1, "folderId": 1, "userId": 1})
+        return {(str(p["folderId"]), str(p["userId"]), p["filename"]) for p in pdfs}
+    except Exception as e:
+        print(f"❌ Error reading the live PDFs from MongoDB: {e}")
+        return None
+    finally:
+        client.close()
+
+
+def reconcile(live: Optional[Set[Tuple[str, str, str]]] = None, dry_run: bool = False) -> Dict:
+    """
+    Deletes the folders and PDFs that are in the index but no longer in `live`
+    (default: MongoDB). Returns what was (or, with dry_run, would be) deleted.
+    """
+    # The index is listed before the live set is read: a PDF is saved in MongoDB
+    # before it is indexed, so one indexed meanwhile is never taken for deleted.
+    indexed = indexed_files()
+    if live is None:
+        live = live_files()
+    if live is None:
+        return {"skipped": "live PDFs unavailable"}
+    if not live and indexed:
+        # More likely a wrong database than every PDF deleted
+        return {"skipped": "no live PDFs"}
+
+    live_by_folder: Dict[Tuple[str, str], Set[str]] = {}
+    for folder_id, user_id, filename in live:
+        live_by_folder.setdefault((folder_id, user_id), set()).add(filename)
+    folders = sorted(t for t in indexed if t not in live_by_folder)
+    files = {t: sorted(names - live_by_folder[t]) for t, names in sorted(indexed.items())
+             if t in live_by_folder and names - live_by_folder[t]}
+
+    report = {
+        "dry_run": dry_run,
+        "folders": [{"folder_id": f, "user_id": u} for f, u in folders],
+        "files": [{"folder_id": f, "user_id": u, "filenames": names} for (f, u), names in files.items()],
+        "deleted": {},
+    }
+    if not dry_run:
+        totals: Dict[str, int] = {}
+        for folder_id, user_id in folders:
+            for k, v in delete_folder(folder_id, user_id).items():
+                totals[k] = totals.get(k, 0) + v
+        for (folder_id, user_id), names in files.items():
+            for k, v in delete_files(folder_id, user_id, names).items():
+                totals[k] = totals.get(k, 0) + v
+        report["deleted"] = totals
+    return report
+
+
+def _reconcile_loop(interval: float):
+    lock_file = open(RECONCILE_LOCK_PATH, "a")
+    holding = False
+    while True:
+        time.sleep(interval)
+        if not holding:
+            try:
+                fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                holding = True  # kept for the life of the process
+            except BlockingIOError:
+                continue  # another worker reconciles
+        try:
+            report = reconcile()
+            if report.get("skipped"):
+                print(f"⚠️ Index reconciliation skipped: {report['skipped']}")
+            elif report["folders"] or report["files"]:
+                print(f"✓ Index reconciliation deleted {report['deleted']}")
+        except Exception as e:
+            print(f"❌ Error reconciling the index: {e}")
+
+
+def start_reconciler(interval: float = None) -> Optional[threading.Thread]:
+    """Background reconciliation every INDEX_RECONCILE_INTERVAL_S seconds (if set)."""
+    interval = INDEX_RECONCILE_INTERVAL_S if interval is None else interval
+    if interval <= 0:
+        return None
+    thread = threading.Thread(target=_reconcile_loop, args=(interval,), name="index-reconciler", daemon=True)
+    thread.start()
+    return thread
+
+
+def stats() -> Dict:
+    return {collection: vector_store.get_store(collection).stats()
+            for collection in (vector_store.CHUNKS, vector_store.SECTIONS)}
+
+
+def compact() -> Dict:
+    """
+    Offline compaction: both collections, then the dedup signatures (entries of
+    deleted chunks and folders without chunks are dropped).
+    """
+    report = {collection: vector_store.get_store(collection).compact()
+              for collection in (vector_store.CHUNKS, vector_store.SECTIONS)}
+
+    chunk_store = vector_store.get_store(vector_store.CHUNKS)
+    before = after = 0
+    kept_paths = set()
+    for folder_id, user_id in chunk_store.tenants():
+        index = dedup.folder_index(folder_id, user_id)
+        before += len(index.ids)
+        after += index.rewrite(chunk_store.entries(folder_id, user_id))
+        kept_paths.add(os.path.abspath(index.path))
+    if os.path.isdir(dedup.DEDUP_INDEX_PATH):
+        for user_dir in os.listdir(dedup.DEDUP_INDEX_PATH):
+            for folder_dir in os.listdir(os.path.join(dedup.DEDUP_INDEX_PATH, user_dir)):
+                path = os.path.join(dedup.DEDUP_INDEX_PATH, user_dir, folder_dir)
+                if os.path.abspath(path) not in kept_paths:
+                    if os.path.exists(os.path.join(path, dedup.INDEX_FILE)):
+                        with open(os.path.join(path, dedup.INDEX_FILE), "rb") as f:
+                            before += sum(1 for _ in f)
+                    shutil.rmtree(path, ignore_errors=True)
+    report["dedup"] = {"before": {"entries": before}, "after": {"entries": after}}
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("command", choices=["reconcile", "compact", "stats"])
+    parser.add_argument("--dry-run", action="store_true", help="reconcile: only report what would be deleted")
+    args = parser.parse_args()
+
+    if args.command == "reconcile":
+        result = reconcile(dry_run=args.dry_run)
+    elif args.command == "compact":
+        result = compact()
+        for name, r in result.items():
+            print(f"✓ {name}: {r['before']} -> {r['after']}")
+    else:
+        result = stats()
+    print(json.dumps(result, indent=2))
+
+
+if __name__ == "__main__":
+    main()
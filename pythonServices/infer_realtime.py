@@ -9,6 +9,9 @@ import numpy as np
 import pandas as pd
 import xgboost as xgb
 
+import metrics
+from model_registry import get_xgb_model
+
 
 def predict_headings(
     model_path="XGB.pkl",
@@ -110,20 +113,7 @@ def predict_single_pdf(
     model_path="XGB.pkl",
     doc={}
 ):
-    with open(model_path, "rb") as f:
-        data = pickle.load(f)
-
-    if isinstance(data, tuple) and len(data) == 3:
-        clf, feature_cols, model_type = data
-    else:
-        clf, feature_cols = data
-        model_type = "xgb"
-
-    if model_type != "xgb":
-        raise ValueError("Expected XGB model type")
-
-    if "prev_label" not in feature_cols:
-        feature_cols.append("prev_label")
+    clf, feature_cols = get_xgb_model(model_path)
 
     labels = {0: "H1", 1: "H2", 2: "H3", 3: "OTHER"}
 
@@ -140,35 +130,37 @@ def predict_single_pdf(
         row["page"] = entry.get("page", None)
         records.append(row)
 
-    df = pd.DataFrame(records).sort_values("index_in_file").reset_index(drop=True)
+    with metrics.stage("classification") as st:
+        df = pd.DataFrame(records).sort_values("index_in_file").reset_index(drop=True)
 
-    prev_pred = 3  # Start with "OTHER"
-    output_outline = []
+        prev_pred = 3  # Start with "OTHER"
+        output_outline = []
 
-    for _, row in df.iterrows():
-        x = {}
-        for feat in feature_cols:
-            if feat == "prev_label":
-                    x[feat] = prev_pred
-            else:
-                x[feat] = row.get(feat, 0)
+        for _, row in df.iterrows():
+            x = {}
+            for feat in feature_cols:
+                if feat == "prev_label":
+                        x[feat] = prev_pred
+                else:
+                    x[feat] = row.get(feat, 0)
 
-        X_df = pd.DataFrame([[x[c] for c in feature_cols]], columns=feature_cols)
-        dtest = xgb.DMatrix(X_df, feature_names=feature_cols)
+            X_df = pd.DataFrame([[x[c] for c in feature_cols]], columns=feature_cols)
+            dtest = xgb.DMatrix(X_df, feature_names=feature_cols)
 
-        probs = clf.predict(dtest)
-        pred = int(np.argmax(probs))
-            
-        prev_pred = pred
-        if labels[pred] == "OTHER":
-              
-            continue  # Skip OTHER predictions
+            probs = clf.predict(dtest)
+            pred = int(np.argmax(probs))
+                
+            prev_pred = pred
+            if labels[pred] == "OTHER":
+                  
+                continue  # Skip OTHER predictions
 
-        output_outline.append({
-                "text": row["text"],
-                "level": labels[pred],
-                "page": row["page"]
-            })
+            output_outline.append({
+                    "text": row["text"],
+                    "level": labels[pred],
+                    "page": row["page"]
+                })
+        st.count(rows=len(df), headings=len(output_outline))
 
         # === 3) Save output JSON ===
     
@@ -0,0 +1,121 @@
+"""
+Folder-level ingestion: many PDFs in one request.
+
+Documents are extracted and classified in parallel on the extraction pool and
+chunked on the embedding pool, while their summaries are generated on the LLM
+pool. Their chunks are pooled across documents, and once INGEST_FLUSH_CHUNKS
+chunks (or INGEST_FLUSH_SECONDS) have accumulated they are embedded in
+length-sorted batches and written to the vector store in one pass. A document
+joins the pool only once its own summary is ready, so a document whose summary
+fails is never indexed. One result per document is yielded as soon as its
+chunks are stored, in completion order.
+"""
+import asyncio
+import os
+import time
+from typing import AsyncIterator, Dict, List
+
+import executors
+
+MODEL_PATH = "./xgb_model.pkl"
+INGEST_FLUSH_CHUNKS = int(os.getenv("INGEST_FLUSH_CHUNKS", "2048"))
+INGEST_FLUSH_SECONDS = float(os.getenv("INGEST_FLUSH_SECONDS", "10"))
+# Concurrent summary/FAQ calls per ingestion request
+INGEST_LLM_CONCURRENCY = int(os.getenv("INGEST_LLM_CONCURRENCY", "4"))
+
+
+async def ingest_documents(file_paths: List[str], folder_id: str, user_id: str, summaries: bool = True) -> AsyncIterator[Dict]:
+    from process_pdfs import get_single_pdf_prediction
+    from chunking_3 import build_chunks_with_sections, store_documents
+    from llm_features import get_summary_faq
+
+    # Never queue more on the extraction pool than it runs, so a large folder is not rejected.
+    # Chunking holds the same slot, which bounds what one request queues on the embedding pool.
+    extraction_slots = asyncio.Semaphore(max(1, executors.extraction.workers))
+    llm_slots = asyncio.Semaphore(max(1, INGEST_LLM_CONCURRENCY))
+
+    async def summarize(path):
+        async with llm_slots:
+            return await executors.llm.run(get_summary_faq, path)
+
+    paths = list(dict.fromkeys(file_paths))
+    summary_tasks = {path: asyncio.ensure_future(summarize(path)) for path in paths} if summaries else {}
+
+    async def process(path):
+        async with extraction_slots:
+            result = await executors.extraction.run(get_single_pdf_prediction, model_path=MODEL_PATH, file_path=path)
+            headers = result.get("outline", []) if type(result) is dict else []
+            chunks, sections = await executors.embedding.run(build_chunks_with_sections, path, headers, folder_id, user_id)
+        summary_faq = None
+        if path in summary_tasks:
+            try:
+                summary_faq = await summary_tasks.pop(path)
+            except Exception as e:
+                # Callers store the summary with the document, so without one it is not indexed either
+                raise RuntimeError(f"Summary generation failed: {e}") from e
+        return result, chunks, sections, summary_faq
+
+    tasks = {asyncio.ensure_future(process(path)): path for path in paths}
+    pending = []  # (path, result, chunks, sections, summary_faq) waiting for the next flush
+    pending_chunks = 0
+    oldest = None
+
+    def finish(path, result, chunks, summary_faq, error=None):
+        if error is not None:
+            return {"file_path": path, "status": "error", "error": str(error)}
+        line = {"file_path": path, "status": "ok", "result": result, "chunks": len(chunks)}
+        if summary_faq is not None:
+            line.update(summary=summary_faq["summary"], faq=summary_faq["FAQ"])
+        return line
+
+    async def flush():
+        # Documents without chunks too, so their entries from an earlier upload are removed
+        batch = [(chunks, sections, folder_id, user_id, os.path.basename(path))
+                 for path, _, chunks, sections, _ in pending]
+        error = None
+        if batch:
+            try:
+                await executors.embedding.run(store_documents, batch)
+            except Exception as e:
+                error = e
+        lines = [finish(path, result, chunks, summary_faq, error)
+                 for path, result, chunks, _, summary_faq in pending]
+        pending.clear()
+        return lines
+
+    try:
+        while tasks or pending:
+            timeout = None
+            if pending:
+                timeout = max(0.0, oldest + INGEST_FLUSH_SECONDS - time.monotonic())
+            done = set()
+            if tasks:
+                done, _ = await asyncio.wait(tasks, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                path = tasks.pop(task)
+                try:
+                    result, chunks, sections, summary_faq = task.result()
+                except Exception as e:
+                    summary_task = summary_tasks.pop(path, None)
+                    if summary_task:
+                        summary_task.cancel()
+                    yield finish(path, None, [], None, e)
+                    continue
+                if not pending:
+                    oldest = time.monotonic()
+                pending.append((path, result, chunks, sections, summary_faq))
+                pending_chunks += len(chunks)
+
+            due = pending and (
+                not tasks
+                or pending_chunks >= INGEST_FLUSH_CHUNKS
+                or time.monotonic() - oldest >= INGEST_FLUSH_SECONDS
+            )
+            if due:
+                pending_chunks = 0
+                for line in await flush():
+                    yield line
+    finally:
+        # Client went away: stop the work that has not started yet
+        for task in list(tasks) + list(summary_tasks.values()):
+            task.cancel()
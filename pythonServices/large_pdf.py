@@ -0,0 +1,108 @@
+"""
+Large-document mode: bounded-memory access to very large PDFs.
+
+Above LARGE_PDF_THRESHOLD_MB a PDF is opened from a read-only memory map
+(PyMuPDF reads a memoryview in place, so the file is never copied into the
+heap and the mapped pages are shared by every process working on the same
+upload), its pages are walked in windows of LARGE_PDF_PAGE_WINDOW with
+MuPDF's object cache released after each window, and the LLM gets a text
+digest of sampled pages instead of the whole file.
+"""
+import mmap
+import os
+from typing import Iterable, Iterator, List, Optional, Tuple
+
+import fitz  # PyMuPDF
+
+LARGE_PDF_THRESHOLD_MB = float(os.getenv("LARGE_PDF_THRESHOLD_MB", "50"))
+PAGE_WINDOW = int(os.getenv("LARGE_PDF_PAGE_WINDOW", "16"))
+# Text digest sent to the LLM instead of the file
+LLM_DIGEST_MAX_CHARS = int(os.getenv("LLM_DIGEST_MAX_CHARS", "200000"))
+MIN_CHARS_PER_PAGE = 1000
+# Scanned documents have no text layer; the LLM gets this many sampled pages as a PDF
+LLM_SAMPLE_PAGES = int(os.getenv("LLM_SAMPLE_PAGES", "20"))
+
+
+def is_large(pdf_path: str) -> bool:
+    try:
+        return os.path.getsize(pdf_path) > LARGE_PDF_THRESHOLD_MB * 1024 * 1024
+    except OSError:
+        return False
+
+
+def page_window(pdf_path: str) -> Optional[int]:
+    """Pages per window for this file, or None when it is small enough to open normally."""
+    return PAGE_WINDOW if is_large(pdf_path) else None
+
+
+def open_pdf(pdf_path: str) -> fitz.Document:
+    """fitz.open, backed by a memory map for large files."""
+    if not is_large(pdf_path):
+        return fitz.open(pdf_path)
+    with open(pdf_path, "rb") as f:
+        mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    # The document keeps the memoryview (and so the map) alive until it is closed
+    return fitz.open(stream=memoryview(mapped), filetype="pdf")
+
+
+def release_page_cache() -> None:
+    """Drop MuPDF's cached fonts, images and page objects."""
+    fitz.TOOLS.store_shrink(100)
+
+
+def page_windows(page_count: int, window: int = PAGE_WINDOW) -> List[range]:
+    return [range(start, min(start + window, page_count)) for start in range(0, page_count, window)]
+
+
+def iter_pages(doc: fitz.Document, pages: Optional[Iterable[int]] = None, window: Optional[int] = None) -> Iterator[Tuple[int, fitz.Page]]:
+    """
+    Yield (0-based page number, page). With a window, MuPDF's cache is released
+    every `window` pages so memory does not grow with the document.
+    """
+    for n, pno in enumerate(range(doc.page_count) if pages is None else pages, start=1):
+        yield pno, doc[pno]
+        if window and n % window == 0:
+            release_page_cache()
+    if window:
+        release_page_cache()
+
+
+def sample_pages(page_count: int, k: int) -> List[int]:
+    """k page numbers spread evenly over the document, first and last included."""
+    if page_count <= k:
+        return list(range(page_count))
+    if k <= 1:
+        return [0]
+    return sorted({round(i * (page_count - 1) / (k - 1)) for i in range(k)})
+
+
+def text_digest(pdf_path: str, max_chars: int = LLM_DIGEST_MAX_CHARS) -> str:
+    """
+    Text of the document within max_chars: every page when it fits, otherwise
+    evenly sampled pages, each cut to an equal share of the budget.
+    """
+    import doc_pool  # imports this module
+
+    with doc_pool.document(pdf_path) as doc:
+        pages = sample_pages(doc.page_count, max(1, max_chars // MIN_CHARS_PER_PAGE))
+        per_page = max_chars // max(1, len(pages))
+        parts = []
+        for pno, page in iter_pages(doc, pages, window=PAGE_WINDOW):
+            text = page.get_text().strip()
+            if text:
+                parts.append(f"[Page {pno + 1}]\n{text[:per_page]}")
+        return "\n\n".join(parts)[:max_chars]
+
+
+def sampled_pdf_bytes(pdf_path: str, max_pages: int = LLM_SAMPLE_PAGES) -> bytes:
+    """A new PDF made of evenly sampled pages, for documents without a text layer."""
+    import doc_pool
+
+    out = fitz.open()
+    try:
+        with doc_pool.document(pdf_path) as src:
+            for pno in sample_pages(src.page_count, max_pages):
+                out.insert_pdf(src, from_page=pno, to_page=pno)
+        return out.tobytes(garbage=3, deflate=True)
+    finally:
+        out.close()
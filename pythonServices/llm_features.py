@@ -1,12 +1,16 @@
-from google import genai
 from typing import List
 from dotenv import load_dotenv
 from pydantic import BaseModel
+from starlette.concurrency import iterate_in_threadpool
+import io
 import os
+import time
+import large_pdf
+import metrics
+import outbound
+from model_registry import get_genai_client
 load_dotenv()
 
-client = genai.Client(api_key=os.getenv("GOOGLE_API_KEY"))
-
 class FAQ(BaseModel):
     question: str
     answer: str
@@ -22,19 +26,41 @@ class DialogueLine(BaseModel):
 class PodcastScript(BaseModel):
     script: List[DialogueLine]
 
-def get_summary_faq(path: str):
-    # Upload file
-    file = client.files.upload(file=path)
+SUMMARY_FAQ_PROMPT = "Summarize this document and generate FAQs. Use only the content from the document to generate FAQs and summary. Generate them in markdown format"
 
-    # Generate structured response
-    response = client.models.generate_content(
-        model=os.getenv("GEMINI_MODEL"),
-        contents=["Summarize this document and generate FAQs. Use only the content from the document to generate FAQs and summary. Generate them in markdown format", file],
-        config={
-            "response_mime_type": "application/json",
-            "response_schema": SummaryFAQ
-        }
-    )
+def _summary_faq_document(client, path: str, st: "metrics.Stage"):
+    """The document part of the summary request: the file itself, or a bounded stand-in for large PDFs."""
+    if not large_pdf.is_large(path):
+        st.count(bytes_uploaded=os.path.getsize(path))
+        return outbound.call("gemini", lambda: client.files.upload(file=path))
+
+    # Large PDF: send extracted text of sampled pages instead of the whole file
+    digest = large_pdf.text_digest(path)
+    if digest:
+        st.count(digest_chars=len(digest))
+        return "Document text (sampled pages):\n\n" + digest
+
+    # No text layer (scanned): upload a small PDF of sampled pages
+    sample = large_pdf.sampled_pdf_bytes(path)
+    st.count(bytes_uploaded=len(sample))
+    # A new stream per attempt: a retry must not read an exhausted one
+    return outbound.call("gemini", lambda: client.files.upload(file=io.BytesIO(sample), config={"mime_type": "application/pdf"}))
+
+def get_summary_faq(path: str):
+    client = get_genai_client()
+    with metrics.stage("llm_summary_faq") as st:
+        # Upload file (or its digest)
+        document = _summary_faq_document(client, path, st)
+
+        # Generate structured response
+        response = outbound.call("gemini", lambda: client.models.generate_content(
+            model=os.getenv("GEMINI_MODEL"),
+            contents=[SUMMARY_FAQ_PROMPT, document],
+            config={
+                "response_mime_type": "application/json",
+                "response_schema": SummaryFAQ
+            }
+        ))
 
     result = response.parsed
     return {
@@ -44,6 +70,37 @@ def get_summary_faq(path: str):
 
 
 
+metrics.describe("llm_time_to_first_token_seconds", "histogram", "Time from request to first streamed text per LLM call")
+
+
+async def _timed_stream(stage_name: str, response_stream, **items):
+    """
+    Yield the text parts of a Gemini stream, recording the stage and time to first token.
+    Events are pulled in the threadpool: waiting for a provider slot, a retry or
+    the next event must not block the event loop.
+    """
+    with metrics.stage(stage_name, **items) as st:
+        t0 = time.perf_counter()
+        first = True
+        try:
+            async for event in iterate_in_threadpool(response_stream):
+                if event.candidates and event.candidates[0].content.parts:
+                    for part in event.candidates[0].content.parts:
+                        if part.text:
+                            if first:
+                                metrics.observe("llm_time_to_first_token_seconds", time.perf_counter() - t0, call=stage_name)
+                                first = False
+                            st.count(output_chars=len(part.text))
+                            yield part.text
+        finally:
+            # Gives the provider slot back when the client goes away mid-stream
+            try:
+                response_stream.close()
+            except ValueError:
+                # Still inside next() in the threadpool; closed when collected
+                pass
+
+
 async def stream_insights(prev_summaries: str, selected_text: str, currPDFName: str):
     prompt = f"""A user is currently reading the following passage in the PDF **{currPDFName}**:  
 {selected_text}  
@@ -62,29 +119,27 @@ Your task:
 Return the output in **markdown** format.  
 """
 
-    # Streaming API (sync generator)
-    response_stream = client.models.generate_content_stream(
+    # Streaming API (sync generator, opened on first event)
+    response_stream = outbound.stream("gemini", lambda: get_genai_client().models.generate_content_stream(
         model=os.getenv("GEMINI_MODEL"),
         contents=[prompt]
-    )
+    ))
 
     # Wrap sync iteration in async generator
-    for event in response_stream:
-        if event.candidates and event.candidates[0].content.parts:
-            for part in event.candidates[0].content.parts:
-                if part.text:
-                    yield part.text
+    async for text in _timed_stream("llm_insights", response_stream, prompt_chars=len(prompt)):
+        yield text
 
 def make_podcast(summaries:str):
     prompt = f"Create a podcast script based on the following summaries: {summaries}. The 2 podcast hosts are 'kore' and 'enceladus'. Make sure to include engaging dialogue and a clear narrative structure. The podcast should be about 2 to 3 minutes. Each person's dialogue should be at least 30 seconds."
-    response = client.models.generate_content(
-        model=os.getenv("GEMINI_MODEL"),
-        contents=[prompt],
-        config={
-            "response_mime_type": "application/json",
-            "response_schema": PodcastScript
-        }
-    )
+    with metrics.stage("llm_podcast_script", prompt_chars=len(prompt)):
+        response = outbound.call("gemini", lambda: get_genai_client().models.generate_content(
+            model=os.getenv("GEMINI_MODEL"),
+            contents=[prompt],
+            config={
+                "response_mime_type": "application/json",
+                "response_schema": PodcastScript
+            }
+        ))
     result=response.parsed
     return { "script": [[dialog.speaker, dialog.text] for dialog in result.script ]}
 
@@ -103,14 +158,11 @@ Your task is to:
 - Maintain brevity and keep it concise
 
 Format the guide in **markdown** with clear headings and structure. Make it actionable and engaging for someone who wants to deeply understand this material."""
-    response_stream = client.models.generate_content_stream(
+    response_stream = outbound.stream("gemini", lambda: get_genai_client().models.generate_content_stream(
         model=os.getenv("GEMINI_MODEL"),
         contents=[prompt]
-    )
+    ))
 
     # Wrap sync iteration in async generator
-    for event in response_stream:
-        if event.candidates and event.candidates[0].content.parts:
-            for part in event.candidates[0].content.parts:
-                if part.text:
-                    yield part.text
\ No newline at end of file
+    async for text in _timed_stream("llm_guide", response_stream, prompt_chars=len(prompt)):
+        yield text
@@ -0,0 +1,218 @@
+import contextvars
+import os
+import resource
+import threading
+import time
+import tracemalloc
+from contextlib import contextmanager
+
+# Set PIPELINE_TRACE_MEMORY=1 to measure Python allocation peaks per stage (tracemalloc, slower)
+TRACE_MEMORY = os.getenv("PIPELINE_TRACE_MEMORY", "0") == "1"
+
+# Histogram buckets in seconds, from a single XGBoost call up to a large PDF
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120)
+
+_lock = threading.Lock()
+_counters = {}
+_gauges = {}
+_histograms = {}
+_help = {}
+_trace = contextvars.ContextVar("pipeline_trace", default=None)
+
+if TRACE_MEMORY:
+    tracemalloc.start()
+
+
+def _key(name, labels):
+    return name, tuple(sorted(labels.items()))
+
+
+def describe(name: str, kind: str, text: str):
+    """Register the HELP/TYPE lines for a metric family."""
+    _help[name] = (kind, text)
+
+
+def inc(name: str, value: float = 1.0, **labels):
+    with _lock:
+        k = _key(name, labels)
+        _counters[k] = _counters.get(k, 0.0) + value
+
+
+def set_gauge(name: str, value: float, **labels):
+    with _lock:
+        _gauges[_key(name, labels)] = value
+
+
+def max_gauge(name: str, value: float, **labels):
+    with _lock:
+        k = _key(name, labels)
+        if value > _gauges.get(k, float("-inf")):
+            _gauges[k] = value
+
+
+def observe(name: str, value: float, buckets=DEFAULT_BUCKETS, **labels):
+    with _lock:
+        k = _key(name, labels)
+        h = _histograms.get(k)
+        if h is None:
+            h = _histograms[k] = {"buckets": buckets, "counts": [0] * len(buckets), "sum": 0.0, "count": 0}
+        for i, le in enumerate(h["buckets"]):
+            if value <= le:
+                h["counts"][i] += 1
+        h["sum"] += value
+        h["count"] += 1
+
+
+def _peak_rss_bytes() -> int:
+    # ru_maxrss is in KiB on Linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+describe("pipeline_stage_seconds", "histogram", "Wall time per pipeline stage")
+describe("pipeline_stage_thread_cpu_seconds_total", "counter",
+         "CPU time of the thread that entered the stage; excludes pool threads and processes it waited on")
+describe("pipeline_stage_items_total", "counter", "Pages, spans, rows or chunks processed per pipeline stage")
+describe("pipeline_stage_errors_total", "counter", "Pipeline stages that raised")
+describe("pipeline_stage_peak_alloc_bytes", "gauge", "Largest Python allocation peak seen per stage (PIPELINE_TRACE_MEMORY=1)")
+describe("process_peak_rss_bytes", "gauge", "Peak resident set size of this worker")
+
+
+def record(rec: dict):
+    """Fold one finished stage record into the aggregates and the active request trace."""
+    name = rec["stage"]
+    observe("pipeline_stage_seconds", rec["wall_s"], stage=name)
+    inc("pipeline_stage_thread_cpu_seconds_total", rec["thread_cpu_s"], stage=name)
+    for item, value in rec.get("items", {}).items():
+        inc("pipeline_stage_items_total", value, stage=name, item=item)
+    if rec.get("error"):
+        inc("pipeline_stage_errors_total", stage=name)
+    if "peak_alloc_bytes" in rec:
+        max_gauge("pipeline_stage_peak_alloc_bytes", rec["peak_alloc_bytes"], stage=name)
+    max_gauge("process_peak_rss_bytes", rec["peak_rss_bytes"])
+
+    trace = _trace.get()
+    if trace is not None:
+        trace.append(rec)
+
+
+class Stage:
+    """Handle yielded by `stage()`; call `count()` to attach item counts."""
+
+    def __init__(self, name: str, items: dict):
+        self.name = name
+        self.items = dict(items)
+
+    def count(self, **items):
+        for k, v in items.items():
+            self.items[k] = self.items.get(k, 0) + v
+
+
+@contextmanager
+def stage(name: str, **items):
+    """
+    Time a pipeline stage: wall time, CPU time of the calling thread, item counts and
+    memory peaks. The CPU time does not include work the stage hands to other threads
+    or processes, so it reads near zero for stages that mostly wait. Usage:
+
+        with metrics.stage("feature_dataset") as st:
+            df = generate_feature_rich_dataset(path)
+            st.count(rows=len(df))
+    """
+    st = Stage(name, items)
+    if TRACE_MEMORY:
+        alloc_start = tracemalloc.get_traced_memory()[0]
+        tracemalloc.reset_peak()
+    t0 = time.perf_counter()
+    c0 = time.thread_time()
+    error = None
+    try:
+        yield st
+    except GeneratorExit:
+        # A streaming client went away; not a stage failure
+        raise
+    except BaseException as e:
+        error = type(e).__name__
+        raise
+    finally:
+        rec = {
+            "stage": name,
+            "wall_s": round(time.perf_counter() - t0, 4),
+            "thread_cpu_s": round(time.thread_time() - c0, 4),
+            "items": st.items,
+            "peak_rss_bytes": _peak_rss_bytes(),
+            "pid": os.getpid(),
+        }
+        if TRACE_MEMORY:
+            rec["peak_alloc_bytes"] = max(0, tracemalloc.get_traced_memory()[1] - alloc_start)
+        if error:
+            rec["error"] = error
+        record(rec)
+
+
+@contextmanager
+def collect():
+    """Collect the stage records produced in this context (the per-request trace)."""
+    trace = []
+    token = _trace.set(trace)
+    try:
+        yield trace
+    finally:
+        _trace.reset(token)
+
+
+def call_with_trace(fn, *args, **kwargs):
+    """Run fn in a worker process and return (result, stage records) for the parent to replay."""
+    with collect() as trace:
+        result = fn(*args, **kwargs)
+    return result, trace
+
+
+def replay(records):
+    """Record stages that ran in another process as if they ran here."""
+    for rec in records:
+        record(rec)
+
+
+def _fmt_labels(labels, extra=()):
+    pairs = list(labels) + list(extra)
+    if not pairs:
+        return ""
+    escaped = [(k, str(v).replace("\\", "\\\\").replace('"', '\\"')) for k, v in pairs]
+    return "{" + ",".join(f'{k}="{v}"' for k, v in escaped) + "}"
+
+
+def render_prometheus() -> str:
+    """
+    Render every metric in the Prometheus text exposition format.
+
+    The aggregates live in this process only, so every series carries a `worker`
+    label with its pid: each gunicorn worker has to be scraped on its own and the
+    series summed across workers.
+    """
+    lines = []
+    seen = set()
+    worker = [("worker", os.getpid())]
+
+    def header(name, fallback_kind):
+        if name in seen:
+            return
+        seen.add(name)
+        kind, text = _help.get(name, (fallback_kind, name))
+        lines.append(f"# HELP {name} {text}")
+        lines.append(f"# TYPE {name} {kind}")
+
+    with _lock:
+        for (name, labels), value in sorted(_counters.items()):
+            header(name, "counter")
+            lines.append(f"{name}{_fmt_labels(labels, worker)} {value}")
+        for (name, labels), value in sorted(_gauges.items()):
+            header(name, "gauge")
+            lines.append(f"{name}{_fmt_labels(labels, worker)} {value}")
+        for (name, labels), h in sorted(_histograms.items()):
+            header(name, "histogram")
+            for le, c in zip(h["buckets"], h["counts"]):
+                lines.append(f"{name}_bucket{_fmt_labels(labels, worker + [('le', le)])} {c}")
+            lines.append(f"{name}_bucket{_fmt_labels(labels, worker + [('le', '+Inf')])} {h['count']}")
+            lines.append(f"{name}_sum{_fmt_labels(labels, worker)} {h['sum']}")
+            lines.append(f"{name}_count{_fmt_labels(labels, worker)} {h['count']}")
+    return "\n".join(lines) + "\n"
@@ -0,0 +1,147 @@
+import os
+import pickle
+import threading
+import time
+
+# ===== Model locations =====
+EMBEDDING_MODEL = "all-mpnet-base-v2"
+SENTENCE_MODEL_DIR = "saved_models/sentence_transformer"
+XGB_MODEL_PATH = "./xgb_model.pkl"
+
+# NLTK resource path -> package name used by nltk.download
+NLTK_RESOURCES = {
+    "tokenizers/punkt_tab": "punkt_tab",
+    "taggers/averaged_perceptron_tagger_eng": "averaged_perceptron_tagger_eng",
+    "corpora/stopwords": "stopwords",
+}
+
+# Modules whose import pulls in torch, pandas, xgboost, chromadb, pymupdf4llm ...
+PIPELINE_MODULES = [
+    "process_pdfs",
+    "chunking_3",
+    "semantic_search_3",
+    "llm_features",
+    "generate_audio",
+]
+
+_registry_lock = threading.Lock()
+_locks = {}
+_models = {}
+_status = {}
+_started_at = time.time()
+
+
+def _load(name, loader):
+    """Load a model once per process, recording its state for the readiness probe."""
+    if name in _models:
+        return _models[name]
+    with _registry_lock:
+        lock = _locks.setdefault(name, threading.Lock())
+    with lock:
+        if name in _models:
+            return _models[name]
+        _status[name] = {"state": "loading"}
+        t0 = time.perf_counter()
+        try:
+            model = loader()
+        except Exception as e:
+            _status[name] = {"state": "failed", "error": str(e)}
+            raise
+        _models[name] = model
+        _status[name] = {"state": "loaded", "load_seconds": round(time.perf_counter() - t0, 2)}
+        return model
+
+
+def get_embedding_model():
+    """SentenceTransformer shared by chunk indexing and semantic search."""
+    def loader():
+        from sentence_transformers import SentenceTransformer
+        source = SENTENCE_MODEL_DIR if os.path.isdir(SENTENCE_MODEL_DIR) else EMBEDDING_MODEL
+        model = SentenceTransformer(source)
+        print(f"✓ SentenceTransformer loaded from: {source}")
+        return model
+    return _load("embedding_model", loader)
+
+
+def get_xgb_model(model_path: str = XGB_MODEL_PATH):
+    """Return (clf, feature_cols) for the heading classifier, unpickled once per path."""
+    def loader():
+        import xgboost  # noqa: F401  (needed to unpickle the booster)
+        with open(model_path, "rb") as f:
+            data = pickle.load(f)
+
+        if isinstance(data, tuple) and len(data) == 3:
+            clf, feature_cols, model_type = data
+        else:
+            clf, feature_cols = data
+            model_type = "xgb"
+
+        if model_type != "xgb":
+            raise ValueError("Expected XGB model type")
+
+        feature_cols = list(feature_cols)
+        if "prev_label" not in feature_cols:
+            feature_cols.append("prev_label")
+        return clf, feature_cols
+    return _load(f"xgb_model:{os.path.abspath(model_path)}", loader)
+
+
+def ensure_nltk():
+    """Make sure the NLTK data used by feature extraction is present, downloading only what is missing."""
+    def loader():
+        import nltk
+        for resource, package in NLTK_RESOURCES.items():
+            try:
+                nltk.data.find(resource)
+            except LookupError:
+                nltk.download(package, quiet=True)
+        return True
+    return _load("nltk_data", loader)
+
+
+def get_genai_client():
+    """Gemini client shared by the LLM features and the GCP TTS backend."""
+    def loader():
+        from google import genai
+        # Another Gemini-compatible endpoint, e.g. the load test's local fake
+        base_url = os.getenv("GEMINI_BASE_URL")
+        return genai.Client(api_key=os.getenv("GOOGLE_API_KEY"), http_options={"base_url": base_url} if base_url else None)
+    return _load("genai_client", loader)
+
+
+def import_pipeline():
+    """Import the request-handling modules so their heavy dependencies are paid for up front."""
+    def loader():
+        import importlib
+        return [importlib.import_module(m) for m in PIPELINE_MODULES]
+    return _load("pipeline_modules", loader)
+
+
+def warm_up():
+    """Load everything the endpoints need. Failures are recorded, not raised."""
+    steps = [import_pipeline, ensure_nltk, get_xgb_model, get_embedding_model]
+    if os.getenv("GOOGLE_API_KEY"):
+        steps.append(get_genai_client)
+    for step in steps:
+        try:
+            step()
+        except Exception as e:
+            print(f"❌ Warm-up step {step.__name__} failed: {e}")
+
+
+def start_background_warm_up() -> threading.Thread:
+    thread = threading.Thread(target=warm_up, name="model-warm-up", daemon=True)
+    thread.start()
+    return thread
+
+
+def readiness() -> dict:
+    """Snapshot of what is loaded; ready once the pipeline, classifier and embedder are up."""
+    required = ["pipeline_modules", "nltk_data", "embedding_model"]
+    loaded = {name for name, s in _status.items() if s["state"] == "loaded"}
+    has_xgb = any(name.startswith("xgb_model:") for name in loaded)
+    return {
+        "ready": has_xgb and all(name in loaded for name in required),
+        "uptime_seconds": round(time.time() - _started_at, 1),
+        "models": dict(_status),
+    }
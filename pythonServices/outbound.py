@@ -0,0 +1,289 @@
+"""
+Outbound calls to the remote LLM and TTS providers.
+
+Every call to Gemini or Azure TTS goes through a Provider, one per remote
+service and process:
+
+  connection pool    a shared requests.Session with keep-alive (HTTP providers)
+  concurrency cap    at most CONCURRENCY calls in flight; more callers wait
+  retries            RETRIES more attempts on timeouts, connection errors,
+                     429 and 5xx, after a jittered exponential backoff
+  hedging            with HEDGE_S > 0, a second attempt is started when the
+                     first has not answered after HEDGE_S seconds and a slot
+                     is free; the first answer wins
+  circuit breaker    after CIRCUIT_FAILURES failed calls in a row, calls fail
+                     fast with CircuitOpen for CIRCUIT_RESET_S seconds, then
+                     one probe call decides whether it closes again
+
+Settings are read as OUTBOUND_<SETTING> for every provider and can be
+overridden per provider as OUTBOUND_<PROVIDER>_<SETTING>, e.g.
+OUTBOUND_AZURE_TTS_CONCURRENCY=4 or OUTBOUND_GEMINI_HEDGE_S=20.
+
+    response = outbound.call("gemini", lambda: client.models.generate_content(...))
+    for event in outbound.stream("gemini", lambda: client.models.generate_content_stream(...)):
+        ...
+    provider = outbound.provider("azure_tts")
+    outbound.call("azure_tts", lambda: provider.session().post(url, json=..., timeout=provider.timeout))
+"""
+import os
+import random
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterator, Optional, TypeVar
+
+import metrics
+
+# Status codes worth another attempt
+RETRY_STATUS = {408, 429, 500, 502, 503, 504}
+
+metrics.describe("outbound_request_seconds", "histogram", "Duration of outbound provider calls per outcome")
+metrics.describe("outbound_retries_total", "counter", "Outbound attempts repeated after a retryable error")
+metrics.describe("outbound_hedges_total", "counter", "Hedged second attempts started for slow outbound calls")
+metrics.describe("outbound_circuit_open_total", "counter", "Times a provider's circuit breaker opened")
+metrics.describe("outbound_rejected_total", "counter", "Outbound calls refused while the circuit is open")
+metrics.describe("outbound_inflight", "gauge", "Outbound calls in flight per provider")
+
+T = TypeVar("T")
+
+
+class CircuitOpen(RuntimeError):
+    """Raised instead of calling a provider whose recent calls all failed."""
+
+    def __init__(self, provider: str, retry_after: float):
+        super().__init__(f"{provider} is failing, not called for another {retry_after:.0f}s")
+        self.provider = provider
+        self.retry_after = retry_after
+
+
+def _setting(provider: str, name: str, default: str) -> str:
+    return os.getenv(f"OUTBOUND_{provider.upper()}_{name}", os.getenv(f"OUTBOUND_{name}", default))
+
+
+def status_code(error: BaseException) -> Optional[int]:
+    """HTTP status of a requests, httpx or google-genai error, if it has one."""
+    response = getattr(error, "response", None)
+    for value in (getattr(error, "code", None), getattr(error, "status_code", None),
+                  getattr(response, "status_code", None)):
+        if isinstance(value, int):
+            return value
+    return None
+
+
+def retryable(error: BaseException) -> bool:
+    """Timeouts, connection errors, 429 and 5xx: the provider may answer the same call next time."""
+    if isinstance(error, (ConnectionError, TimeoutError)):
+        return True
+    code = status_code(error)
+    if code is not None:
+        return code in RETRY_STATUS
+    # requests and httpx transport errors (ConnectTimeout, ReadTimeout, ConnectError, ...)
+    return type(error).__module__.split(".")[0] in ("requests", "httpx", "urllib3") and any(
+        word in type(error).__name__ for word in ("Timeout", "Connect", "Protocol", "Read", "Write")
+    )
+
+
+class Provider:
+    def __init__(self, name: str):
+        self.name = name
+        self.concurrency = int(_setting(name, "CONCURRENCY", "8"))
+        self.retries = int(_setting(name, "RETRIES", "2"))
+        self.backoff_s = float(_setting(name, "BACKOFF_S", "0.5"))
+        self.hedge_s = float(_setting(name, "HEDGE_S", "0"))
+        # (connect, read) timeout of HTTP calls
+        self.timeout = (float(_setting(name, "CONNECT_TIMEOUT_S", "5")), float(_setting(name, "TIMEOUT_S", "60")))
+        self.circuit_failures = int(_setting(name, "CIRCUIT_FAILURES", "5"))
+        self.circuit_reset_s = float(_setting(name, "CIRCUIT_RESET_S", "30"))
+
+        self._slots = threading.BoundedSemaphore(self.concurrency)
+        self._lock = threading.Lock()
+        self._inflight = 0
+        self._failures = 0
+        self._opened_at = None
+        self._probing = False
+        self._session = None
+        self._hedge_pool = None
+
+    def session(self):
+        """requests.Session with a keep-alive pool of `concurrency` connections per host."""
+        with self._lock:
+            if self._session is None:
+                import requests
+                from requests.adapters import HTTPAdapter
+
+                session = requests.Session()
+                adapter = HTTPAdapter(pool_connections=4, pool_maxsize=self.concurrency, max_retries=0)
+                session.mount("https://", adapter)
+                session.mount("http://", adapter)
+                self._session = session
+            return self._session
+
+    # ----- circuit breaker -----
+
+    def _admit(self) -> bool:
+        """Whether a call may go out now. Returns True for the half-open probe."""
+        with self._lock:
+            if self._opened_at is None:
+                return False
+            waited = time.monotonic() - self._opened_at
+            if waited < self.circuit_reset_s or self._probing:
+                metrics.inc("outbound_rejected_total", provider=self.name)
+                raise CircuitOpen(self.name, max(0.0, self.circuit_reset_s - waited))
+            self._probing = True
+            return True
+
+    def _record(self, ok: bool, probe: bool) -> None:
+        with self._lock:
+            if probe:
+                self._probing = False
+            if ok:
+                self._failures = 0
+                self._opened_at = None
+                return
+            self._failures += 1
+            if probe or (self._opened_at is None and self._failures >= self.circuit_failures):
+                if self._opened_at is None or probe:
+                    metrics.inc("outbound_circuit_open_total", provider=self.name)
+                self._opened_at = time.monotonic()
+
+    # ----- attempts -----
+
+    @contextmanager
+    def _slot(self):
+        """A concurrency slot, counted in the inflight gauge."""
+        with self._slots:
+            with self._lock:
+                self._inflight += 1
+                metrics.set_gauge("outbound_inflight", self._inflight, provider=self.name)
+            try:
+                yield
+            finally:
+                with self._lock:
+                    self._inflight -= 1
+                    metrics.set_gauge("outbound_inflight", self._inflight, provider=self.name)
+
+    def _run(self, fn: Callable[[], T]) -> T:
+        """One attempt in a concurrency slot, timed."""
+        with self._slot():
+            t0 = time.perf_counter()
+            outcome = "error"
+            try:
+                result = fn()
+                outcome = "ok"
+                return result
+            finally:
+                metrics.observe("outbound_request_seconds", time.perf_counter() - t0, provider=self.name, outcome=outcome)
+
+    def _hedged(self, fn: Callable[[], T]) -> T:
+        """fn, with a second attempt after hedge_s if a slot is free; the first result wins."""
+        with self._lock:
+            if self._hedge_pool is None:
+                self._hedge_pool = ThreadPoolExecutor(max_workers=2 * self.concurrency, thread_name_prefix=f"hedge-{self.name}")
+        pending = {self._hedge_pool.submit(self._run, fn)}
+        done, pending = wait(pending, timeout=self.hedge_s)
+        if not done and self._inflight < self.concurrency:
+            metrics.inc("outbound_hedges_total", provider=self.name)
+            pending.add(self._hedge_pool.submit(self._run, fn))
+        error = None
+        while True:
+            for future in done:
+                if future.exception() is None:
+                    return future.result()
+                error = future.exception()
+            if not pending:
+                raise error
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+
+    def call(self, fn: Callable[[], T], idempotent: bool = True) -> T:
+        """
+        fn() with the provider's concurrency cap, retries, hedging and circuit
+        breaker. Calls that are not idempotent are neither retried nor hedged.
+        """
+        for attempt in range(self.retries + 1):
+            probe = self._admit()
+            try:
+                result = self._hedged(fn) if idempotent and self.hedge_s > 0 else self._run(fn)
+            except Exception as e:
+                failed = retryable(e)
+                # Client errors (4xx) say nothing about the provider's health
+                self._record(not failed, probe)
+                if not failed or not idempotent or attempt == self.retries:
+                    raise
+                metrics.inc("outbound_retries_total", provider=self.name)
+                time.sleep(self.backoff_s * 2 ** attempt * random.uniform(0.5, 1.5))
+                continue
+            self._record(True, probe)
+            return result
+
+    def stream(self, open_stream: Callable[[], Iterator[T]]) -> Iterator[T]:
+        """
+        Items of the iterator open_stream() returns. Retried like call() until
+        the first item arrives; after that an error ends the stream. The stream
+        holds a concurrency slot until it is exhausted or closed.
+        """
+        for attempt in range(self.retries + 1):
+            probe = self._admit()
+            first = None
+            with self._slot():
+                t0 = time.perf_counter()
+                try:
+                    iterator = iter(open_stream())
+                    first = next(iterator, StopIteration)
+                except Exception as e:
+                    failed = retryable(e)
+                    self._record(not failed, probe)
+                    metrics.observe("outbound_request_seconds", time.perf_counter() - t0, provider=self.name, outcome="error")
+                    if not failed or attempt == self.retries:
+                        raise
+                    metrics.inc("outbound_retries_total", provider=self.name)
+                else:
+                    self._record(True, probe)
+                    outcome = "error"
+                    try:
+                        if first is not StopIteration:
+                            yield first
+                            yield from iterator
+                        outcome = "ok"
+                    except GeneratorExit:
+                        # The caller stopped reading
+                        outcome = "closed"
+                        raise
+                    finally:
+                        metrics.observe("outbound_request_seconds", time.perf_counter() - t0, provider=self.name, outcome=outcome)
+                    return
+            time.sleep(self.backoff_s * 2 ** attempt * random.uniform(0.5, 1.5))
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {
+                "inflight": self._inflight,
+                "concurrency": self.concurrency,
+                "consecutive_failures": self._failures,
+                "circuit_open": self._opened_at is not None,
+            }
+
+
+_providers: Dict[str, Provider] = {}
+_providers_lock = threading.Lock()
+
+
+def provider(name: str) -> Provider:
+    with _providers_lock:
+        if name not in _providers:
+            _providers[name] = Provider(name)
+        return _providers[name]
+
+
+def call(name: str, fn: Callable[[], T], idempotent: bool = True) -> T:
+    return provider(name).call(fn, idempotent)
+
+
+def stream(name: str, open_stream: Callable[[], Iterator[T]]) -> Iterator[T]:
+    return provider(name).stream(open_stream)
+
+
+def stats() -> Dict:
+    with _providers_lock:
+        providers = list(_providers.values())
+    return {p.name: p.stats() for p in providers}
@@ -1,5 +1,7 @@
 
 import pymupdf4llm
+from pymupdf4llm.helpers.pymupdf_rag import IdentifyHeaders
+import os
 import re
 import json
 import fitz
@@ -9,6 +11,25 @@ import time
 from sklearn.feature_extraction.text import ENGLISH_STOP_WORDS
 from final_nltk import *
 from difflib import get_close_matches
+import doc_pool
+import extraction_cache
+import large_pdf
+import metrics
+
+# Heading candidate filters, compiled once. Every month name contains its
+# three-letter abbreviation, so the abbreviations alone cover both.
+_MONTH_PATTERN = r'jan|feb|mar|apr|may|jun|jul|aug|sep|oct|nov|dec'
+_MONTH_RE = re.compile(_MONTH_PATTERN)
+_SKIP_LINE_RE = re.compile(_MONTH_PATTERN + r'|page|copyright|©|author|date')
+_NUMBERING_RE = re.compile(r'^\s*(?:[A-Za-z]+|\d+(?:\.\d+)*)(?:[\.\)])?\s+')
+_HEADER_STRIP_RE = re.compile(r'[^\w\s\.\,]')
+# Everything but letters, digits and whitespace (\w also matches '_')
+_NON_ALNUM_RE = re.compile(r'[^\w\s]|_')
+_MARKUP_CHARS = str.maketrans('', '', '*#')
+
+# How header candidates are generated: "markdown" (pymupdf4llm) or "spans" (span styles only)
+CANDIDATE_MODES = ("markdown", "spans")
+HEADER_CANDIDATE_MODE = os.getenv("HEADER_CANDIDATE_MODE", "markdown")
 
 class PDFTitleOutlineExtractor:
     def __init__(self):
@@ -18,48 +39,46 @@ class PDFTitleOutlineExtractor:
     def extract_title_from_first_page(self, pdf_path: str) -> Optional[str]:
         """Extract title heuristically from the first page"""
         try:
-            doc = fitz.open(pdf_path)
-            if len(doc) == 0:
-                return None
-
-            first_page = doc[0]
-            blocks = first_page.get_text("dict")["blocks"]
-            page_width = first_page.rect.width
-
-            # Look for the largest font size text in the first page
-            largest_font_size = 0
-            title_candidates = []
-
-            for block in blocks:
-                if "lines" in block:
-                    for line in block["lines"]:
-                        for span in line["spans"]:
-                            font_size = span["size"]
-                            text = span["text"].strip()
-                            if(span["bbox"][0]>page_width*0.6):
-                                continue
-
-                            # Skip very short texts and common non-title texts
-                            if (len(text) > 5 and 
-                                not any(word in text.lower() for word in ('page', 'copyright', '©', 'author', 'date')) and
-                                not re.match(r'^\d+$', text)):
-                                # also check if majority of text has alnumeric characters
-                                count_alnum = sum(c.isalnum() or c.isspace() for c in text)
-
-                                if font_size > largest_font_size and count_alnum/len(text) > 0.7:
-                                    largest_font_size = font_size
-                                    title_candidates = [text]
-                                elif font_size == largest_font_size:
-                                    title_candidates.append(text)
-
-            # Return the first reasonable title candidate
+            with doc_pool.document(pdf_path) as doc:
+                if len(doc) == 0:
+                    return None
+
+                first_page = doc[0]
+                blocks = first_page.get_text("dict")["blocks"]
+                page_width = first_page.rect.width
+
+                # Look for the largest font size text in the first page
+                largest_font_size = 0
+                title_candidates = []
+
+                for block in blocks:
+                    if "lines" in block:
+                        for line in block["lines"]:
+                            for span in line["spans"]:
+                                font_size = span["size"]
+                                text = span["text"].strip()
+                                if(span["bbox"][0]>page_width*0.6):
+                                    continue
+
+                                # Skip very short texts and common non-title texts
+                                if (len(text) > 5 and 
+                                    not any(word in text.lower() for word in ('page', 'copyright', '©', 'author', 'date')) and
+                                    not re.match(r'^\d+$', text)):
+                                    # also check if majority of text has alnumeric characters
+                                    count_alnum = sum(c.isalnum() or c.isspace() for c in text)
+
+                                    if font_size > largest_font_size and count_alnum/len(text) > 0.7:
+                                        largest_font_size = font_size
+                                        title_candidates = [text]
+                                    elif font_size == largest_font_size:
+                                        title_candidates.append(text)
+
+                # Return the first reasonable title candidate
         
-            for candidate in title_candidates:
-                candidate = candidate.strip()
-                if len(candidate.split()) <= 10:  # Reasonable title length
-                    return candidate
-
-            doc.close()
+                for candidate in title_candidates:
+                    candidate = candidate.strip()
+                    if len(candidate.split()) <= 10:  # Reasonable title length
+                        return candidate
         except Exception as e:
             print(f"Error extracting title from first page: {e}")
 
@@ -91,113 +110,119 @@ class PDFTitleOutlineExtractor:
         """Check if the font is bold by looking for 'Bold' in the font name."""
         return "Bold" in span.get("font", "")
 
-    def extract_markdown_from_pdf(self, pdf_path):
-
-        doc = fitz.open(pdf_path)
+    def extract_markdown_from_pdf(self, pdf_path, pages: Optional[List[int]] = None):
+        """
+        Markdown-like text per page built from span styles alone (headings from font
+        size, bullets, table rows). `pages` limits it to those 0-based page indices;
+        the result has one entry per requested page.
+        """
         markdown_pages = []
-
-        for page_num, page in enumerate(doc, 1):
-            blocks = page.get_text("dict")["blocks"]
-            markdown_output = ""
-            found_table = False
-
-            # Collect average font size
-            font_sizes = []
-            for block in blocks:
-                if "lines" in block:
-                    for line in block["lines"]:
-                        for span in line["spans"]:
-                            font_sizes.append(span["size"])
-            avg_font_size = sum(font_sizes) / len(font_sizes) if font_sizes else 12
-
-            for block in blocks:
-                if "lines" not in block:
-                    continue
-
-                line_positions = []
-                for line in block["lines"]:
-                    spans = line["spans"]
-                    if not spans:
-                        continue
-
-                    line_text = " ".join(span["text"] for span in spans).strip()
-                    if not line_text:
-                        continue
-
-                    # Detect bullet points
-                    if line_text.startswith(("●", "•", "-")):
-                        markdown_output += f"- {line_text[1:].strip()}\n"
+        with doc_pool.document(pdf_path) as doc:
+            for page_num, page in large_pdf.iter_pages(doc, pages, large_pdf.page_window(pdf_path)):
+                blocks = page.get_text("dict")["blocks"]
+                markdown_output = ""
+                found_table = False
+
+                # Collect average font size
+                font_sizes = []
+                for block in blocks:
+                    if "lines" in block:
+                        for line in block["lines"]:
+                            for span in line["spans"]:
+                                font_sizes.append(span["size"])
+                avg_font_size = sum(font_sizes) / len(font_sizes) if font_sizes else 12
+
+                for block in blocks:
+                    if "lines" not in block:
                         continue
 
-                    avg_font_span = sum(span["size"] for span in spans) / len(spans)
-
-                    # Detect potential table patterns
-                    # If the line has multiple spans with same y-coordinates and different x-coordinates → likely a row in a table
-                    if len(spans) >= 2:
-                        y_coords = [round(span["bbox"][1], 1) for span in spans]
-                        if max(y_coords) - min(y_coords) < 2.0:
-                            x_coords = [span["bbox"][0] for span in spans]
-                            if max(x_coords) - min(x_coords) > 100:  # heuristics
-                                found_table = True
-                                markdown_output += "| " + " | ".join(span["text"].strip() for span in spans) + " |\n"
-                                markdown_output += "| " + " | ".join("---" for _ in spans) + " |\n"
-                                continue
-
-                    # Detect headers
-                    if (
-                        avg_font_span > avg_font_size * 1.2
-                        and all(
-                            not word.isalpha()
-                            or (word.isalpha() and (word[0].isupper() or word.lower() in ENGLISH_STOP_WORDS))
-                            for word in line_text.split()
-                        )
-                        and not all(word.lower() in ENGLISH_STOP_WORDS for word in line_text.split())
-                    ) and any(word.isalpha() for word in line_text.split()):
-                        if avg_font_span > avg_font_size * 1.8:
-                            markdown_output += f"# {line_text}\n"
-                        elif avg_font_span > avg_font_size * 1.4:
-                            markdown_output += f"## {line_text}\n"
+                    line_positions = []
+                    for line in block["lines"]:
+                        spans = line["spans"]
+                        if not spans:
+                            continue
+
+                        line_text = " ".join(span["text"] for span in spans).strip()
+                        if not line_text:
+                            continue
+
+                        # Detect bullet points
+                        if line_text.startswith(("●", "•", "-")):
+                            markdown_output += f"- {line_text[1:].strip()}\n"
+                            continue
+
+                        avg_font_span = sum(span["size"] for span in spans) / len(spans)
+
+                        # Detect potential table patterns
+                        # If the line has multiple spans with same y-coordinates and different x-coordinates → likely a row in a table
+                        if len(spans) >= 2:
+                            y_coords = [round(span["bbox"][1], 1) for span in spans]
+                            if max(y_coords) - min(y_coords) < 2.0:
+                                x_coords = [span["bbox"][0] for span in spans]
+                                if max(x_coords) - min(x_coords) > 100:  # heuristics
+                                    found_table = True
+                                    markdown_output += "| " + " | ".join(span["text"].strip() for span in spans) + " |\n"
+                                    markdown_output += "| " + " | ".join("---" for _ in spans) + " |\n"
+                                    continue
+
+                        # Detect headers
+                        if (
+                            avg_font_span > avg_font_size * 1.2
+                            and all(
+                                not word.isalpha()
+                                or (word.isalpha() and (word[0].isupper() or word.lower() in ENGLISH_STOP_WORDS))
+                                for word in line_text.split()
+                            )
+                            and not all(word.lower() in ENGLISH_STOP_WORDS for word in line_text.split())
+                        ) and any(word.isalpha() for word in line_text.split()):
+                            if avg_font_span > avg_font_size * 1.8:
+                                markdown_output += f"# {line_text}\n"
+                            elif avg_font_span > avg_font_size * 1.4:
+                                markdown_output += f"## {line_text}\n"
+                            else:
+                                markdown_output += f"### {line_text}\n"
                         else:
-                            markdown_output += f"### {line_text}\n"
-                    else:
-                        markdown_output += f"{line_text}\n"
+                            markdown_output += f"{line_text}\n"
 
-            if found_table:
-                pass
+                if found_table:
+                    pass
 
-            markdown_pages.append(markdown_output.strip())
+                markdown_pages.append(markdown_output.strip())
 
         return markdown_pages
 
 
+    @staticmethod
+    def _title_filter(title: str):
+        """Predicate: True for lines that contain the title (ignoring markdown emphasis)."""
+        title_key = title.lower().strip()
+        return lambda line: title_key in line.lower().translate(_MARKUP_CHARS).strip()
+
     def parse_markdown_headers(self, markdown_content: str,title:str,level_mapping:Dict[int, int]) -> List[Dict]:
         """Parse explicit markdown headers"""
         headers = []
         lines = markdown_content.split('\n')
+        contains_title = self._title_filter(title)
 
         for i, line in enumerate(lines):
             line = line.strip()
-            if title.lower().strip() in line.lower().replace('**', '').replace('*', '').replace('#','').strip():
+            if not line.startswith('#') or contains_title(line):
                 continue
-            if line.startswith('#'):
-                hash_count = line.count('#')
-                month=[ 'January', 'February', 'March', 'April', 'May', 'June', 'July', 'August', 'September', 'October', 'November', 'December','Jan', 'Feb', 'Mar', 'Apr', 'May', 'Jun', 'Jul', 'Aug', 'Sep', 'Oct', 'Nov', 'Dec']
-                if any(m.lower() in line.lower() for m in month):
-                    continue
-                level = level_mapping.get(hash_count, 3)  # Default to level 3
-
-                # remove special characters keep space
-                
-                cleaned_line = re.sub(r'[^\w\s\.\,]', '', line[hash_count:]).strip()
-                text=cleaned_line
-         
-
-                if text:
-                    headers.append({
-                        'level': f'H{level}',
-                        'text': text,
-                        'line_number': i
-                    })
+            # Skip dated lines
+            if _MONTH_RE.search(line.lower()):
+                continue
+            hash_count = line.count('#')
+            level = level_mapping.get(hash_count, 3)  # Default to level 3
+
+            # remove special characters keep space
+            text = _HEADER_STRIP_RE.sub('', line[hash_count:]).strip()
+
+            if text:
+                headers.append({
+                    'level': f'H{level}',
+                    'text': text,
+                    'line_number': i
+                })
 
         return headers
 
@@ -217,53 +242,49 @@ class PDFTitleOutlineExtractor:
         """Detect headers using semantic analysis"""
         headers = []
         lines = markdown_content.split('\n')
-
-        for i, line in enumerate(lines):
-            if(title.lower().strip() in line.lower().replace('**', '').replace('*', '').replace('#','').strip()):
+        contains_title = self._title_filter(title)
+
+        # next_non_empty[i]: index of the first non-blank line after line i (-1 if none)
+        next_non_empty = [-1] * len(lines)
+        nxt = -1
+        for i in range(len(lines) - 1, -1, -1):
+            next_non_empty[i] = nxt
+            if lines[i].strip():
+                nxt = i
+
+        for i, raw_line in enumerate(lines):
+            line = raw_line.strip()
+            if line.startswith('#') or '|' in line or '---' in line or '...' in line:
                 continue
-            line = line.strip()
-            if line.startswith('#') or line.count('|')>0 or line.count('---')>0  or line.count('...')>0:
+            # Dates, page numbers, copyright and author lines are not headers
+            if _SKIP_LINE_RE.search(line.lower()) or contains_title(raw_line):
                 continue
-            else:
-                # if date in line, skip it
-                
-                month=[ 'January', 'February', 'March', 'April', 'May', 'June', 'July', 'August', 'September', 'October', 'November', 'December','Jan', 'Feb', 'Mar', 'Apr', 'May', 'Jun', 'Jul', 'Aug', 'Sep', 'Oct', 'Nov', 'Dec']
-                if any(m.lower() in line.lower() for m in month):
-                    continue
-                
-                if any(word.lower() in line.lower() for word in ['page', 'copyright', '©', 'author', 'date']):
-                    continue
-                line = re.sub(r'^\s*(?:[A-Za-z]+|\d+(?:\.\d+)*)(?:[\.\)])?\s+', '', line)
-
-
-                cleaned_line = re.sub(r'[^\w\s]', '', line).strip()
-                cleaned_line_temp=""
-
-                for c in cleaned_line:
-                    if c.isalnum() or c.isspace():
-                        cleaned_line_temp+=c
-                cleaned_line=cleaned_line_temp.strip()
-                if len(cleaned_line)>0  and len(cleaned_line.split())<=10 and cleaned_line[0].isupper() and not all(word.lower() in ENGLISH_STOP_WORDS for word in cleaned_line.split()) and any(word.isalpha() for word in cleaned_line.split()) or cleaned_line.endswith(':'):
-                    for j in range(i+1, len(lines)):
-                        
-                        next_line = lines[j].strip()
-
-                        if next_line.count('---')>0 :
-                            
-                            break
-                        if next_line:
-                            # Found a semantic header
-                            level=3
-                            line=line.strip('_').strip()
-
-                            
-                            headers.append({
-                                'level': f'H{level}',
-                                'text': re.sub(r'[^\w\s\.\,]', '', line).strip(),
-                                'line_number': i
-                            })
-                            
-                            break
+            line = _NUMBERING_RE.sub('', line)
+
+            cleaned_line = _NON_ALNUM_RE.sub('', line).strip()
+            words = cleaned_line.split()
+            if not (
+                cleaned_line
+                and len(words) <= 10
+                and cleaned_line[0].isupper()
+                and not all(word.lower() in ENGLISH_STOP_WORDS for word in words)
+                and any(word.isalpha() for word in words)
+            ):
+                continue
+
+            # A header needs body text after it, not a table rule
+            j = next_non_empty[i]
+            if j == -1 or '---' in lines[j]:
+                continue
+
+            # Found a semantic header
+            level=3
+            line=line.strip('_').strip()
+            headers.append({
+                'level': f'H{level}',
+                'text': _HEADER_STRIP_RE.sub('', line).strip(),
+                'line_number': i
+            })
         return headers
 
    
@@ -296,95 +317,182 @@ class PDFTitleOutlineExtractor:
 
         return all_headers
 
-    def process_pdf(self, pdf_path: str, verbose: bool = True) -> Dict:
-        """Main method to process PDF and extract title and outline"""
+    def build_markdown_pages(self, pdf_path: str, mode: str, st: Optional["metrics.Stage"] = None) -> List[Dict]:
+        """Per-page markdown ({"text": ...}) that header candidates are parsed from."""
+        if mode == "spans":
+            return [{"text": text} for text in self.extract_markdown_from_pdf(pdf_path)]
+
+        if large_pdf.is_large(pdf_path):
+            markdown_pages = self._windowed_markdown(pdf_path)
+        else:
+            # pymupdf4llm bakes annotations and removes page rotation: a private handle
+            with doc_pool.document(pdf_path, reuse=False) as doc:
+                markdown_pages = pymupdf4llm.to_markdown(doc, page_chunks=True)
+        for page in markdown_pages:
+            page['text'] = (page['text'] or "").strip()
+        # Span-style fallback, only for the pages pymupdf4llm left empty
+        empty_pages = [i for i, page in enumerate(markdown_pages) if not page['text']]
+        if empty_pages:
+            for i, text in zip(empty_pages, self.extract_markdown_from_pdf(pdf_path, pages=empty_pages)):
+                markdown_pages[i]['text'] = text.strip()
+            if st is not None:
+                st.count(fallback_pages=len(empty_pages))
+        return markdown_pages
+
+    @staticmethod
+    def _windowed_markdown(pdf_path: str) -> List[Dict]:
+        """
+        pymupdf4llm conversion of a large PDF, one page window at a time, keeping only the text.
+
+        With the layout engine, pymupdf4llm numbers headings by ranking the font
+        sizes of the headings on the pages it converts, so every window would
+        number its headings on its own. The heading font sizes are collected over
+        all windows and the headings renumbered once, over the whole document.
+        """
+        with doc_pool.document(pdf_path, reuse=False) as doc:
+            # Without the layout engine, headings follow these font sizes
+            hdr_info = IdentifyHeaders(doc)
+            markdown_pages = []
+            page_headings = []
+            header_sizes = set()
+            for window in large_pdf.page_windows(doc.page_count):
+                chunks = pymupdf4llm.to_markdown(doc, pages=list(window), hdr_info=hdr_info, page_chunks=True)
+                for page_number, chunk in zip(window, chunks):
+                    headings = []
+                    for box in chunk.get("page_boxes", []):
+                        if box["class"] in ("title", "section-header"):
+                            size = PDFTitleOutlineExtractor._max_fontsize(doc[page_number], box["bbox"])
+                            header_sizes.add(size)
+                            headings.append((box["pos"], size))
+                    markdown_pages.append({"text": chunk["text"]})
+                    page_headings.append(headings)
+                large_pdf.release_page_cache()
+        if header_sizes:
+            # Up to 6 levels, largest font first; smaller headings get level 6
+            ranked = sorted(header_sizes, reverse=True)[:6]
+            for page, headings in zip(markdown_pages, page_headings):
+                text = page["text"]
+                for (start, end), size in sorted(headings, reverse=True):
+                    heading = text[start:end]
+                    if heading.startswith("#"):
+                        level = ranked.index(size) + 1 if size >= ranked[-1] else 6
+                        text = text[:start] + "#" * level + heading.lstrip("#") + text[end:]
+                page["text"] = text
+        return markdown_pages
+
+    @staticmethod
+    def _max_fontsize(page, bbox) -> int:
+        """Largest rounded font size of the text in bbox, as pymupdf4llm measures headings."""
+        sizes = [
+            round(span["size"])
+            for block in page.get_text("dict", clip=fitz.Rect(bbox))["blocks"]
+            for line in block.get("lines", [])
+            for span in line["spans"]
+        ]
+        return max(sizes, default=0)
+
+    @staticmethod
+    def join_markdown_pages(markdown_pages: List[Dict]):
+        """The whole document as one markdown string, plus the 1-based page of every line."""
+        markdown_lines = []
+        line_to_page_map = []
+
+        for i, page_md in enumerate(markdown_pages):
+            lines = page_md['text'].split('\n')
+            markdown_lines.extend(lines)
+            line_to_page_map.extend([i + 1] * len(lines))
+
+        return '\n'.join(markdown_lines), line_to_page_map
+
+    def find_header_candidates(self, markdown_content: str, title: str, line_to_page_map: List[int]) -> List[Dict]:
+        """Markdown and semantic header candidates, merged, in line order, with their 1-based page."""
+        headers=self.group_markdown_headers(markdown_content)
+        headers.pop(1, None)  # Remove H1 headers if present
+        level_mapping=[j for j in enumerate(sorted(headers.keys()))] # only 3 headers are present so merge anything above 3 to 3
+        level_mapping = [(level+1, count) for level, count in level_mapping ]
+        level_mapping = [(1, count) if level == 1 else (2, count) if level == 2 else (3, count) for level, count in level_mapping]
+        level_mapping={count: level for level, count in level_mapping}
+
+        markdown_headers = self.parse_markdown_headers(markdown_content,title,level_mapping)
+        semantic_headers = self.detect_semantic_headers(markdown_content,title)
+
+        # Merge and process headers, then estimate page numbers
+        all_headers = self.merge_and_sort_headers(markdown_headers, semantic_headers)
+        return self.estimate_page_numbers(all_headers, line_to_page_map)
+
+    def process_pdf(self, pdf_path: str, verbose: bool = True, mode: Optional[str] = None) -> Dict:
+        """
+        Main method to process PDF and extract title and outline.
+
+        mode (default HEADER_CANDIDATE_MODE) picks how header candidates are found:
+        "markdown" converts the document with pymupdf4llm, "spans" builds them from
+        span styles only, which skips table and image rendering.
+        """
         start_time = time.time()
+        mode = mode or HEADER_CANDIDATE_MODE
+        if mode not in CANDIDATE_MODES:
+            raise ValueError(f"Unknown header candidate mode {mode!r}, expected one of {CANDIDATE_MODES}")
 
         try:
             # Step 1: Convert PDF to markdown
             if verbose:
                 print("Converting PDF to markdown...")
-            markdown_pages = pymupdf4llm.to_markdown(pdf_path, page_chunks=True)
-            markdown_pages_alt= self.extract_markdown_from_pdf(pdf_path)
-            for i,page in enumerate(markdown_pages):
-                if page['text'] is None or page['text'].strip() == "":
-                    markdown_pages[i]['text'] = markdown_pages_alt[i].strip()
-                page['text'] = page['text'].strip()
-
-            markdown_lines = []
-            line_to_page_map = []
+            with metrics.stage("markdown_conversion") as st:
+                markdown_pages = self.build_markdown_pages(pdf_path, mode, st)
+                st.count(pages=len(markdown_pages))
 
-            for i, page_md in enumerate(markdown_pages):
-                
-                lines = page_md['text'].split('\n')
-                markdown_lines.extend(lines)
-                line_to_page_map.extend([i + 1] * len(lines))
-            
-            
-            markdown_content = '\n'.join(markdown_lines)            
+            markdown_content, line_to_page_map = self.join_markdown_pages(markdown_pages)
 
             # Step 2: Extract title
             if verbose:
                 print("Extracting title...")
-            title = self.determine_title(pdf_path, markdown_content)
+            with metrics.stage("title"):
+                title = self.determine_title(pdf_path, markdown_content)
 
             # Step 3: Extract headers
             if verbose:
                 print("Extracting headers...")
             
-            headers=self.group_markdown_headers(markdown_content)
-            headers.pop(1, None)  # Remove H1 headers if present
-            level_mapping=[j for j in enumerate(sorted(headers.keys()))] # only 3 headers are present so merge anything above 3 to 3
-            level_mapping = [(level+1, count) for level, count in level_mapping ]
-            level_mapping = [(1, count) if level == 1 else (2, count) if level == 2 else (3, count) for level, count in level_mapping]
-            level_mapping={count: level for level, count in level_mapping}
-           
-            
-        
-             
-            markdown_headers = self.parse_markdown_headers(markdown_content,title,level_mapping)
-            semantic_headers = []
-     
-            semantic_headers = self.detect_semantic_headers(markdown_content,title)
-
-            # Step 4: Merge and process headers
-            all_headers = self.merge_and_sort_headers(markdown_headers, semantic_headers)
-            # Step 5: Estimate page numbers
-            headers_with_pages = self.estimate_page_numbers(all_headers, line_to_page_map)
+            with metrics.stage("headers") as st:
+                headers_with_pages = self.find_header_candidates(markdown_content, title, line_to_page_map)
+                st.count(lines=len(line_to_page_map), candidates=len(headers_with_pages))
             
             
-            feats_df = generate_feature_rich_dataset(pdf_path)
-            # Ensure text fields align exactly (or use a more robust fuzzy match if needed)
-            # e.g. strip whitespace:
-            feats_df["full_text_trim"] = (feats_df["full_text"].str.strip())
+            with metrics.stage("feature_dataset") as st:
+                feats = generate_feature_table(pdf_path)
+                # Ensure text fields align exactly (or use a more robust fuzzy match if needed)
+                # e.g. strip whitespace, once per page:
+                trimmed_by_page = {}
+                st.count(pages=len(markdown_pages), rows=len(feats))
 
             # Step 6: Format output
             
             outline = []
-            for header in headers_with_pages:
-                text = header["text"].strip()
-                pg   = header["page"]  # 1-based
-
-                # Filter rows by page number
-                page_feats = feats_df[feats_df["page_num"] == pg]
-
-                # Use difflib to find closest match on full_text_trim
-                candidates = page_feats["full_text_trim"].dropna().tolist()
-                closest_matches = get_close_matches(text, candidates, n=1, cutoff=0.6)
-
-                if closest_matches:
-                    best_match_text = closest_matches[0]
-                    match = page_feats[page_feats["full_text_trim"] == best_match_text]
-                    feat_row = match.iloc[0].to_dict()
-                    feat_row.pop("full_text_trim", None)
-                else:
-                    continue  # Skip if no close match found 
-
-                outline.append({
-                    "text": text,
-                    "page": pg - 1,
-                    "features": feat_row
-                })
+            with metrics.stage("header_matching") as st:
+                for header in headers_with_pages:
+                    text = header["text"].strip()
+                    pg   = header["page"]  # 1-based
+
+                    # Rows of this page (zero-copy slice through the page index)
+                    page_feats = feats.page(pg)
+                    if pg not in trimmed_by_page:
+                        trimmed_by_page[pg] = [t.strip() for t in page_feats.column("full_text")] if len(page_feats) else []
+                    candidates = trimmed_by_page[pg]
+
+                    # Use difflib to find closest match on the trimmed text
+                    closest_matches = get_close_matches(text, candidates, n=1, cutoff=0.6)
+
+                    if closest_matches:
+                        feat_row = page_feats.row(candidates.index(closest_matches[0]))
+                    else:
+                        continue  # Skip if no close match found 
+
+                    outline.append({
+                        "text": text,
+                        "page": pg - 1,
+                        "features": feat_row
+                    })
+                st.count(headers=len(headers_with_pages), matched=len(outline))
 
             return {
                 "title": title,
@@ -449,17 +557,22 @@ def batch_process_pdfs(pdf_directory: str, output_dir:str) -> Dict:
         with open(f"{output_dir}/{pdf_file.name.replace('.pdf', '.json')}", 'w', encoding='utf-8') as f:
             json.dump(result, f, indent=2, ensure_ascii=False)
 
-def process_single_pdf(pdf_path: str) -> Dict:
+def process_single_pdf(pdf_path: str, mode: Optional[str] = None) -> Dict:
     """
     Process a single PDF file and save the result to a JSON file
 
     Args:
         pdf_path (str): Path to the PDF file
-        output_dir (str): Directory to save the output JSON file
+        mode (str): Header candidate mode, "markdown" or "spans" (default HEADER_CANDIDATE_MODE)
 
     Returns:
         Dict: Result of processing the PDF
     """
+    mode = mode or HEADER_CANDIDATE_MODE
+    cached = extraction_cache.get_outline(pdf_path, mode)
+    if cached is not None:
+        return cached
     extractor = PDFTitleOutlineExtractor()
-    result = extractor.process_pdf(pdf_path, verbose=False)
+    result = extractor.process_pdf(pdf_path, verbose=False, mode=mode)
+    extraction_cache.put_outline(pdf_path, result, mode)
     return result
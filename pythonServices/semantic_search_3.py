@@ -1,99 +1,156 @@
 import json
+import os
 import numpy as np
 from datetime import datetime
-from sentence_transformers import SentenceTransformer
-import chromadb
+import embedding_scheduler
+import metrics
+import vector_store
+from model_registry import get_embedding_model
 
-# Create local ChromaDB client & collection for semantic search
-chroma_client = chromadb.PersistentClient(path="./chroma_storage")
-collection = chroma_client.get_or_create_collection(
-    name="pdf_chunks",
-    metadata={"hnsw:space": "cosine"}
-)
+# Two-stage search: rank sections first, then only the chunks of the best SEARCH_TOP_SECTIONS
+SECTION_SEARCH = os.getenv("SECTION_SEARCH", "1") == "1"
+SEARCH_TOP_SECTIONS = int(os.getenv("SEARCH_TOP_SECTIONS", "8"))
 
-# SentenceTransformer configuration
-SENTENCE_MODEL_DIR = "saved_models/sentence_transformer"
 
-
-try:
-    sentence_model = SentenceTransformer(SENTENCE_MODEL_DIR)
-    print(f"✓ SentenceTransformer loaded from: {SENTENCE_MODEL_DIR}")
-except Exception as e:
-    print(f"❌ Error loading SentenceTransformer from local path: {e}")
-    sentence_model = None
+def _get_sentence_model():
+    """Shared SentenceTransformer, or None if it could not be loaded"""
+    try:
+        return get_embedding_model()
+    except Exception as e:
+        print(f"❌ Error loading SentenceTransformer: {e}")
+        return None
 
 
 def get_sentence_transformer_embedding(text):
     """Get embedding from SentenceTransformer"""
+    sentence_model = _get_sentence_model()
     if not sentence_model:
         print("SentenceTransformer model not loaded")
         return None
     
     try:
         # Get embedding using SentenceTransformer
-        embedding = sentence_model.encode(text, convert_to_tensor=False)
+        embedding = embedding_scheduler.embed([text], priority=embedding_scheduler.SEARCH)[0]
         return embedding.tolist()
     except Exception as e:
         print(f"Error getting embedding: {e}")
         return None
 
-def perform_semantic_search(query, top_k=5, folder_id=None, user_id=None):
+def _locations(meta):
+    """Distinct (document, page, bbox) places of a stored chunk"""
+    places = {}
+    for loc in json.loads(meta.get("locations") or "[]"):
+        places.setdefault((loc["filename"], loc["page"], loc["bbox"]), {
+            "document": loc["filename"],
+            "page_number": loc["page"],
+            "bbox": eval(loc["bbox"]),
+            "page_height": loc.get("page_height")
+        })
+    return list(places.values())
+
+
+def _ranked(hits):
+    """Vector store hits in the result format of the search endpoints"""
+    ranked_results = []
+
+    for i, hit in enumerate(hits):
+        meta = hit["metadata"]
+        ranked_results.append({
+            "rank": i + 1,
+            "document": meta.get("filename", "unknown"),
+            "section": meta.get("section", "unknown"),
+            "section_id": meta.get("section_id"),
+            "page_number": meta.get("page", None),
+            "bbox": eval(meta.get("bbox", None)),
+            "text": hit["document"],
+            "score": 1 - hit["distance"],  # cosine distance → similarity score
+            "page_height": meta.get("page_height", None),
+            # Every place this text occurs (dedup.py folds repeated chunks into one)
+            "locations": _locations(meta)
+        })
+
+    return ranked_results
+
+
+def search_sections_and_chunks(query, top_k=5, folder_id=None, user_id=None):
     """
-    Perform semantic search over stored chunks in ChromaDB for a specific user and folder.
-    Returns top_k ranked results with metadata.
+    Two-stage semantic search for a specific user and folder: the best
+    SEARCH_TOP_SECTIONS sections first, then only the chunks of those sections.
+    Falls back to searching every chunk of the folder when that finds fewer than
+    top_k chunks (e.g. documents indexed before sections were).
+    Returns (ranked sections, top_k ranked chunks).
     """
+    sentence_model = _get_sentence_model()
     if not sentence_model:
         print("❌ SentenceTransformer model not loaded, cannot search.")
-        return []
+        return [], []
 
     
     expanded_query = query
 
     # 2. Embed the expanded query
     try:
-        query_embedding = sentence_model.encode(expanded_query, convert_to_numpy=True).tolist()
+        query_embedding = embedding_scheduler.embed([expanded_query], priority=embedding_scheduler.SEARCH)[0].tolist()
     except Exception as e:
         print(f"❌ Error generating embedding for query: {e}")
-        return []
-
-    # 3. Apply ChromaDB search with filtering
+        return [], []
+
+    # 3. Find the closest sections
+    section_hits = []
+    if SECTION_SEARCH:
+        try:
+            with metrics.stage("section_search") as st:
+                section_hits = vector_store.get_store(vector_store.SECTIONS).query(
+                    query_embedding,
+                    SEARCH_TOP_SECTIONS,
+                    folder_id=folder_id,
+                    user_id=user_id
+                )
+                st.count(sections=len(section_hits))
+        except Exception as e:
+            print(f"⚠️ Section search failed, searching all chunks: {e}")
+
+    # 4. Rank the chunks of those sections (or of the whole folder)
     try:
-        where_filter = {
-            "$and": [
-                {"folder_id": folder_id},
-                {"user_id": user_id}
-            ]
-        }
-
-        results = collection.query(
-            query_embeddings=[query_embedding],
-            n_results=top_k,
-            where=where_filter if where_filter else None
-        )
+        with metrics.stage("chunk_search") as st:
+            hits = []
+            if section_hits:
+                hits = vector_store.get_store(vector_store.CHUNKS).query(
+                    query_embedding,
+                    top_k,
+                    folder_id=folder_id,
+                    user_id=user_id,
+                    section_ids=[h["id"] for h in section_hits]
+                )
+            if len(hits) < top_k:
+                hits = vector_store.get_store(vector_store.CHUNKS).query(
+                    query_embedding,
+                    top_k,
+                    folder_id=folder_id,
+                    user_id=user_id
+                )
+            st.count(chunks=len(hits))
     except Exception as e:
-        print(f"❌ Error querying ChromaDB: {e}")
-        return []
+        print(f"❌ Error querying the vector store: {e}")
+        return _ranked(section_hits), []
 
-    # 4. Transform results into a consistent format
-    ranked_results = []
+    return _ranked(section_hits), _ranked(hits)
 
-    for i, (doc, meta, dist) in enumerate(zip(results["documents"][0], results["metadatas"][0], results["distances"][0])):
-        ranked_results.append({
-            "rank": i + 1,
-            "document": meta.get("filename", "unknown"),
-            "section": meta.get("section", "unknown"),
-            "page_number": meta.get("page", None),
-            "bbox": eval(meta.get("bbox", None)),
-            "text": doc,
-            "score": 1 - dist,  # cosine distance → similarity score
-            "page_height": meta.get("page_height", None)
-        })
 
+def perform_semantic_search(query, top_k=5, folder_id=None, user_id=None):
+    """
+    Perform semantic search over stored chunks in the vector store for a specific user and folder.
+    Returns top_k ranked results with metadata.
+    """
+    _, ranked_results = search_sections_and_chunks(query, top_k=top_k, folder_id=folder_id, user_id=user_id)
     return ranked_results
 
 
-def format_search_results(query, results, top_k):
-    """Format search results in the exact specified format"""
+def format_search_results(query, results, top_k, sections=None):
+    """
+    Format search results in the exact specified format. extracted_sections lists the
+    matched sections when a section search ran, otherwise the sections of the top chunks.
+    """
     
     # Use the exact format specified - always output in chunking format
     output = {
@@ -106,7 +163,7 @@ def format_search_results(query, results, top_k):
                 'page_number': result['page_number'],
                 'page_height': result['page_height'],
             }
-            for result in results[:top_k]  # Top 5 results for extracted_sections
+            for result in (sections or results)[:top_k]  # Top k sections for extracted_sections
         ],
         'subsection_analysis': [
             {
@@ -121,5 +178,3 @@ def format_search_results(query, results, top_k):
     }
     
     return output
-
-
@@ -1,12 +1,21 @@
 from fastapi import FastAPI
 from pydantic import BaseModel
-from process_pdfs import get_single_pdf_prediction
-from chunking_3 import create_chunks_with_sections
-from semantic_search_3 import format_search_results,perform_semantic_search
-from llm_features import get_summary_faq,stream_insights,make_podcast,stream_guide
-from fastapi.responses import StreamingResponse,FileResponse
-from generate_audio import generate_podcast
+from typing import List, Optional
+from fastapi.responses import StreamingResponse,Response,JSONResponse,PlainTextResponse
+from starlette.concurrency import run_in_threadpool
+import contextvars
+import json
+import os
+import sys
+import tempfile
+import executors
+import metrics
+import model_registry
+import singleflight
 
+# The pipeline modules (torch, chromadb, xgboost, pymupdf4llm, google-genai ...) are
+# imported inside the handlers and preloaded by the background warm-up, so importing
+# this module stays fast.
 
 
 app = FastAPI()
@@ -26,15 +35,27 @@ class PDFRequest(BaseModel):
     folder_id: str
     user_id: str
 
+class IngestRequest(BaseModel):
+    file_paths: List[str]
+    folder_id: str
+    user_id: str
+    summaries: bool = True
+
 class Relevance(BaseModel):
     folder_id:str
     user_id:str
     query:str
 
+class SummaryDocument(BaseModel):
+    name: str
+    summary: str
+
 class InsightRequest(BaseModel):
     selected_text: str
     currPDFName: str
     summaries: str
+    # The same summaries per PDF; parsed from `summaries` when missing
+    documents: Optional[List[SummaryDocument]] = None
 
 class PodcastRequest(BaseModel):
     summaries: str
@@ -42,39 +63,160 @@ class PodcastRequest(BaseModel):
 class GuideRequest(BaseModel):
     summaries: str
 
-@app.post("/predict")
-def predict(request: PDFRequest):
-    model_path = "./xgb_model.pkl"
-    result = get_single_pdf_prediction(model_path=model_path, file_path=request.file_path)
-    
-    # Create chunks with sections
-    chunks, sections = create_chunks_with_sections(
-        pdf_path=request.file_path,
-        headers=result.get("outline", []) if type(result) is dict else [],
-        folder_id=request.folder_id,
-        user_id=request.user_id
+@app.on_event("startup")
+def warm_up_models():
+    model_registry.start_background_warm_up()
+
+@app.on_event("startup")
+def start_index_reconciler():
+    import index_gc
+    index_gc.start_reconciler()
+
+@app.on_event("shutdown")
+def stop_executors():
+    executors.shutdown_all()
+    if "embedding_scheduler" in sys.modules:
+        sys.modules["embedding_scheduler"].scheduler.shutdown()
+    if "doc_pool" in sys.modules:
+        sys.modules["doc_pool"].clear()
+
+@app.exception_handler(executors.Overloaded)
+async def overloaded(request, exc: executors.Overloaded):
+    return JSONResponse(
+        {"error": str(exc)},
+        status_code=429,
+        headers={"Retry-After": str(exc.retry_after)},
     )
-    summary_faq = get_summary_faq(request.file_path)
-    return {"result":result,"summary":summary_faq["summary"],"faq":summary_faq["FAQ"]}
+
+@app.get("/healthz")
+def healthz():
+    return {"status": "alive"}
+
+@app.get("/readyz")
+def readyz():
+    report = model_registry.readiness()
+    return JSONResponse(report, status_code=200 if report["ready"] else 503)
+
+@app.get("/executors")
+def executor_stats():
+    stats = {"extraction": executors.extraction.stats(), "embedding": executors.embedding.stats(),
+             "llm": executors.llm.stats()}
+    # Imported with the pipeline; no scheduler stats before the first embedding
+    if "embedding_scheduler" in sys.modules:
+        stats["embedding_scheduler"] = sys.modules["embedding_scheduler"].scheduler.stats()
+    if "doc_pool" in sys.modules:
+        stats["doc_pool"] = sys.modules["doc_pool"].stats()
+    if "outbound" in sys.modules:
+        stats["outbound"] = sys.modules["outbound"].stats()
+    return stats
+
+@app.get("/metrics")
+def prometheus_metrics():
+    for pool in (executors.extraction, executors.embedding, executors.llm):
+        metrics.set_gauge("executor_inflight", pool.inflight, pool=pool.name)
+    return PlainTextResponse(metrics.render_prometheus(), media_type="text/plain; version=0.0.4")
+
+@app.post("/predict")
+async def predict(request: PDFRequest, trace: bool = False):
+    from process_pdfs import get_single_pdf_prediction
+    from chunking_3 import create_chunks_with_sections
+    from llm_features import get_summary_faq
+
+    async def run_predict():
+        with metrics.collect() as stages:
+            model_path = "./xgb_model.pkl"
+            # Markdown conversion, feature generation and classification run in the extraction processes
+            result = await executors.extraction.run(get_single_pdf_prediction, model_path=model_path, file_path=request.file_path)
+
+            # Create chunks with sections
+            chunks, sections = await executors.embedding.run(
+                create_chunks_with_sections,
+                pdf_path=request.file_path,
+                headers=result.get("outline", []) if type(result) is dict else [],
+                folder_id=request.folder_id,
+                user_id=request.user_id
+            )
+            summary_faq = await executors.llm.run(get_summary_faq, request.file_path)
+        return {"result":result,"summary":summary_faq["summary"],"faq":summary_faq["FAQ"]}, stages
+
+    if trace:
+        response, stages = await run_predict()
+        return {**response, "trace": stages}
+    # A second /predict for the same upload while the first runs shares its result
+    response, _ = await singleflight.run(singleflight.key("predict", request.model_dump()), run_predict)
+    return response
+
+@app.post("/ingest")
+async def ingest(request: IngestRequest):
+    """
+    Ingest many PDFs of one folder. Streams one JSON line per document
+    ({"file_path", "status", "result", "chunks", "summary", "faq"} or
+    {"file_path", "status": "error", "error"}) as soon as it is indexed.
+    """
+    from ingest import ingest_documents
+
+    async def ndjson():
+        async for line in ingest_documents(request.file_paths, request.folder_id, request.user_id, request.summaries):
+            yield json.dumps(line) + "\n"
+
+    return StreamingResponse(ndjson(), media_type="application/x-ndjson")
 
 @app.post("/relevance")
-def similar(request: Relevance):
+async def similar(request: Relevance, trace: bool = False):
+    from semantic_search_3 import format_search_results,search_sections_and_chunks
+
     query = request.query
     user_id = request.user_id
     folder_id = request.folder_id
    
 
-    # Perform semantic search
-    results = perform_semantic_search(query, user_id=user_id, folder_id=folder_id, top_k=10)
+    with metrics.collect() as stages:
+        # Perform semantic search; identical searches running at the same time share one
+        search = lambda: executors.embedding.run(search_sections_and_chunks, query, user_id=user_id, folder_id=folder_id, top_k=10)
+        if trace:
+            sections, results = await search()
+        else:
+            sections, results = await singleflight.run(singleflight.key("relevance", request.model_dump()), search)
 
     # Format search results
-    formatted_results = format_search_results(query, results, top_k=10)
+    formatted_results = format_search_results(query, results, top_k=10, sections=sections)
+
+    response = {"results": formatted_results}
+    if trace:
+        response["trace"] = stages
+    return response
+
+@app.delete("/index/{user_id}/{folder_id}")
+async def delete_folder_index(user_id: str, folder_id: str):
+    """Removes a deleted folder's chunks and sections from the index."""
+    import index_gc
+    return await executors.embedding.run(index_gc.delete_folder, folder_id, user_id)
 
-    return {"results": formatted_results}
+@app.delete("/index/{user_id}/{folder_id}/{filename}")
+async def delete_pdf_index(user_id: str, folder_id: str, filename: str):
+    """Removes a deleted PDF's chunks and sections from the index."""
+    import index_gc
+    return await executors.embedding.run(index_gc.delete_files, folder_id, user_id, [filename])
+
+@app.post("/index/reconcile")
+async def reconcile_index(dry_run: bool = False):
+    """Deletes what is indexed but no longer in MongoDB (see index_gc.py)."""
+    import index_gc
+    return await executors.embedding.run(index_gc.reconcile, dry_run=dry_run)
+
+@app.get("/index/stats")
+async def index_stats():
+    import index_gc
+    return await executors.embedding.run(index_gc.stats)
 
 @app.post("/insights")
 async def insights(request: InsightRequest):
-    prev_summaries = request.summaries
+    from llm_features import stream_insights
+    from context_assembly import assemble
+
+    documents = [(d.name, d.summary) for d in request.documents] if request.documents else None
+    # Only the summaries related to the selection, within the context token budget
+    prev_summaries = await executors.embedding.run(assemble, request.summaries, request.selected_text, documents)
     selected_text = request.selected_text
     currPDFName = request.currPDFName
     async def event_generator():
@@ -84,17 +226,35 @@ async def insights(request: InsightRequest):
     return StreamingResponse(event_generator(), media_type="text/event-stream")
 
 @app.post("/podcast")
-def podcast(request: PodcastRequest):
-    conversation=make_podcast(request.summaries)["script"]
-    generate_podcast(conversation, "podcast.mp3")
-    return FileResponse("podcast.mp3", media_type="audio/mpeg")
+async def podcast(request: PodcastRequest):
+    from llm_features import make_podcast
+    from generate_audio import generate_podcast
+
+    key = singleflight.key("podcast", request.model_dump())
+
+    def make_audio():
+        # One file per call: other workers may be making the same podcast
+        fd, output_file = tempfile.mkstemp(prefix="podcast-", suffix=".mp3")
+        os.close(fd)
+        try:
+            conversation=make_podcast(request.summaries)["script"]
+            generate_podcast(conversation, output_file)
+            with open(output_file, "rb") as f:
+                return f.read()
+        finally:
+            os.remove(output_file)
+
+    audio = await singleflight.run(key, lambda: run_in_threadpool(contextvars.copy_context().run, make_audio))
+    return Response(audio, media_type="audio/mpeg")
 
 @app.post("/guide")
 async def guide(request: GuideRequest):
+    from llm_features import stream_guide
+
     summaries = request.summaries
     async def event_generator():
-        async for chunk in stream_guide(summaries):
-            
+        # Viewers asking for the same guide at once share one model stream
+        async for chunk in singleflight.stream(singleflight.key("guide", request.model_dump()), lambda: stream_guide(summaries)):
             yield chunk.encode('utf-8')
 
     return StreamingResponse(event_generator(), media_type="text/event-stream")
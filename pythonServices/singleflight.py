@@ -0,0 +1,137 @@
+"""
+Single-flight coalescing of identical in-flight requests.
+
+When several viewers of a folder ask for the same guide, podcast or search at
+once (or the app posts /predict twice for one upload), every request used to
+run the model or remote call again. Requests are now keyed by a hash of their
+endpoint and normalized payload; while one is running, identical requests wait
+for it and get its result instead of starting their own:
+
+    result = await singleflight.run(key, lambda: executors.embedding.run(fn, ...))
+
+    async for chunk in singleflight.stream(key, lambda: stream_guide(summaries)):
+        ...
+
+A stream is produced once and fanned out: a request joining late first gets
+the chunks sent so far, then the rest as they arrive. Nothing is cached after
+the call finishes, and an error reaches every waiter. The work runs in its own
+task, so a client that disconnects does not cancel it for the others; a stream
+is cancelled when its last subscriber leaves. Coalescing is per process (per
+gunicorn worker).
+"""
+import asyncio
+import hashlib
+import json
+import os
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, List
+
+import metrics
+
+SINGLEFLIGHT = os.getenv("SINGLEFLIGHT", "1") == "1"
+
+metrics.describe("singleflight_requests_total", "counter", "Requests that ran the work (leader) or joined a running one (follower)")
+
+
+def _normalize(value):
+    if isinstance(value, str):
+        return value.strip()
+    if isinstance(value, dict):
+        return {str(k): _normalize(v) for k, v in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [_normalize(v) for v in value]
+    return value
+
+
+def key(endpoint: str, payload: Any) -> str:
+    """Coalescing key of a request: its endpoint and payload, keys sorted and strings stripped."""
+    body = json.dumps(_normalize(payload), sort_keys=True, separators=(",", ":"), default=str)
+    return endpoint + ":" + hashlib.sha256(body.encode("utf-8")).hexdigest()
+
+
+_calls: Dict[str, asyncio.Future] = {}
+_streams: Dict[str, "_Stream"] = {}
+
+
+def _endpoint(k: str) -> str:
+    return k.split(":", 1)[0]
+
+
+async def run(k: str, work: Callable[[], Awaitable[Any]]) -> Any:
+    """The result of work(), shared with every identical call made while it runs."""
+    if not SINGLEFLIGHT:
+        return await work()
+    task = _calls.get(k)
+    if task is None:
+        metrics.inc("singleflight_requests_total", endpoint=_endpoint(k), role="leader")
+        task = _calls[k] = asyncio.ensure_future(work())
+        task.add_done_callback(lambda t: _calls.pop(k, None) if _calls.get(k) is t else None)
+    else:
+        metrics.inc("singleflight_requests_total", endpoint=_endpoint(k), role="follower")
+    return await asyncio.shield(task)
+
+
+class _Stream:
+    """One running stream: chunks so far, whether it ended, and its subscribers."""
+
+    def __init__(self, k: str, source: AsyncIterator):
+        self.key = k
+        self.chunks: List[Any] = []
+        self.done = False
+        self.error = None
+        self.subscribers = 0
+        self.changed = asyncio.Event()
+        self.task = asyncio.ensure_future(self._produce(source))
+
+    async def _produce(self, source: AsyncIterator):
+        try:
+            async for chunk in source:
+                self.chunks.append(chunk)
+                self._notify()
+        except asyncio.CancelledError:
+            self.error = asyncio.CancelledError()
+            raise
+        except Exception as e:
+            self.error = e
+        finally:
+            self.done = True
+            if _streams.get(self.key) is self:
+                del _streams[self.key]
+            self._notify()
+
+    def _notify(self):
+        self.changed.set()
+        self.changed = asyncio.Event()
+
+    async def follow(self) -> AsyncIterator:
+        self.subscribers += 1
+        sent = 0
+        try:
+            while True:
+                while sent < len(self.chunks):
+                    yield self.chunks[sent]
+                    sent += 1
+                if self.done:
+                    if self.error is not None:
+                        raise self.error
+                    return
+                await self.changed.wait()
+        finally:
+            self.subscribers -= 1
+            if self.subscribers == 0 and not self.done:
+                self.task.cancel()
+
+
+async def stream(k: str, source: Callable[[], AsyncIterator]) -> AsyncIterator:
+    """The chunks of source(), produced once for every identical stream requested while it runs."""
+    if not SINGLEFLIGHT:
+        async for chunk in source():
+            yield chunk
+        return
+    current = _streams.get(k)
+    if current is None:
+        metrics.inc("singleflight_requests_total", endpoint=_endpoint(k), role="leader")
+        current = _streams[k] = _Stream(k, source())
+    else:
+        metrics.inc("singleflight_requests_total", endpoint=_endpoint(k), role="follower")
+    async for chunk in current.follow():
+        yield chunk
@@ -0,0 +1,104 @@
+"""
+Per-page span index for resolving headers to their bounding boxes.
+
+A PageSpanIndex is built once per page from page.get_text("dict"): the
+non-empty spans in reading order, the lowercased word tokens of all spans as
+one stream (with the span each token comes from) and an inverted map from
+token to its positions in the stream.
+
+A header is resolved to the contiguous run of spans whose tokens are exactly
+the header's tokens. Candidate starts come from the positions of the header's
+rarest token, so a lookup costs a few list comparisons instead of a scan of
+every span on the page, and only the spans of the run are merged into the bbox
+(not every span that shares a word with the header).
+
+    index = PageSpanIndex(doc[page_num])
+    run = index.find("2.1 Architecture")      # (first span, last span) or None
+    bbox = index.bbox(*run)
+"""
+import re
+from typing import Dict, List, Optional, Tuple
+
+_TOKEN = re.compile(r"\w+")
+
+Bbox = Tuple[float, float, float, float]
+
+
+def tokenize(text: str) -> List[str]:
+    return _TOKEN.findall(text.lower())
+
+
+class PageSpanIndex:
+    def __init__(self, page):
+        self.height = page.rect.height
+        self.spans: List[Tuple[str, Bbox]] = []
+        self.tokens: List[str] = []
+        self.owner: List[int] = []       # span of each token
+        self.first_token: List[int] = []  # first token of each span
+        self.positions: Dict[str, List[int]] = {}
+
+        for block in page.get_text("dict")["blocks"]:
+            for line in block.get("lines", ()):
+                for span in line["spans"]:
+                    text = span["text"].strip()
+                    if not text:
+                        continue
+                    si = len(self.spans)
+                    self.spans.append((text, tuple(span["bbox"])))
+                    self.first_token.append(len(self.tokens))
+                    for token in tokenize(text):
+                        self.positions.setdefault(token, []).append(len(self.tokens))
+                        self.tokens.append(token)
+                        self.owner.append(si)
+
+    def _is_exact(self, start: int, end: int) -> bool:
+        """True if tokens start..end-1 are whole spans (the header on its own, not inside body text)."""
+        return (self.first_token[self.owner[start]] == start
+                and (end == len(self.tokens) or self.owner[end] != self.owner[end - 1]))
+
+    def find(self, header_text: str, after: int = 0) -> Optional[Tuple[int, int]]:
+        """
+        (first span, last span) of the run matching header_text, or None.
+        Runs that are whole spans win over matches inside longer spans; then the
+        first run starting at or after span `after`, so repeated titles on a page
+        resolve to successive occurrences.
+        """
+        wanted = tokenize(header_text)
+        if not wanted:
+            return None
+        n = len(wanted)
+        rarest = min(range(n), key=lambda k: len(self.positions.get(wanted[k], ())))
+
+        best = None
+        for pos in self.positions.get(wanted[rarest], ()):
+            start = pos - rarest
+            if start < 0 or self.tokens[start:start + n] != wanted:
+                continue
+            first, last = self.owner[start], self.owner[start + n - 1]
+            key = (not self._is_exact(start, start + n), first < after, first)
+            if best is None or key < best[0]:
+                best = (key, (first, last))
+        if best:
+            return best[1]
+
+        # No full match (e.g. header text cleaned up by the extractor): the span
+        # sharing the most of the header's tokens, if that is at least half of them
+        counts: Dict[int, int] = {}
+        for token in set(wanted):
+            for span in {self.owner[pos] for pos in self.positions.get(token, ())}:
+                counts[span] = counts.get(span, 0) + 1
+        if not counts:
+            return None
+        span = min(counts, key=lambda s: (-counts[s], s < after, s))
+        if counts[span] * 2 < len(set(wanted)):
+            return None
+        return span, span
+
+    def bbox(self, first: int, last: int) -> Bbox:
+        boxes = [b for _, b in self.spans[first:last + 1]]
+        return (
+            min(b[0] for b in boxes),
+            min(b[1] for b in boxes),
+            max(b[2] for b in boxes),
+            max(b[3] for b in boxes),
+        )
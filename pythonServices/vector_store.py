@@ -0,0 +1,719 @@
+"""
+Vector store used for chunk indexing and semantic search.
+
+VECTOR_BACKEND selects the implementation:
+
+  chroma  (default) Chroma collections (chroma_store), HNSW index with metadata
+          filtering on folder_id / user_id
+  numpy   one directory per collection and tenant (user, folder) under VECTOR_STORE_PATH
+          holding a float32 matrix of normalized embeddings (vectors.f32, memory-mapped for
+          search) and an append-only side table of ids, documents and metadata
+          (rows.jsonl). Queries are exact dot products over the tenant's matrix;
+          tenants above VECTOR_IVF_MIN_ROWS get an IVF index (k-means lists, probed
+          VECTOR_IVF_NPROBE at a time) built on first query.
+
+A folder holds a few thousand chunks, so a brute-force scan of its own matrix
+needs no filtering and beats an HNSW walk over every tenant with a metadata
+filter. `python benchmarks/bench_vector_store.py` measures both.
+
+Both backends take the same calls, per collection (CHUNKS or SECTIONS):
+
+    store = get_store(CHUNKS)
+    store.upsert(ids, embeddings, documents, metadatas)   # replaces existing ids
+    store.query(embedding, top_k, folder_id=..., user_id=..., section_ids=None)
+    store.delete(ids, folder_id=..., user_id=...)
+    store.entries(folder_id, user_id)                      # {id: metadata}, for garbage collection
+    store.compact()                                        # offline: drop deleted rows from disk
+"""
+import fcntl
+import json
+import math
+import os
+import re
+import shutil
+import threading
+from contextlib import contextmanager
+from typing import Dict, List, Optional, Sequence
+
+import numpy as np
+
+VECTOR_BACKEND = os.getenv("VECTOR_BACKEND", "chroma")
+VECTOR_STORE_PATH = os.getenv("VECTOR_STORE_PATH", "./vector_storage")
+# Tenants with at least this many rows are searched through an IVF index instead of a full scan
+VECTOR_IVF_MIN_ROWS = int(os.getenv("VECTOR_IVF_MIN_ROWS", "50000"))
+VECTOR_IVF_NPROBE = int(os.getenv("VECTOR_IVF_NPROBE", "8"))
+# Chroma rejects larger add() calls
+CHROMA_MAX_BATCH = 5000
+
+CHUNKS = "chunks"
+SECTIONS = "sections"
+CHROMA_COLLECTIONS = {CHUNKS: "pdf_chunks", SECTIONS: "pdf_sections"}
+
+# Storage of the numpy backend's vectors: float32, float16, or int8 with a float32 scale per vector
+VECTOR_DTYPE = os.getenv("VECTOR_DTYPE", "float32")
+# Keep a float32 copy on disk (read only for the top candidates) and re-score with it
+VECTOR_RESCORE = os.getenv("VECTOR_RESCORE", "1") == "1"
+# Candidates re-scored per requested result
+VECTOR_RESCORE_FACTOR = int(os.getenv("VECTOR_RESCORE_FACTOR", "4"))
+SCORE_BLOCK_ROWS = 256
+
+STORAGE_DTYPES = {"float32": np.float32, "float16": np.float16, "int8": np.int8}
+VECTORS_FILE = "vectors.f32"
+MATRIX_FILES = {"float32": VECTORS_FILE, "float16": "vectors.f16", "int8": "vectors.i8"}
+SCALES_FILE = "scales.f32"
+ROWS_FILE = "rows.jsonl"
+LOCK_FILE = "lock"
+
+
+class VectorStore:
+    """Interface shared by the backends. Distances are cosine distances (1 - similarity)."""
+
+    def upsert(self, ids: List[str], embeddings: np.ndarray, documents: List[str], metadatas: List[Dict]) -> None:
+        raise NotImplementedError
+
+    def query(self, embedding: Sequence[float], top_k: int, folder_id: str = None, user_id: str = None,
+              section_ids: Optional[List[str]] = None) -> List[Dict]:
+        """
+        Nearest entries of one folder as [{"id", "document", "metadata", "distance"}], closest first.
+        With section_ids, only entries whose metadata section_id is one of them are ranked.
+        """
+        raise NotImplementedError
+
+    def delete(self, ids: List[str], folder_id: str = None, user_id: str = None) -> None:
+        raise NotImplementedError
+
+    def get_metadata(self, ids: List[str], folder_id: str = None, user_id: str = None) -> Dict[str, Dict]:
+        """{id: metadata} of the given ids that are stored."""
+        raise NotImplementedError
+
+    def update_metadata(self, ids: List[str], metadatas: List[Dict], folder_id: str = None, user_id: str = None) -> None:
+        """Replace the metadata of stored entries, keeping their vectors."""
+        raise NotImplementedError
+
+    def entries(self, folder_id: str, user_id: str, filename: str = None) -> Dict[str, Dict]:
+        """{id: metadata} of every entry of one folder, or of one of its files."""
+        raise NotImplementedError
+
+    def tenants(self) -> List[tuple]:
+        """(folder_id, user_id) of every folder with entries."""
+        raise NotImplementedError
+
+    def stats(self) -> Dict:
+        """Entry count and bytes on disk."""
+        raise NotImplementedError
+
+    def compact(self) -> Dict:
+        """Rewrite the storage without deleted entries (run while the service is stopped). Returns stats before and after."""
+        raise NotImplementedError
+
+
+class ChromaVectorStore(VectorStore):
+    def __init__(self, collection_name: str = None):
+        import chroma_store
+        self.collection_name = collection_name or chroma_store.COLLECTION_NAME
+
+    def _get_collection(self):
+        from chroma_store import get_collection
+        return get_collection(self.collection_name)
+
+    def upsert(self, ids, embeddings, documents, metadatas):
+        collection = self._get_collection()
+        existing = collection.get(ids=ids, include=[])
+        if existing["ids"]:
+            collection.delete(ids=existing["ids"])
+        embeddings = np.asarray(embeddings).tolist()
+        for start in range(0, len(ids), CHROMA_MAX_BATCH):
+            end = start + CHROMA_MAX_BATCH
+            collection.add(
+                ids=ids[start:end],
+                embeddings=embeddings[start:end],
+                documents=documents[start:end],
+                metadatas=metadatas[start:end]
+            )
+
+    def query(self, embedding, top_k, folder_id=None, user_id=None, section_ids=None):
+        where = [{"folder_id": folder_id}, {"user_id": user_id}]
+        if section_ids is not None:
+            where.append({"section_id": {"$in": list(section_ids)}})
+        results = self._get_collection().query(
+            query_embeddings=[np.asarray(embedding).tolist()],
+            n_results=top_k,
+            where={"$and": where}
+        )
+        return [
+            {"id": i, "document": doc, "metadata": meta, "distance": dist}
+            for i, doc, meta, dist in zip(results["ids"][0], results["documents"][0],
+                                          results["metadatas"][0], results["distances"][0])
+        ]
+
+    def delete(self, ids, folder_id=None, user_id=None):
+        if ids:
+            self._get_collection().delete(ids=ids)
+
+    def get_metadata(self, ids, folder_id=None, user_id=None):
+        if not ids:
+            return {}
+        results = self._get_collection().get(ids=ids, include=["metadatas"])
+        return dict(zip(results["ids"], results["metadatas"]))
+
+    def update_metadata(self, ids, metadatas, folder_id=None, user_id=None):
+        collection = self._get_collection()
+        for start in range(0, len(ids), CHROMA_MAX_BATCH):
+            end = start + CHROMA_MAX_BATCH
+            collection.update(ids=ids[start:end], metadatas=metadatas[start:end])
+
+    def _pages(self, collection, include, where=None):
+        offset = 0
+        while True:
+            page = collection.get(where=where, include=include, limit=CHROMA_MAX_BATCH, offset=offset)
+            if not page["ids"]:
+                return
+            yield page
+            offset += len(page["ids"])
+
+    def entries(self, folder_id, user_id, filename=None):
+        where = [{"folder_id": folder_id}, {"user_id": user_id}]
+        if filename is not None:
+            where.append({"filename": filename})
+        out = {}
+        for page in self._pages(self._get_collection(), ["metadatas"], {"$and": where}):
+            out.update(zip(page["ids"], page["metadatas"]))
+        return out
+
+    def tenants(self):
+        found = set()
+        for page in self._pages(self._get_collection(), ["metadatas"]):
+            found.update((m["folder_id"], m["user_id"]) for m in page["metadatas"])
+        return sorted(found)
+
+    def stats(self):
+        import chroma_store
+        stats = {"entries": self._get_collection().count()}
+        if not chroma_store.CHROMA_HOST:
+            stats["bytes"] = _dir_bytes(chroma_store.CHROMA_PATH)
+        return stats
+
+    def compact(self):
+        """
+        Copies the live entries into a fresh collection and swaps it in: Chroma's HNSW
+        index keeps deleted elements, so deletes alone never shrink it.
+
+        The swap renames the original out of the way before renaming the copy in,
+        so the data always lives in one complete collection. A run interrupted
+        mid-swap is finished by the next one.
+        """
+        import chroma_store
+
+        client = chroma_store.get_client()
+        staging_name = f"{self.collection_name}_compacting"
+        retired_name = f"{self.collection_name}_retired"
+        staging = self._existing_collection(client, staging_name)
+        if staging is not None:
+            target = self._existing_collection(client, self.collection_name)
+            if (target is None or target.count() == 0) and staging.count() > 0:
+                # Interrupted after the original was renamed: the copy is the data
+                print(f"⚠️ Finishing an interrupted compaction of {self.collection_name}")
+                self._swap_in(client, staging, retired_name)
+                return {"before": None, "after": self.stats(), "resumed": True}
+            # Interrupted while copying: the original is intact
+            client.delete_collection(staging_name)
+        if self._existing_collection(client, retired_name) is not None:
+            client.delete_collection(retired_name)
+
+        before = self.stats()
+        old = self._get_collection()
+        staging = client.create_collection(name=staging_name, metadata={"hnsw:space": "cosine"})
+        copied = 0
+        for page in self._pages(old, ["embeddings", "documents", "metadatas"]):
+            staging.add(ids=page["ids"], embeddings=page["embeddings"], documents=page["documents"],
+                        metadatas=page["metadatas"])
+            copied += len(page["ids"])
+        if staging.count() != copied or old.count() != copied:
+            # Writes landed during the copy, or the copy is short: keep the original
+            client.delete_collection(staging_name)
+            raise RuntimeError(f"Compaction of {self.collection_name} aborted: copied {copied} entries, "
+                               f"the copy holds {staging.count()} and the original {old.count()}")
+        self._swap_in(client, staging, retired_name)
+        return {"before": before, "after": self.stats()}
+
+    def _swap_in(self, client, staging, retired_name):
+        """Renames staging to the collection name, then drops the collection it replaces."""
+        import chroma_store
+
+        current = self._existing_collection(client, self.collection_name)
+        if current is not None and current.count() > 0:
+            current.modify(name=retired_name)
+        elif current is not None:
+            client.delete_collection(self.collection_name)
+        staging.modify(name=self.collection_name)
+        chroma_store._state["collections"].pop(self.collection_name, None)
+        if self._existing_collection(client, retired_name) is not None:
+            client.delete_collection(retired_name)
+
+    @staticmethod
+    def _existing_collection(client, name):
+        try:
+            return client.get_collection(name)
+        except Exception:
+            return None
+
+
+def _dir_bytes(path: str) -> int:
+    return sum(os.path.getsize(os.path.join(root, f)) for root, _, files in os.walk(path) for f in files)
+
+
+def _normalize(vectors: np.ndarray) -> np.ndarray:
+    vectors = np.asarray(vectors, dtype=np.float32)
+    norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+    return vectors / np.maximum(norms, 1e-12)
+
+
+def _safe_name(value: str) -> str:
+    return re.sub(r"[^\w.-]", "_", str(value)) or "_"
+
+
+def quantize(vectors: np.ndarray, dtype: str):
+    """(stored matrix, per-row scales or None) of normalized float32 vectors in the given storage dtype."""
+    if dtype == "int8":
+        scales = np.abs(vectors).max(axis=1) / 127.0
+        scales[scales == 0] = 1.0
+        return np.rint(vectors / scales[:, None]).astype(np.int8), scales.astype(np.float32)
+    return vectors.astype(STORAGE_DTYPES[dtype]), None
+
+
+def dequantize(matrix: np.ndarray, scales: Optional[np.ndarray], rows=None) -> np.ndarray:
+    block = np.asarray(matrix if rows is None else matrix[rows], dtype=np.float32)
+    if scales is not None:
+        block = block * (scales if rows is None else scales[rows])[:, None]
+    return block
+
+
+def _scores(matrix: np.ndarray, scales: Optional[np.ndarray], rows, q: np.ndarray) -> np.ndarray:
+    scores = np.asarray(matrix[rows], dtype=np.float32) @ q
+    if scales is not None:
+        scores *= scales[rows]
+    return scores
+
+
+class _IVFIndex:
+    """Inverted lists over the rows that existed when it was built; later rows are scanned exactly."""
+
+    def __init__(self, dense, live: np.ndarray, iterations: int = 10, seed: int = 0):
+        # dense(rows) -> float32 vectors of those rows
+        rows = np.flatnonzero(live)
+        self.built_rows = len(live)
+        nlist = max(1, int(math.sqrt(len(rows))))
+        rng = np.random.default_rng(seed)
+        sample = dense(np.sort(rng.choice(rows, size=min(len(rows), nlist * 64), replace=False)))
+        centroids = sample[rng.choice(len(sample), size=nlist, replace=False)]
+        # Spherical k-means on a sample
+        for _ in range(iterations):
+            assign = np.argmax(sample @ centroids.T, axis=1)
+            for c in range(nlist):
+                members = sample[assign == c]
+                if len(members):
+                    centroids[c] = members.sum(axis=0)
+            centroids = _normalize(centroids)
+        self.centroids = centroids
+        assign = np.concatenate([
+            np.argmax(dense(rows[s:s + 65536]) @ centroids.T, axis=1)
+            for s in range(0, len(rows), 65536)
+        ])
+        order = np.argsort(assign, kind="stable")
+        bounds = np.searchsorted(assign[order], np.arange(nlist + 1))
+        self.lists = [rows[order[bounds[c]:bounds[c + 1]]] for c in range(nlist)]
+
+    def candidates(self, q: np.ndarray, nprobe: int, total_rows: int) -> np.ndarray:
+        probe = np.argsort(-(self.centroids @ q))[:nprobe]
+        tail = np.arange(self.built_rows, total_rows)
+        return np.sort(np.concatenate([self.lists[c] for c in probe] + [tail]))
+
+
+class _Tenant:
+    """
+    One folder of one user: memory-mapped matrices plus their side table, refreshed from disk.
+
+    The storage format (VECTOR_DTYPE, and whether a float32 copy is kept for
+    re-scoring) is fixed by the folder's first write and kept by compaction.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        self._reset()
+
+    def _reset(self):
+        self.dim = None
+        self.dtype = None
+        self.full_precision = False
+        self.ids: List[str] = []
+        self.documents: List[str] = []
+        self.metadatas: List[Dict] = []
+        self.row_of: Dict[str, int] = {}
+        self.rows_by_section: Dict[str, List[int]] = {}
+        self.live = np.zeros(0, dtype=bool)
+        self.matrix = np.zeros((0, 0), dtype=np.float32)
+        self.scales: Optional[np.ndarray] = None
+        self.full: Optional[np.ndarray] = None
+        self.ivf: Optional[_IVFIndex] = None
+        self._offset = 0
+        self._inode = None
+
+    def _file(self, name):
+        return os.path.join(self.path, name)
+
+    def _files(self, dtype, full_precision):
+        """{role: file name} of the matrices stored in this format."""
+        files = {"matrix": MATRIX_FILES[dtype]}
+        if dtype == "int8":
+            files["scales"] = SCALES_FILE
+        if full_precision and dtype != "float32":
+            files["full"] = VECTORS_FILE
+        return files
+
+    @contextmanager
+    def _flock(self, mode):
+        os.makedirs(self.path, exist_ok=True)
+        with open(self._file(LOCK_FILE), "a") as f:
+            fcntl.flock(f, mode)
+            try:
+                yield
+            finally:
+                fcntl.flock(f, fcntl.LOCK_UN)
+
+    def _apply(self, ops):
+        live = list(self.live)
+        for op in ops:
+            if op["op"] == "add":
+                self.dim = op.get("dim", self.dim)
+                self.dtype = op.get("dtype", "float32")
+                self.full_precision = op.get("full", False)
+                old = self.row_of.get(op["id"])
+                if old is not None:
+                    live[old] = False
+                self.row_of[op["id"]] = len(self.ids)
+                section_id = op["metadata"].get("section_id")
+                if section_id is not None:
+                    self.rows_by_section.setdefault(section_id, []).append(len(self.ids))
+                self.ids.append(op["id"])
+                self.documents.append(op["document"])
+                self.metadatas.append(op["metadata"])
+                live.append(True)
+            elif op["op"] == "del":
+                old = self.row_of.pop(op["id"], None)
+                if old is not None:
+                    live[old] = False
+            elif op["op"] == "meta":
+                row = self.row_of.get(op["id"])
+                if row is not None:
+                    old_section = self.metadatas[row].get("section_id")
+                    new_section = op["metadata"].get("section_id")
+                    if old_section != new_section:
+                        # A shared chunk moved to another PDF's section (index_gc._move)
+                        if old_section in self.rows_by_section:
+                            self.rows_by_section[old_section].remove(row)
+                        if new_section is not None:
+                            self.rows_by_section.setdefault(new_section, []).append(row)
+                    self.metadatas[row] = op["metadata"]
+        # Replaced, never mutated, so a query can keep using the array it started with
+        self.live = np.array(live, dtype=bool)
+
+    def _refresh_locked(self):
+        try:
+            st = os.stat(self._file(ROWS_FILE))
+        except FileNotFoundError:
+            if self._inode is not None:
+                self._reset()
+            return
+        if st.st_ino != self._inode:
+            self._reset()
+            self._inode = st.st_ino
+        if st.st_size == self._offset:
+            return
+        with open(self._file(ROWS_FILE), "rb") as f:
+            f.seek(self._offset)
+            data = f.read()
+        end = data.rfind(b"\n") + 1  # ignore a line that is still being written
+        if not end:
+            return
+        self._offset += end
+        self._apply([json.loads(line) for line in data[:end].splitlines() if line.strip()])
+        if self.ids:
+            n = len(self.ids)
+            files = self._files(self.dtype, self.full_precision)
+            self.matrix = np.memmap(self._file(files["matrix"]), dtype=STORAGE_DTYPES[self.dtype], mode="r",
+                                    shape=(n, self.dim))
+            self.scales = (np.memmap(self._file(files["scales"]), dtype=np.float32, mode="r", shape=(n,))
+                           if "scales" in files else None)
+            self.full = (np.memmap(self._file(files["full"]), dtype=np.float32, mode="r", shape=(n, self.dim))
+                         if "full" in files else None)
+
+    def refresh(self):
+        """Pick up rows written by this or another process since the last call."""
+        with self._lock:
+            if self._inode is None and not os.path.exists(self._file(ROWS_FILE)):
+                return  # nothing stored for this folder yet
+            with self._flock(fcntl.LOCK_SH):
+                self._refresh_locked()
+
+    def _append_vectors(self, vectors, dtype, full_precision, suffix=""):
+        stored, scales = quantize(vectors, dtype)
+        arrays = {"matrix": stored, "scales": scales, "full": vectors}
+        for role, name in self._files(dtype, full_precision).items():
+            with open(self._file(name + suffix), "ab") as f:
+                f.write(np.ascontiguousarray(arrays[role]).tobytes())
+
+    def _truncate_vectors(self, rows, dim):
+        """Cut the matrices to `rows` rows, dropping vectors a crashed write appended without their rows."""
+        row_bytes = {"matrix": dim * np.dtype(STORAGE_DTYPES[self.dtype]).itemsize, "scales": 4, "full": dim * 4}
+        for role, name in self._files(self.dtype, self.full_precision).items():
+            path = self._file(name)
+            if os.path.exists(path) and os.path.getsize(path) > rows * row_bytes[role]:
+                os.truncate(path, rows * row_bytes[role])
+
+    def write(self, ids, vectors, documents, metadatas, deleted=(), updated=()):
+        with self._lock, self._flock(fcntl.LOCK_EX):
+            self._refresh_locked()
+            if not self.ids:
+                self.dtype, self.full_precision = VECTOR_DTYPE, VECTOR_RESCORE and VECTOR_DTYPE != "float32"
+            # A writer that died mid-line left a partial line: later lines must not be appended to it
+            rows_path = self._file(ROWS_FILE)
+            if os.path.exists(rows_path) and os.path.getsize(rows_path) > self._offset:
+                os.truncate(rows_path, self._offset)
+            if len(ids):
+                # Row i of the matrices must stay the vector of the i-th add in rows.jsonl
+                self._truncate_vectors(len(self.ids), self.dim or int(vectors.shape[1]))
+                self._append_vectors(vectors, self.dtype, self.full_precision)
+            lines = [json.dumps({"op": "del", "id": i}) for i in deleted if i in self.row_of]
+            lines += [json.dumps({"op": "meta", "id": i, "metadata": meta}, ensure_ascii=False)
+                      for i, meta in updated if i in self.row_of]
+            lines += [
+                json.dumps({"op": "add", "id": i, "dim": int(vectors.shape[1]), "dtype": self.dtype,
+                            "full": self.full_precision, "document": doc, "metadata": meta}, ensure_ascii=False)
+                for i, doc, meta in zip(ids, documents, metadatas)
+            ]
+            if lines:
+                with open(self._file(ROWS_FILE), "a", encoding="utf-8") as f:
+                    f.write("\n".join(lines) + "\n")
+            self._refresh_locked()
+            if len(self.live) - int(self.live.sum()) > max(1024, int(self.live.sum())):
+                self._compact_locked()
+
+    def _compact_locked(self):
+        """Rewrite the files with live rows only (a replaced or deleted row is otherwise kept forever)."""
+        rows = np.flatnonzero(self.live)
+        files = self._files(self.dtype, self.full_precision)
+        arrays = {"matrix": self.matrix, "scales": self.scales, "full": self.full}
+        for role, name in files.items():
+            np.ascontiguousarray(arrays[role][rows]).tofile(self._file(name + ".tmp"))
+        with open(self._file(ROWS_FILE + ".tmp"), "w", encoding="utf-8") as f:
+            for r in rows:
+                f.write(json.dumps({"op": "add", "id": self.ids[r], "dim": self.dim, "dtype": self.dtype,
+                                    "full": self.full_precision, "document": self.documents[r],
+                                    "metadata": self.metadatas[r]}, ensure_ascii=False) + "\n")
+        # Readers hold the shared lock while refreshing, so they never pair the new matrices with the old rows
+        for name in list(files.values()) + [ROWS_FILE]:
+            os.replace(self._file(name + ".tmp"), self._file(name))
+        self._reset()
+        self._refresh_locked()
+
+    def compact(self) -> bool:
+        """Rewrite the files if any row is deleted or replaced. Returns False once no live row is left."""
+        with self._lock, self._flock(fcntl.LOCK_EX):
+            self._refresh_locked()
+            if not self.ids:
+                return False
+            if not self.live.all():
+                self._compact_locked()
+            return bool(self.ids)
+
+    def entries(self, filename: str = None) -> Dict[str, Dict]:
+        self.refresh()
+        with self._lock:
+            return {i: self.metadatas[r] for i, r in self.row_of.items()
+                    if filename is None or self.metadatas[r].get("filename") == filename}
+
+    def search(self, q: np.ndarray, top_k: int, section_ids: Optional[List[str]] = None):
+        self.refresh()
+        with self._lock:
+            matrix, scales, full, live = self.matrix, self.scales, self.full, self.live
+            ids, documents, metadatas = self.ids, self.documents, self.metadatas
+            n = len(live)
+            if not n:
+                return []
+            if section_ids is not None:
+                # Only the rows of these sections are scored, so no index is needed
+                rows = [r for sid in section_ids for r in self.rows_by_section.get(sid, ()) if r < n]
+                rows = np.array(sorted(rows), dtype=np.int64)
+                return self._rank(q, top_k, matrix, scales, full, live, ids, documents, metadatas,
+                                  rows[live[rows]], [rows[live[rows]]])
+
+            def dense(rows):
+                return np.asarray(full[rows]) if full is not None else dequantize(matrix, scales, rows)
+
+            if n >= VECTOR_IVF_MIN_ROWS and (self.ivf is None or self.ivf.built_rows < 0.8 * n):
+                self.ivf = _IVFIndex(dense, live)
+            ivf = self.ivf if n >= VECTOR_IVF_MIN_ROWS else None
+
+        # Compact vectors are widened to float32 a few hundred rows at a time, so the
+        # converted block stays in cache.
+        block = n if matrix.dtype == np.float32 else SCORE_BLOCK_ROWS
+        if ivf is not None:
+            rows = ivf.candidates(q, VECTOR_IVF_NPROBE, n)
+            rows = rows[live[rows]]
+            blocks = [rows[s:s + block] for s in range(0, len(rows), block)]
+        else:
+            rows = np.arange(n)
+            blocks = [slice(s, s + block) for s in range(0, n, block)]
+        return self._rank(q, top_k, matrix, scales, full, live, ids, documents, metadatas, rows, blocks,
+                          mask_dead=ivf is None)
+
+    @staticmethod
+    def _rank(q, top_k, matrix, scales, full, live, ids, documents, metadatas, rows, blocks, mask_dead=False):
+        """Top entries among `rows`, scored against the stored vectors one block (slice or row array) at a time."""
+        scores = (np.concatenate([_scores(matrix, scales, b, q) for b in blocks])
+                  if blocks else np.zeros(0, dtype=np.float32))
+        if mask_dead:
+            scores[~live] = -np.inf
+
+        rescore = full is not None and VECTOR_RESCORE
+        available = int(live.sum()) if mask_dead else len(rows)
+        k = min(top_k * VECTOR_RESCORE_FACTOR if rescore else top_k, available)
+        if k <= 0:
+            return []
+        best = np.argpartition(-scores, k - 1)[:k]
+        if rescore:
+            # Exact float32 scores for the top candidates only
+            best = np.sort(best)
+            scores = np.full(len(rows), -np.inf, dtype=np.float32)
+            scores[best] = np.asarray(full[rows[best]]) @ q
+            best = best[np.argsort(-scores[best])][:top_k]
+        else:
+            best = best[np.argsort(-scores[best])]
+        out = []
+        for b in best:
+            r = int(rows[b])
+            out.append({"id": ids[r], "document": documents[r], "metadata": metadatas[r],
+                        "distance": float(1.0 - scores[b])})
+        return out
+
+    def stats(self) -> dict:
+        self.refresh()
+        sizes = {name: os.path.getsize(self._file(name))
+                 for name in list(self._files(self.dtype or VECTOR_DTYPE, self.full_precision).values()) + [ROWS_FILE]
+                 if os.path.exists(self._file(name))}
+        return {"rows": len(self.live), "live": int(self.live.sum()), "dim": self.dim,
+                "dtype": self.dtype, "full_precision": self.full_precision, "bytes": sizes,
+                "ivf_lists": len(self.ivf.lists) if self.ivf is not None else None}
+
+
+class NumpyVectorStore(VectorStore):
+    def __init__(self, path: str = VECTOR_STORE_PATH):
+        self.path = path
+        self._lock = threading.Lock()
+        self._tenants: Dict[tuple, _Tenant] = {}
+
+    def tenant(self, folder_id: str, user_id: str) -> _Tenant:
+        key = (str(user_id), str(folder_id))
+        with self._lock:
+            tenant = self._tenants.get(key)
+            if tenant is None:
+                tenant = self._tenants[key] = _Tenant(
+                    os.path.join(self.path, _safe_name(user_id), _safe_name(folder_id)))
+            return tenant
+
+    def upsert(self, ids, embeddings, documents, metadatas):
+        vectors = _normalize(embeddings)
+        groups: Dict[tuple, List[int]] = {}
+        for i, meta in enumerate(metadatas):
+            groups.setdefault((meta["folder_id"], meta["user_id"]), []).append(i)
+        for (folder_id, user_id), rows in groups.items():
+            self.tenant(folder_id, user_id).write(
+                [ids[i] for i in rows], vectors[rows],
+                [documents[i] for i in rows], [metadatas[i] for i in rows],
+            )
+
+    def query(self, embedding, top_k, folder_id=None, user_id=None, section_ids=None):
+        if folder_id is None or user_id is None:
+            return []
+        q = _normalize(np.asarray(embedding, dtype=np.float32))
+        return self.tenant(folder_id, user_id).search(q, top_k, section_ids)
+
+    def delete(self, ids, folder_id=None, user_id=None):
+        if ids:
+            self.tenant(folder_id, user_id).write([], np.zeros((0, 0), dtype=np.float32), [], [], deleted=ids)
+
+    def get_metadata(self, ids, folder_id=None, user_id=None):
+        tenant = self.tenant(folder_id, user_id)
+        tenant.refresh()
+        with tenant._lock:
+            return {i: tenant.metadatas[tenant.row_of[i]] for i in ids if i in tenant.row_of}
+
+    def update_metadata(self, ids, metadatas, folder_id=None, user_id=None):
+        if ids:
+            self.tenant(folder_id, user_id).write([], np.zeros((0, 0), dtype=np.float32), [], [],
+                                                  updated=list(zip(ids, metadatas)))
+
+    def entries(self, folder_id, user_id, filename=None):
+        return self.tenant(folder_id, user_id).entries(filename)
+
+    def _tenant_dirs(self):
+        if not os.path.isdir(self.path):
+            return []
+        return [os.path.join(self.path, u, f) for u in sorted(os.listdir(self.path))
+                if os.path.isdir(os.path.join(self.path, u))
+                for f in sorted(os.listdir(os.path.join(self.path, u)))
+                if os.path.exists(os.path.join(self.path, u, f, ROWS_FILE))]
+
+    def tenants(self):
+        found = []
+        for path in self._tenant_dirs():
+            # Directory names are sanitized, the metadata holds the real ids
+            metadatas = list(_Tenant(path).entries().values())
+            if metadatas:
+                found.append((metadatas[0]["folder_id"], metadatas[0]["user_id"]))
+        return found
+
+    def stats(self):
+        rows = live = 0
+        for path in self._tenant_dirs():
+            tenant_stats = _Tenant(path).stats()
+            rows += tenant_stats["rows"]
+            live += tenant_stats["live"]
+        return {"entries": live, "rows": rows, "tenants": len(self._tenant_dirs()), "bytes": _dir_bytes(self.path)}
+
+    def compact(self):
+        """Compacts every folder and removes the directories of folders without entries."""
+        before = self.stats()
+        for path in self._tenant_dirs():
+            if not _Tenant(path).compact():
+                shutil.rmtree(path, ignore_errors=True)
+        with self._lock:
+            self._tenants.clear()
+        return {"before": before, "after": self.stats()}
+
+
+BACKENDS = {
+    "chroma": lambda collection: ChromaVectorStore(CHROMA_COLLECTIONS[collection]),
+    "numpy": lambda collection: NumpyVectorStore(os.path.join(VECTOR_STORE_PATH, collection)),
+}
+
+_state_lock = threading.Lock()
+_state = {"pid": None, "stores": {}}
+
+
+def get_store(collection: str = CHUNKS) -> VectorStore:
+    """
+    The store of one collection (CHUNKS or SECTIONS) in the backend selected by
+    VECTOR_BACKEND, created once per process (and again after a fork).
+    """
+    pid = os.getpid()
+    with _state_lock:
+        if _state["pid"] != pid:
+            if VECTOR_BACKEND not in BACKENDS:
+                raise ValueError(f"Unknown VECTOR_BACKEND {VECTOR_BACKEND!r}, expected one of {sorted(BACKENDS)}")
+            _state.update(pid=pid, stores={})
+        store = _state["stores"].get(collection)
+        if store is None:
+            store = _state["stores"][collection] = BACKENDS[VECTOR_BACKEND](collection)
+        return store